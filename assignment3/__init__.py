@@ -1,9 +1,4 @@
-import bpy
-import inspect
-
-from .deformation import *
-from .extension import *
-from .matrices import *
+import sys
 
 bl_info = {
     "name": "GDP Assignment 3 (Practical)",
@@ -16,19 +11,41 @@ bl_info = {
     "category": "Mesh"
 }
 
-classes = [
-    ImplicitLaplaceCoordinateDeform,
-    ExplicitLaplaceCoordinateDeform,
-    ImplicitConstrainedLaplaceCoordinateDeform,
-    ExplicitConstrainedLaplaceCoordinateDeform,
-    DifferentialCoordinateDeform,
-    ConstrainedDifferentialCoordinateDeform,
-    # TODO: For task 3, you should add your own Operators, Panels, or other UI elements here!
-]
+
+def operator_classes() -> list:
+    """
+    Imports the operator modules, without the numerical code behind them (which is imported on first use).
+
+    :return: The classes which are registered with blender.
+    """
+    from .deformation.operators import (
+        DifferentialCoordinateDeform, ModalDifferentialCoordinateDeform, ConstrainedDifferentialCoordinateDeform
+    )
+    from .extension.operators import (
+        ImplicitLaplaceCoordinateDeform, ExplicitLaplaceCoordinateDeform, ImplicitConstrainedLaplaceCoordinateDeform,
+        ExplicitConstrainedLaplaceCoordinateDeform, SpectralLaplaceCoordinateDeform
+    )
+
+    return [
+        ImplicitLaplaceCoordinateDeform,
+        ExplicitLaplaceCoordinateDeform,
+        ImplicitConstrainedLaplaceCoordinateDeform,
+        ExplicitConstrainedLaplaceCoordinateDeform,
+        SpectralLaplaceCoordinateDeform,
+        DifferentialCoordinateDeform,
+        ModalDifferentialCoordinateDeform,
+        ConstrainedDifferentialCoordinateDeform,
+        # TODO: For task 3, you should add your own Operators, Panels, or other UI elements here!
+    ]
 
 
 def register():
-    for c in classes:
+    import inspect
+    import bpy
+    from .deformation.operators import register as register_deformation_menus
+    from .extension.operators import register as register_extension_menus
+
+    for c in operator_classes():
         try:
             bpy.utils.register_class(c)
         except AttributeError as e:
@@ -38,10 +55,16 @@ def register():
                 f"\t(Take a look in '{inspect.getfile(c)}' to find out what's missing)"
             )
 
-    deformation.register()
-    extension.register()
+    register_deformation_menus()
+    register_extension_menus()
 
 
 def unregister():
-    for c in classes:
+    import bpy
+
+    for c in operator_classes():
         bpy.utils.unregister_class(c)
+
+    # Free the scratch datablock used to read meshes into numpy arrays (if any operator was used at all)
+    if 'assignment3.matrices.util' in sys.modules:
+        sys.modules['assignment3.matrices.util'].MESH_BRIDGE.release()
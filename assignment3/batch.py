@@ -0,0 +1,274 @@
+import argparse
+import csv
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator
+
+import numpy as np
+
+OPERATIONS = ('gradient', 'constrained_gradient', 'explicit', 'implicit')
+
+SUMMARY_FIELDS = ['file', 'status', 'verts', 'faces', 'load_s', 'compute_s', 'write_s', 'total_s', 'output', 'error']
+
+
+def find_obj_files(inputs: list[str]) -> list[str]:
+    """
+    :param inputs: Directories (searched recursively), OBJ files, or glob patterns.
+    :return: The sorted paths of all OBJ files they contain, without duplicates.
+    """
+    paths = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '**', '*.obj')
+        paths.update(path for path in glob.glob(pattern, recursive=True) if path.lower().endswith('.obj'))
+    return sorted(paths)
+
+
+def output_paths(paths: list[str], output_dir: str) -> list[str]:
+    """
+    Mirrors the paths of the input files under the output directory, relative to the directory containing all of
+    them, so that files with the same name in different input directories don't overwrite each other.
+
+    :param paths: Paths of the OBJ files.
+    :param output_dir: Directory which the results are written to.
+    :return: The path of the result of each file.
+    """
+    if not paths:
+        return []
+    paths = [os.path.abspath(path) for path in paths]
+    root = os.path.commonpath([os.path.dirname(path) for path in paths])
+    return [os.path.join(output_dir, os.path.relpath(path, root)) for path in paths]
+
+
+def parse_indices(text: str) -> np.ndarray:
+    """
+    :param text: Comma separated indices and inclusive ranges, e.g. "0-99,120".
+    :return: The (sorted, unique) indices.
+    """
+    indices = []
+    for part in filter(None, (part.strip() for part in text.split(','))):
+        start, _, stop = part.partition('-')
+        indices.extend(range(int(start), int(stop or start) + 1))
+    return np.unique(np.array(indices, dtype=np.int64))
+
+
+def transform_matrix(matrix: list[float] = None, scale: list[float] = None) -> np.ndarray:
+    """
+    :param matrix: The 9 entries of a 3x3 gradient transformation (row by row), if given.
+    :param scale: Scale factors along X, Y and Z, if given (and no matrix is).
+    :return: The 3x3 gradient transformation matrix A (the identity if neither is given).
+    """
+    if matrix is not None:
+        return np.array(matrix, dtype=np.float64).reshape([3, 3])
+    if scale is not None:
+        return np.diag(np.array(scale, dtype=np.float64))
+    return np.identity(3)
+
+
+def apply_operation(
+        verts: np.ndarray,
+        loops: np.ndarray,
+        loop_totals: np.ndarray,
+        operation: str,
+        A: np.ndarray = None,
+        selection: np.ndarray = None,
+        tau: float = 1e-4,
+        iterations: int = 1,
+        method: str = 'EXPLICIT',
+        operator_update: str = 'EVERY',
+        refresh_interval: int = 1,
+        **solver_options
+) -> np.ndarray:
+    """
+    Applies one of the mesh operations to a mesh given as arrays, the same way as the corresponding operator.
+
+    Polygons are split into triangles for the solvers, but explicit smoothing uses the edges of the polygons.
+
+    :param verts: An Nx3 array of vertex positions.
+    :param loops: The vertex indices of all polygons concatenated.
+    :param loop_totals: The number of vertices of each polygon.
+    :param operation: One of 'gradient', 'constrained_gradient', 'explicit' or 'implicit'.
+    :param A: The 3x3 gradient transformation, for the gradient operations.
+    :param selection: Indices of the selected polygons, for 'constrained_gradient'.
+    :param tau: Update weight, for the smoothing operations.
+    :param iterations: Number of smoothing iterations.
+    :param method: The explicit filter (see `ExplicitSmoother.smooth`).
+    :param operator_update: How often implicit smoothing rebuilds its operator (see `implicit_smoothing_iterations`).
+    :param refresh_interval: Number of iterations between operator updates in 'LAGGED' mode.
+    :param solver_options: Solver backend and its settings, passed on to `make_solver`.
+    :return: An Nx3 matrix representing new vertex positions for the mesh.
+    """
+    from data.meshes import polygon_edges, triangulate_polygons
+    from assignment3.deformation.deform import deform_vertices
+    from assignment3.extension.smooth_brush import (
+        ExplicitSmoother, edge_combinatorial_laplacian, implicit_smoothing_iterations
+    )
+    from assignment3.matrices.util import triangle_selection
+
+    verts = np.array(verts, dtype=np.float64)
+    faces = triangulate_polygons(loops, loop_totals)
+    A = np.identity(3) if A is None else A
+
+    if operation == 'gradient':
+        return deform_vertices(verts, faces, A, **solver_options)
+    if operation == 'constrained_gradient':
+        if selection is None:
+            raise ValueError("The 'constrained_gradient' operation needs a selection")
+        polygon_index = np.repeat(np.arange(len(loop_totals)), np.asarray(loop_totals) - 2)
+        triangles, _ = triangle_selection(polygon_index, selection)
+        return deform_vertices(verts, faces, A, triangles, **solver_options)
+    if operation == 'explicit':
+        L = edge_combinatorial_laplacian(polygon_edges(loops, loop_totals), len(verts))
+        return ExplicitSmoother(L).smooth(verts, tau, iterations, method=method)
+    if operation == 'implicit':
+        return implicit_smoothing_iterations(
+            verts, faces, tau, iterations, operator_update=operator_update, refresh_interval=refresh_interval,
+            **solver_options
+        )
+    raise ValueError(f"Unknown operation '{operation}', expected one of {OPERATIONS}")
+
+
+def process_file(path: str, output_path: str, operation: str, **options) -> dict:
+    """
+    Loads an OBJ file, applies an operation to it, and writes the result to the output path.
+
+    Errors are caught and reported in the result, so that a single broken file doesn't stop a batch.
+
+    :param path: Path of the OBJ file.
+    :param output_path: Path which the deformed mesh is written to (see `output_paths`).
+    :param operation: One of `OPERATIONS`.
+    :param options: Parameters of the operation, passed on to `apply_operation`.
+    :return: A summary record for the file, with the fields in `SUMMARY_FIELDS`.
+    """
+    from data.meshes import read_obj, write_obj
+
+    record = dict(file=path, status='ok', output=output_path)
+    start = time.perf_counter()
+    try:
+        verts, loops, loop_totals = read_obj(path)
+        record.update(verts=len(verts), faces=len(loop_totals))
+        loaded = time.perf_counter()
+
+        new_verts = apply_operation(verts, loops, loop_totals, operation, **options)
+        computed = time.perf_counter()
+
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        write_obj(output_path, new_verts, loops, loop_totals)
+        written = time.perf_counter()
+        record.update(load_s=loaded - start, compute_s=computed - loaded, write_s=written - computed)
+    except Exception as e:
+        record.update(status='failed', output='', error=f"{type(e).__name__}: {e}")
+    record['total_s'] = time.perf_counter() - start
+    return record
+
+
+def run_batch(paths: list[str], output_dir: str, operation: str, workers: int = None, **options) -> Iterator[dict]:
+    """
+    Processes many OBJ files in parallel, spread over a pool of processes.
+
+    :param paths: Paths of the OBJ files.
+    :param output_dir: Directory which the deformed meshes are written to, mirroring the input directories.
+    :param operation: One of `OPERATIONS`.
+    :param workers: Number of processes (by default one per CPU), with 1 everything is done in this process.
+    :param options: Parameters of the operation, passed on to `apply_operation`.
+    :return: The summary record of each file, in the order in which they finish.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = output_paths(paths, output_dir)
+    if workers == 1:
+        for path, output_path in zip(paths, outputs):
+            yield process_file(path, output_path, operation, **options)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(process_file, path, output_path, operation, **options)
+            for path, output_path in zip(paths, outputs)
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog='batch.py', description="Applies a gradient deformation or Laplace smoothing to many OBJ files."
+    )
+    parser.add_argument('operation', choices=OPERATIONS)
+    parser.add_argument('inputs', nargs='+', help="Directories, OBJ files or glob patterns")
+    parser.add_argument('--output', '-o', default='batch_output', help="Directory for the results")
+    parser.add_argument('--summary', help="Path of the timing summary (default: <output>/summary.csv)")
+    parser.add_argument('--workers', '-j', type=int, default=None, help="Number of processes (default: all CPUs)")
+
+    deformation = parser.add_argument_group("gradient deformation")
+    deformation.add_argument('--matrix', type=float, nargs=9, help="Gradient transformation, row by row")
+    deformation.add_argument('--scale', type=float, nargs=3, help="Gradient scale along X, Y and Z")
+    deformation.add_argument('--selection', type=parse_indices, help="Selected faces, e.g. 0-99,120")
+
+    smoothing = parser.add_argument_group("smoothing")
+    smoothing.add_argument('--tau', type=float, default=1e-4)
+    smoothing.add_argument('--iterations', type=int, default=1)
+    smoothing.add_argument('--method', choices=['EXPLICIT', 'CHEBYSHEV', 'TAUBIN'], default='EXPLICIT')
+    smoothing.add_argument('--operator-update', choices=['EVERY', 'LAGGED', 'FIXED'], default='EVERY')
+    smoothing.add_argument('--refresh-interval', type=int, default=1)
+
+    solver = parser.add_argument_group("solver")
+    solver.add_argument('--solver', choices=['DIRECT', 'CG', 'MULTIGRID'], default='DIRECT')
+    solver.add_argument('--storage', choices=['FULL', 'UPPER'], default='FULL',
+                        help="Keep only the upper triangle of the cotangent matrices")
+    solver.add_argument('--precision', choices=['DOUBLE', 'SINGLE'], default='DOUBLE',
+                        help="Store the factorization as float32, with iterative refinement (direct solver only)")
+
+    args = parser.parse_args(argv)
+    if args.operation == 'constrained_gradient' and args.selection is None:
+        parser.error("the constrained_gradient operation needs a --selection")
+    if args.precision != 'DOUBLE' and args.solver != 'DIRECT':
+        parser.error(f"--precision {args.precision} is only supported by the DIRECT solver")
+    return args
+
+
+def main(argv: list[str]) -> list[dict]:
+    """
+    Runs a batch from the command line, see `parse_args` (or run with --help) for the arguments.
+
+    The result of each file is written as soon as it is finished, and its timings are appended to a CSV summary.
+
+    :param argv: The command line arguments.
+    :return: The summary records of all files.
+    """
+    args = parse_args(argv)
+    paths = find_obj_files(args.inputs)
+    summary_path = args.summary or os.path.join(args.output, 'summary.csv')
+    options = dict(
+        A=transform_matrix(args.matrix, args.scale), selection=args.selection, tau=args.tau,
+        iterations=args.iterations, method=args.method, operator_update=args.operator_update,
+        refresh_interval=args.refresh_interval
+    )
+    if args.solver != 'DIRECT':
+        options['backend'] = args.solver
+    if args.operation != 'explicit':
+        options['storage'] = args.storage
+    if args.precision != 'DOUBLE':
+        options['precision'] = args.precision
+
+    print(f"Processing {len(paths)} files ({args.operation})")
+    start = time.perf_counter()
+    records = []
+    os.makedirs(args.output, exist_ok=True)
+    with open(summary_path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, SUMMARY_FIELDS)
+        writer.writeheader()
+        for record in run_batch(paths, args.output, args.operation, args.workers, **options):
+            writer.writerow(record)
+            file.flush()
+            records.append(record)
+            print(f"[{len(records)}/{len(paths)}] {record['file']}: {record['status']} ({record['total_s']:.2f} s)")
+
+    failed = sum(record['status'] != 'ok' for record in records)
+    compute_time = sum(record.get('compute_s', 0.0) for record in records)
+    print(
+        f"Done in {time.perf_counter() - start:.2f} s ({compute_time:.2f} s of computation), "
+        f"{len(records) - failed} succeeded, {failed} failed. Summary written to {summary_path}"
+    )
+    return records
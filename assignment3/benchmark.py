@@ -0,0 +1,484 @@
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+from typing import Callable, Iterator
+
+import numpy as np
+import scipy
+
+from assignment3.deformation.deform import deform_vertices
+from assignment3.extension.smooth_brush import (
+    constrained_explicit_smoothing, constrained_implicit_smoothing, edge_combinatorial_laplacian,
+    edge_explicit_smoother, implicit_smoothing_iterations
+)
+from assignment3.matrices.array_mesh import MeshTopology
+from assignment3.matrices.cache import OPERATOR_CACHE, estimate_nbytes
+from assignment3.matrices.differential_coordinates import (
+    build_cotangent_matrix, cotangent_laplacian, gradient_matrix, mass_matrices
+)
+from assignment3.matrices.multigrid import MultigridSolver
+from assignment3.matrices.solvers import ConjugateGradientSolver, PinnedSolver, component_pins, matrix_components
+
+PRIMITIVES = ['CUBE', 'TORUS', 'UV_SPHERE']
+
+TORI = ['double-torus.obj', 'half-torus.obj', 'two-tori.obj', 'bagel-cut-torus.obj', 'half-bagel-cut-torus.obj']
+
+
+def subdivide(verts: np.ndarray, faces: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Splits every triangle into four by inserting a vertex at the midpoint of each edge.
+
+    :param verts: An Nx3 array of vertex positions.
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :return: The vertices and faces of the subdivided mesh (with 4M faces).
+    """
+    # Edges (0, 1), (1, 2) and (2, 0) of every face
+    edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape([-1, 2]), axis=1)
+    unique_edges, edge_indices = np.unique(edges, axis=0, return_inverse=True)
+
+    new_verts = np.concatenate([verts, verts[unique_edges].mean(axis=1)])
+    a, b, c = faces.T
+    ab, bc, ca = (len(verts) + edge_indices.reshape([-1, 3])).T
+    new_faces = np.concatenate([
+        np.stack([a, ab, ca], axis=1),
+        np.stack([ab, b, bc], axis=1),
+        np.stack([ca, bc, c], axis=1),
+        np.stack([ab, bc, ca], axis=1),
+    ])
+    return new_verts, new_faces
+
+
+def load_tori() -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    """
+    Loads the bundled tori as vertex and triangle arrays (straight from the OBJ files, Blender isn't needed).
+
+    :return: A dictionary from file name to (verts, faces).
+    """
+    from data.meshes import load_arrays, triangulate_polygons
+
+    tori = {}
+    for name in TORI:
+        verts, loops, loop_totals = load_arrays(name)
+        tori[name] = np.array(verts), triangulate_polygons(loops, loop_totals)
+    return tori
+
+
+def load_primitives() -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    """
+    Loads the primitive fixture meshes as vertex and triangle arrays (requires Blender, empty without it).
+
+    :return: A dictionary from primitive name to (verts, faces).
+    """
+    try:
+        from data import primitives
+        from assignment3.matrices.util import numpy_mesh
+        return {name: numpy_mesh(getattr(primitives, name)) for name in PRIMITIVES}
+    except ImportError:
+        return {}
+
+
+def time_solver(make_solver, rhs: np.ndarray, x0: np.ndarray, **solve_kwargs) -> tuple[float, np.ndarray, object]:
+    start = time.perf_counter()
+    solver = make_solver()
+    x = solver.solve(rhs, x0=x0, **solve_kwargs)
+    return time.perf_counter() - start, x, solver
+
+
+def benchmark_multigrid(meshes: dict, levels: int = 3, tau: float = 1e-3) -> list[dict]:
+    """
+    Compares the multigrid solver to the direct solver, on increasingly subdivided versions of the given meshes.
+
+    Two systems are solved for each mesh: the (pinned) cotangent matrix S used by gradient deformation,
+    and the implicit smoothing matrix M + tau * S.
+
+    :param meshes: A dictionary from name to (verts, faces).
+    :param levels: Number of subdivision levels to test (0 is the original mesh).
+    :param tau: Smoothing weight for the implicit smoothing system.
+    :return: A list of result records, one per mesh, subdivision level, system and solver.
+    """
+    results = []
+    for name, (verts, faces) in meshes.items():
+        for level in range(levels + 1):
+            if level > 0:
+                verts, faces = subdivide(verts, faces)
+
+            M, _ = mass_matrices(verts, faces)
+            S = cotangent_laplacian(verts, faces)
+            systems = {
+                'gradient': (S, [0], S @ (verts * [2., 1., 1.])),
+                'implicit': (scipy.sparse.csc_array(M) + tau * scipy.sparse.csc_array(S), None, M @ verts),
+            }
+
+            for system, (A, pinned, rhs) in systems.items():
+                record = dict(mesh=name, level=level, verts=len(verts), system=system)
+                pinned_values = verts[pinned] if pinned is not None else None
+                try:
+                    direct_time, reference, _ = time_solver(
+                        lambda: PinnedSolver(A, pinned=pinned), rhs, verts, pinned_values=pinned_values
+                    )
+                except RuntimeError:
+                    # e.g. S is still singular for meshes with several connected components
+                    results.append(dict(record, solver='DIRECT', error='singular'))
+                    continue
+                results.append(dict(record, solver='DIRECT', time=direct_time))
+
+                for mode in ('V', 'FMG'):
+                    mg_time, x, solver = time_solver(
+                        lambda: MultigridSolver(A, pinned=pinned, positions=verts, mode=mode),
+                        rhs, verts, pinned_values=pinned_values
+                    )
+                    results.append(dict(
+                        record, solver=f'MULTIGRID-{mode}', time=mg_time, cycles=solver.iterations,
+                        levels=solver.num_levels, max_difference=float(np.abs(x - reference).max())
+                    ))
+    return results
+
+
+# Ways of storing and solving the Laplacian-type systems compared by `benchmark_storage`,
+# as (storage of the operator, type of its values, solver backend, precision of the factorization)
+STORAGE_VARIANTS = {
+    'FULL-DOUBLE': ('FULL', np.float64, 'DIRECT', 'DOUBLE'),
+    'UPPER-DOUBLE': ('UPPER', np.float64, 'DIRECT', 'DOUBLE'),
+    'UPPER-SINGLE': ('UPPER', np.float64, 'DIRECT', 'SINGLE'),
+    'UPPER32-SINGLE': ('UPPER', np.float32, 'DIRECT', 'SINGLE'),
+    'FULL-CG': ('FULL', np.float64, 'CG', 'DOUBLE'),
+    'UPPER-CG': ('UPPER', np.float64, 'CG', 'DOUBLE'),
+}
+
+
+def benchmark_storage(meshes: dict, levels: int = 3, tau: float = 1e-3) -> list[dict]:
+    """
+    Compares the memory use and accuracy of the `STORAGE_VARIANTS`, on increasingly subdivided versions of the meshes.
+
+    The same two systems as in `benchmark_multigrid` are solved (with one pinned vertex per connected component),
+    and every variant is compared to the full float64 one. The memory is split into the operator itself,
+    as it would be kept in the cache, and the solver: its factorization (if any), and the reduced operator
+    which it keeps for the products of CG and of iterative refinement (also reported on its own).
+
+    :param meshes: A dictionary from name to (verts, faces).
+    :param levels: Number of subdivision levels to test (0 is the original mesh).
+    :param tau: Smoothing weight for the implicit smoothing system.
+    :return: A list of result records, one per mesh, subdivision level, system and variant.
+    """
+    results = []
+    for name, (verts, faces) in meshes.items():
+        for level in range(levels + 1):
+            if level > 0:
+                verts, faces = subdivide(verts, faces)
+            M, _ = mass_matrices(verts, faces)
+
+            for system in ('gradient', 'implicit'):
+                record = dict(mesh=name, level=level, verts=len(verts), system=system)
+                reference = None
+                for variant, (storage, dtype, backend, precision) in STORAGE_VARIANTS.items():
+                    S = cotangent_laplacian(verts, faces, storage, dtype)
+                    if system == 'gradient':
+                        A, rhs = S, S @ (verts * [2., 1., 1.])
+                        pinned = component_pins(matrix_components(S)[1])
+                    else:
+                        A, rhs, pinned = tau * S + M, M @ verts, None
+                    if storage == 'FULL':
+                        A = scipy.sparse.csr_array(A)
+                    pinned_values = verts[pinned] if pinned is not None else None
+
+                    if backend == 'CG':
+                        build = lambda: ConjugateGradientSolver(A, pinned=pinned, tol=1e-10, maxiter=100_000)
+                    else:
+                        build = lambda: PinnedSolver(A, pinned=pinned, precision=precision)
+                    seconds, x, solver = time_solver(build, rhs, verts, pinned_values=pinned_values)
+                    if reference is None:
+                        reference = x
+                    results.append(dict(
+                        record, solver=variant, time=seconds, operator_bytes=estimate_nbytes(A),
+                        solver_bytes=estimate_nbytes(solver),
+                        retained_operator_bytes=estimate_nbytes(getattr(solver, 'A_ff', None)),
+                        iterations=int(np.sum(getattr(solver, 'iterations', 0))),
+                        relative_error=float(np.abs(x - reference).max() / np.abs(reference).max())
+                    ))
+    return results
+
+
+def print_results(results: list[dict]):
+    for r in results:
+        details = ', '.join(
+            f'{k}={v / 2 ** 20:.2f}MiB' if k.endswith('_bytes') else f'{k}={v}'
+            for k, v in r.items() if k not in ('mesh', 'level', 'verts', 'system', 'solver', 'time')
+        )
+        timing = f"{r['time']:8.3f}s" if 'time' in r else ' ' * 9
+        print(f"{r['mesh']:26} L{r['level']} {r['verts']:9d} {r['system']:9} {r['solver']:14} {timing} {details}")
+
+
+# Operations measured by `benchmark_suite`
+BENCHMARK_CASES = [
+    'build_gradient_matrix', 'build_mass_matrices', 'build_cotangent_matrix', 'build_combinatorial_laplacian',
+    'other_cotangent', 'gradient_deform', 'explicit_smoothing', 'implicit_smoothing',
+    'constrained_explicit_smoothing', 'constrained_implicit_smoothing', 'implicit_smoothing_upper_single',
+]
+
+
+def scaled_meshes(meshes: dict, min_verts: int = 1000, max_verts: int = 1_200_000) -> Iterator[tuple]:
+    """
+    Subdivides meshes until they are too large, keeping every level within the size range.
+
+    :param meshes: A dictionary from name to (verts, faces).
+    :param min_verts: Levels with fewer vertices are skipped.
+    :param max_verts: Subdivision stops before the meshes get more vertices than this.
+    :return: Tuples of (name, level, verts, faces), from small to large for each mesh.
+    """
+    for name, (verts, faces) in meshes.items():
+        level = 0
+        while len(verts) <= max_verts:
+            if len(verts) >= min_verts:
+                yield name, level, verts, faces
+            # Every subdivision adds a vertex per edge, which is roughly three times as many as there are vertices
+            verts, faces = subdivide(verts, faces)
+            level += 1
+
+
+def benchmark_cases(verts: np.ndarray, faces: np.ndarray, tau: float = 1e-4, iterations: int = 3) -> dict[str, Callable]:
+    """
+    Prepares the operations in `BENCHMARK_CASES` for a single mesh.
+
+    The graded builders take a BMesh, so the array functions they call are measured instead
+    (the BMesh versions only add a bulk read of the vertices and faces).
+    Inputs which aren't part of an operation (e.g. G and Mv for the cotangent matrix) are computed up front,
+    and the constrained operations smooth about 5% of the faces, around the first vertex.
+
+    :param verts: An Nx3 array of vertex positions.
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :param tau: Update weight for the smoothing operations.
+    :param iterations: Number of smoothing iterations.
+    :return: A dictionary from case name to a function which runs it.
+    """
+    num_verts = len(verts)
+    edges = MeshTopology(faces, num_verts).edges
+    G = scipy.sparse.csr_array(gradient_matrix(verts, faces))
+    _, Mv = mass_matrices(verts, faces)
+    A = np.diag([2., 1., 1.])
+
+    distances = np.linalg.norm(verts[faces].mean(axis=1) - verts[0], axis=1)
+    selection = np.argsort(distances)[:max(len(faces) // 20, 1)]
+
+    return {
+        'build_gradient_matrix': lambda: gradient_matrix(verts, faces),
+        'build_mass_matrices': lambda: mass_matrices(verts, faces),
+        'build_cotangent_matrix': lambda: build_cotangent_matrix(G, Mv),
+        'build_combinatorial_laplacian': lambda: edge_combinatorial_laplacian(edges, num_verts),
+        'other_cotangent': lambda: 2. * cotangent_laplacian(verts, faces),
+        'gradient_deform': lambda: deform_vertices(verts, faces, A),
+        'explicit_smoothing': lambda: edge_explicit_smoother(edges, num_verts).smooth(verts, tau, iterations),
+        'implicit_smoothing': lambda: implicit_smoothing_iterations(verts, faces, tau, iterations),
+        'constrained_explicit_smoothing': lambda: constrained_explicit_smoothing(
+            verts, faces, edges, selection, tau, iterations, halo=4
+        ),
+        'constrained_implicit_smoothing': lambda: constrained_implicit_smoothing(
+            verts, faces, selection, tau, iterations, operator_update='FIXED', halo=4
+        ),
+        'implicit_smoothing_upper_single': lambda: implicit_smoothing_iterations(
+            verts, faces, tau, iterations, storage='UPPER', precision='SINGLE'
+        ),
+    }
+
+
+def measure(run: Callable, repeat: int = 3) -> tuple[float, int]:
+    """
+    Measures the wall time and peak memory use of an operation, without any help from the operator cache.
+
+    The time is the best of `repeat` runs. The peak memory is measured in a separate run with tracemalloc,
+    which sees everything numpy and scipy allocate through python, but not memory used inside a factorization.
+
+    :param run: The operation to measure.
+    :param repeat: Number of timed runs.
+    :return: A tuple containing the time in seconds, and the peak memory use in bytes.
+    """
+    times = []
+    for _ in range(repeat):
+        OPERATOR_CACHE.clear()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    OPERATOR_CACHE.clear()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    OPERATOR_CACHE.clear()
+    return min(times), peak
+
+
+def benchmark_suite(meshes: dict, cases: list[str] = None, repeat: int = 3, **size_range) -> list[dict]:
+    """
+    Measures every operation on increasingly subdivided versions of the given meshes.
+
+    :param meshes: A dictionary from name to (verts, faces).
+    :param cases: Names of the operations to measure (all of `BENCHMARK_CASES` by default).
+    :param repeat: Number of timed runs per operation.
+    :param size_range: The range of mesh sizes, passed on to `scaled_meshes`.
+    :return: A list of result records, one per mesh, subdivision level and operation.
+    """
+    results = []
+    for name, level, verts, faces in scaled_meshes(meshes, **size_range):
+        for case, run in benchmark_cases(verts, faces).items():
+            if cases is not None and case not in cases:
+                continue
+            record = dict(mesh=name, level=level, verts=len(verts), faces=len(faces), case=case)
+            try:
+                seconds, peak = measure(run, repeat)
+            except (RuntimeError, MemoryError) as e:
+                # e.g. S is singular for meshes with several connected components
+                results.append(dict(record, error=f"{type(e).__name__}: {e}"))
+                continue
+            results.append(dict(record, time=seconds, peak_bytes=peak))
+            print(f"{name:26} L{level} {len(verts):9d} {case:32} {seconds:9.4f}s {peak / 2 ** 20:9.1f} MiB")
+    return results
+
+
+def write_results(path: str, results: list[dict]):
+    """
+    Writes benchmark results to a JSON file, together with a description of the machine they were measured on.
+    """
+    environment = dict(
+        python=platform.python_version(), numpy=np.__version__, scipy=scipy.__version__,
+        machine=platform.machine(), processor=platform.processor(), system=platform.platform(),
+        date=time.strftime('%Y-%m-%dT%H:%M:%S')
+    )
+    with open(path, 'w') as file:
+        json.dump(dict(environment=environment, results=results), file, indent=1)
+
+
+def read_results(path: str) -> list[dict]:
+    with open(path) as file:
+        return json.load(file)['results']
+
+
+def compare_results(
+        results: list[dict],
+        baseline: list[dict],
+        tolerance: float = 0.25,
+        min_time: float = 1e-3
+) -> list[dict]:
+    """
+    Compares benchmark results to an earlier baseline, matching records by mesh, size and operation.
+
+    :param results: The new results.
+    :param baseline: The baseline results.
+    :param tolerance: Relative increase in time or peak memory which counts as a regression.
+    :param min_time: Operations which took less time than this (in seconds) are too noisy to compare.
+    :return: One comparison record per operation in both sets of results, with a `regression` flag.
+             Operations which succeeded in the baseline, but failed or are missing now, are always regressions
+             (their comparison has an `error` instead of the new time).
+    """
+    reference = {(r['mesh'], r['verts'], r['case']): r for r in baseline if 'time' in r}
+    comparisons = []
+    for r in results:
+        old = reference.pop((r['mesh'], r['verts'], r['case']), None)
+        if old is None:
+            continue
+        if 'time' not in r:
+            comparisons.append(failed_comparison(old, r.get('error', "no time recorded")))
+            continue
+        time_ratio = r['time'] / old['time']
+        memory_ratio = r['peak_bytes'] / max(old['peak_bytes'], 1)
+        slower = time_ratio > 1 + tolerance and max(r['time'], old['time']) >= min_time
+        comparisons.append(dict(
+            mesh=r['mesh'], verts=r['verts'], case=r['case'], time=r['time'], baseline_time=old['time'],
+            time_ratio=time_ratio, memory_ratio=memory_ratio, regression=slower or memory_ratio > 1 + tolerance
+        ))
+    # Whatever is left of the baseline didn't run at all
+    comparisons.extend(failed_comparison(old, "missing from the results") for old in reference.values())
+    return comparisons
+
+
+def failed_comparison(old: dict, error: str) -> dict:
+    """
+    :param old: The baseline record of an operation.
+    :param error: Why the operation has no new result.
+    :return: A comparison record for the operation, flagged as a regression.
+    """
+    return dict(
+        mesh=old['mesh'], verts=old['verts'], case=old['case'], time=None, baseline_time=old['time'],
+        time_ratio=None, memory_ratio=None, regression=True, error=error
+    )
+
+
+def print_comparison(comparisons: list[dict]):
+    for c in comparisons:
+        flag = 'REGRESSION' if c['regression'] else ''
+        if c['time'] is None:
+            print(f"{c['mesh']:26} {c['verts']:9d} {c['case']:32} {c['baseline_time']:9.4f}s -> {c['error']} {flag}")
+            continue
+        print(
+            f"{c['mesh']:26} {c['verts']:9d} {c['case']:32} {c['baseline_time']:9.4f}s -> {c['time']:9.4f}s "
+            f"(x{c['time_ratio']:.2f} time, x{c['memory_ratio']:.2f} memory) {flag}"
+        )
+    regressions = sum(c['regression'] for c in comparisons)
+    print(f"{regressions} regressions in {len(comparisons)} comparisons")
+
+
+def main(argv: list[str]) -> int:
+    """
+    Runs a benchmark from the command line (run with --help for the arguments).
+
+    :param argv: The command line arguments.
+    :return: The exit status, 1 if a regression was found.
+    """
+    parser = argparse.ArgumentParser(prog='benchmark.py')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    multigrid = commands.add_parser('multigrid', help="Compare the multigrid solver to the direct solver")
+    multigrid.add_argument('levels', type=int, nargs='?', default=3)
+
+    storage = commands.add_parser('storage', help="Compare the memory and accuracy of symmetric and float32 storage")
+    storage.add_argument('levels', type=int, nargs='?', default=3)
+
+    suite = commands.add_parser('suite', help="Measure every matrix builder and operator on scaled meshes")
+    suite.add_argument('--meshes', nargs='+', help="Names of the meshes to use (default: all tori and primitives)")
+    suite.add_argument('--cases', nargs='+', choices=BENCHMARK_CASES, help="Operations to measure (default: all)")
+    suite.add_argument('--min-verts', type=int, default=1000)
+    suite.add_argument('--max-verts', type=int, default=1_200_000)
+    suite.add_argument('--repeat', type=int, default=3)
+    suite.add_argument('--output', '-o', default='benchmark.json', help="Path of the JSON results")
+    suite.add_argument('--baseline', help="Results to compare to")
+    suite.add_argument('--tolerance', type=float, default=0.25, help="Relative slowdown which counts as regression")
+
+    compare = commands.add_parser('compare', help="Compare two sets of JSON results")
+    compare.add_argument('results')
+    compare.add_argument('baseline')
+    compare.add_argument('--tolerance', type=float, default=0.25)
+
+    args = parser.parse_args(argv)
+    if args.command == 'multigrid':
+        print_results(benchmark_multigrid(load_tori(), levels=args.levels))
+        return 0
+    if args.command == 'storage':
+        print_results(benchmark_storage(load_tori(), levels=args.levels))
+        return 0
+
+    if args.command == 'suite':
+        meshes = {**load_tori(), **load_primitives()}
+        if args.meshes:
+            # The tori may be named with or without their extension, like the primitives
+            names = [name if name in meshes else f"{name}.obj" for name in args.meshes]
+            unknown = [name for name, key in zip(args.meshes, names) if key not in meshes]
+            if unknown:
+                valid = ', '.join(name.removesuffix('.obj') for name in meshes)
+                parser.error(f"unknown meshes {', '.join(unknown)} (choose from {valid})")
+            meshes = {name: meshes[name] for name in names}
+        results = benchmark_suite(
+            meshes, args.cases, args.repeat, min_verts=args.min_verts, max_verts=args.max_verts
+        )
+        write_results(args.output, results)
+        if args.baseline is None:
+            return 0
+        baseline = read_results(args.baseline)
+    else:
+        results, baseline = read_results(args.results), read_results(args.baseline)
+
+    comparisons = compare_results(results, baseline, args.tolerance)
+    print_comparison(comparisons)
+    return int(any(c['regression'] for c in comparisons))
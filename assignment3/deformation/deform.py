@@ -1,8 +1,17 @@
-import mathutils
+from __future__ import annotations
 
+from typing import TYPE_CHECKING
+
+from assignment3.matrices.cache import *
 from assignment3.matrices.differential_coordinates import *
+from assignment3.matrices.instrumentation import *
+from assignment3.matrices.solvers import *
 from assignment3.matrices.util import *
 
+if TYPE_CHECKING:
+    import bmesh
+    import mathutils
+
 
 # !!! This function will be used for automatic grading, don't edit the signature !!!
 def gradient_deform(mesh: bmesh.types.BMesh, A: mathutils.Matrix) -> np.ndarray:
@@ -19,20 +28,7 @@ def gradient_deform(mesh: bmesh.types.BMesh, A: mathutils.Matrix) -> np.ndarray:
     :return: An Nx3 matrix representing new vertex positions for the mesh.
     """
     # TODO: Deform the gradients of the mesh and find new vertices.
-    verts = numpy_verts(mesh)
-
-    G = build_gradient_matrix(mesh)
-    M, Mv = build_mass_matrices(mesh)
-    S = build_cotangent_matrix(G, Mv)
-
-    # Apply transformation A to the gradients
-    G_transformed = (G @ verts) @ A.transposed()
-
-    # Solve for new vertex positions
-    rhs = G.T @ Mv @ G_transformed
-
-    new_verts = scipy.sparse.linalg.spsolve(S, rhs)
-    return new_verts
+    return deform_vertices(*numpy_mesh(mesh), A)
 
 
 # !!! This function will be used for automatic grading, don't edit the signature !!!
@@ -52,27 +48,205 @@ def constrained_gradient_deform(
 
     :param mesh: The mesh to be modified.
     :param selected_face_indices: List of indices indicating for which faces gradients should be changed.
-    :param A: A 3x3 transformation matrix to apply to the gradients.
+    :param A: A 3x3 transformation matrix to apply to the gradients
+              (or a Kx3x3 array with a separate matrix for each selected face).
     :return: An Nx3 matrix representing new vertex positions for the mesh.
     """
     # TODO: Deform the gradients of the mesh and find new vertices.
-    verts = numpy_verts(mesh)
+    verts, faces, polygon_index = numpy_tessellated_mesh(mesh)
+
+    # Faces with more than three vertices are split into several triangles, which all get the same transformation
+    triangles, positions = triangle_selection(polygon_index, selected_face_indices)
+    if np.ndim(A) == 3:
+        A = np.asarray(A)[positions]
+    return deform_vertices(verts, faces, A, triangles)
+
+
+def deform_vertices(
+        verts: np.ndarray,
+        faces: np.ndarray,
+        A,
+        selected_face_indices: list[int] = None,
+        storage: str = 'FULL',
+        **solver_options
+) -> np.ndarray:
+    """
+    Deforms a mesh given as vertex and face arrays, by transforming the gradients of all or only the selected faces.
 
-    # Compute the gradient matrix
-    G = build_gradient_matrix(mesh)
-    M, Mv = build_mass_matrices(mesh)
-    S = build_cotangent_matrix(G, Mv)
+    This does the work for `gradient_deform` and `constrained_gradient_deform`,
+    and additionally allows choosing the solver (see `make_solver`).
 
-    # Apply transformation A only to the selected gradients
-    G_transformed = G @ verts
+    :param verts: An Nx3 array of vertex positions.
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :param A: A 3x3 transformation matrix, or a Kx3x3 array with one matrix per selected face.
+    :param selected_face_indices: Indices of the faces whose gradients should be changed (all faces if None).
+    :param storage: How the cotangent matrix is stored, 'FULL' or 'UPPER' (see `cotangent_laplacian`).
+    :param solver_options: Solver backend and its settings, passed on to `make_solver`.
+    :return: An Nx3 matrix representing new vertex positions for the mesh.
+    """
+    if selected_face_indices is None:
+        # S is singular (translations don't change gradients, separately for every connected component),
+        # so pin one vertex of each component in place, and afterwards move the components back so that their
+        # (area-weighted) centers of mass don't change
+        deformer = GradientDeformer(verts, faces, storage=storage, **solver_options)
+        return deformer.solve(transform_gradients(deformer.gradients, A), recenter=True)
+
+    # For a selection, pin a vertex which isn't part of the selection instead (in every component)
+    key = mesh_key(verts, faces)
+    _, components = matrix_components(deformation_matrices(verts, faces, key, storage)[3])
+    is_selected = selected_vertex_mask(faces, selected_face_indices, len(verts))
+    pinned = component_pins(components, np.flatnonzero(~is_selected))
+
+    deformer = GradientDeformer(
+        verts, faces, pinned=pinned, key=key, components=components, storage=storage, **solver_options
+    )
 
-    for i in selected_face_indices:
-        for j in range(3):
-            G_transformed[i * 3 + j] = G_transformed[i * 3 + j] @ A.transposed()
+    # Apply transformation A only to the selected gradients
+    G_transformed = transform_gradients(deformer.gradients, A, selected_face_indices)
 
     # Solve for new vertex positions
-    rhs = G.T @ Mv @ G_transformed
+    return deformer.solve(G_transformed)
+
+
+def transform_gradients(gradients: np.ndarray, A, face_indices: list[int] = None) -> np.ndarray:
+    """
+    Applies a transformation to the gradients of (a selection of) the faces of a mesh.
+
+    The 3x3 gradient blocks of the selected faces are gathered, transformed with a single batched matmul,
+    and scattered back. A can either be a single 3x3 matrix, or a stack with a separate matrix for each face,
+    so spatially varying transformations cost the same as uniform ones.
+
+    :param gradients: A 3Mx3 array of gradients, as produced by `G @ verts`.
+    :param A: A 3x3 transformation matrix, or a Kx3x3 array with one matrix per selected face.
+    :param face_indices: Indices of the faces to transform (all faces if None).
+    :return: A new 3Mx3 array containing the transformed gradients.
+    """
+    A = np.asarray(A, dtype=np.float64)
+    transformed = np.array(gradients, dtype=np.float64)
+
+    # Row 3i+k of the gradients belongs to face i, so each face is a 3x3 block
+    blocks = transformed.reshape([-1, 3, 3])
+    selection = slice(None) if face_indices is None else np.asarray(face_indices, dtype=np.int64)
+
+    # Every row g of a selected block becomes g @ A^T
+    blocks[selection] = blocks[selection] @ np.swapaxes(A, -1, -2)
+    return transformed
+
+
+class GradientDeformer:
+    """
+    Everything needed to repeatedly deform the same mesh with different gradient transformations.
+
+    The gradient, mass and cotangent matrices and the factorization of S are set up once (or found in the cache),
+    after which each call to `solve` only costs a sparse product for the right-hand side and a back-substitution.
+    """
+
+    def __init__(
+            self,
+            verts: np.ndarray,
+            faces: np.ndarray,
+            pinned: list[int] = None,
+            key: str = None,
+            components: np.ndarray = None,
+            storage: str = 'FULL',
+            **solver_options
+    ):
+        """
+        :param verts: An Nx3 array of vertex positions.
+        :param faces: An Mx3 array of vertex indices, one row per triangle.
+        :param pinned: Indices of the vertices which are held in place (by default the first of every component).
+        :param key: The `mesh_key` of the vertices and faces, if it was already computed.
+        :param components: The connected component of each vertex, if it was already computed.
+        :param storage: How the cotangent matrix is stored, 'FULL' or 'UPPER' (see `cotangent_laplacian`).
+        :param solver_options: Solver backend and its settings, passed on to `make_solver`.
+        """
+        key = key or mesh_key(verts, faces)
+        self.verts = verts
+        self.G, self.M, self.Mv, self.S = deformation_matrices(verts, faces, key, storage)
+        self.components = components if components is not None else matrix_components(self.S)[1]
+        self.pinned = np.asarray(pinned) if pinned is not None else component_pins(self.components)
+        self.solver = deformation_solver(self.S, self.pinned, key, positions=verts, **solver_options)
+
+        # The (untransformed) 3Mx3 gradients of the mesh
+        self.gradients = self.G @ verts
+
+    def solve(self, target_gradients: np.ndarray, recenter: bool = False) -> np.ndarray:
+        """
+        Finds the vertex positions whose gradients best match the target gradients.
+
+        :param target_gradients: A 3Mx3 array of transformed gradients.
+        :param recenter: Whether to move every connected component of the result,
+                         so that its (area-weighted) center of mass doesn't change.
+        :return: An Nx3 matrix representing new vertex positions for the mesh.
+        """
+        rhs = self.G.T @ (self.Mv.diagonal()[:, None] * target_gradients)
+        # Iterative solvers start from the current vertex positions
+        new_verts = self.solver.solve(rhs, self.verts[self.pinned], x0=self.verts)
+
+        if recenter:
+            mass = self.M.diagonal()
+            shift = mass[:, None] * (self.verts - new_verts)
+            component_mass = np.bincount(self.components, mass)
+            component_shift = np.stack(
+                [np.bincount(self.components, shift[:, k], len(component_mass)) for k in range(3)], axis=1
+            )
+            # Vertices without faces have no mass, but they are pinned anyway
+            component_shift = np.divide(
+                component_shift, component_mass[:, None], out=np.zeros_like(component_shift),
+                where=component_mass[:, None] > 0
+            )
+            new_verts += component_shift[self.components]
+        return new_verts
+
+
+def deformation_matrices(
+        verts: np.ndarray,
+        faces: np.ndarray,
+        key: str = None,
+        storage: str = 'FULL'
+) -> tuple[sparray, sparray, sparray, sparray]:
+    """
+    Finds the gradient, mass and cotangent matrices of a mesh, reusing earlier results for an identical mesh.
 
-    new_verts = scipy.sparse.linalg.spsolve(S, rhs)
+    :param verts: An Nx3 array of vertex positions.
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :param key: The `mesh_key` of the vertices and faces, if it was already computed.
+    :param storage: How the cotangent matrix is stored, 'FULL' or 'UPPER' (see `cotangent_laplacian`).
+    :return: A tuple containing the gradient matrix $G$, the mass matrices $M$ and $Mv$, and the cotangent matrix $S$.
+    """
 
-    return new_verts
+    @traced('assembly')
+    def build():
+        # The triangle areas are shared by the gradient and mass matrices
+        areas = triangle_areas(verts, faces)
+        G = scipy.sparse.csr_array(gradient_matrix(verts, faces, areas))
+        M, Mv = mass_matrices(verts, faces, areas)
+        S = cotangent_laplacian(verts, faces, storage)
+        return G, M, Mv, S
+
+    key = key or mesh_key(verts, faces)
+    return OPERATOR_CACHE.get((key, 'deformation_matrices', storage), build)
+
+
+def deformation_solver(
+        S: sparray,
+        pinned: np.ndarray,
+        key: str,
+        positions: np.ndarray = None,
+        **solver_options
+) -> PinnedSolver:
+    """
+    Finds a solver for the cotangent matrix of a mesh, reusing earlier factorizations for an identical mesh.
+
+    :param S: The NxN cotangent matrix.
+    :param pinned: Indices of the vertices which are held in place.
+    :param key: The `mesh_key` of the mesh which S belongs to.
+    :param positions: The Nx3 vertex positions of the mesh, needed by some solvers.
+    :param solver_options: Solver backend and its settings, passed on to `make_solver`.
+    :return: A solver for S.
+    """
+    pinned = np.asarray(pinned)
+    return OPERATOR_CACHE.get(
+        (key, 'deformation_solver', pinned.tobytes(), tuple(sorted(solver_options.items()))),
+        lambda: make_solver(S, pinned=pinned, positions=positions, **solver_options)
+    )
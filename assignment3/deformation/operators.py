@@ -0,0 +1,269 @@
+import time
+
+import bmesh
+import bpy
+import mathutils
+
+from assignment3.solver_properties import SolverProperties
+
+# The deformation code (and scipy) is only imported when an operator is first used, see `assignment3.operator_classes`
+
+
+# todo: this needs a better name!
+class DifferentialCoordinateDeformBase(SolverProperties, bpy.types.Operator):
+    bl_options = {'REGISTER', 'UNDO'}
+
+    # Input parameters
+    matrix_selection_mode: bpy.props.EnumProperty(
+        name="Matrix Selection Mode", description="Method for setting up the gradient transformation matrix A.",
+        items=[
+            ('CUSTOM', "Custom Matrix", ""),
+            ('ROTATION', "Rotation", ""),
+            ('SCALE', "Scale (X, Y, Z)", ""),
+        ]
+    )
+    A_matrix: bpy.props.FloatVectorProperty(
+        name="A (matrix)",
+        description="Gradient Transformation Matrix",
+        size=[3, 3],
+        subtype='MATRIX',
+        default=mathutils.Matrix.Identity(3)
+    )
+    A_rotation: bpy.props.FloatVectorProperty(
+        name="A (rotation)",
+        description="Gradient Transformation by Rotation",
+        size=[3],
+        subtype='DIRECTION',
+        default=[0, 0, 1]
+    )
+    A_scale: bpy.props.FloatVectorProperty(
+        name="A (scale)",
+        description="Gradient Transformation by Scale",
+        size=[3],
+        subtype='XYZ_LENGTH',
+        default=[1, 1, 1]
+    )
+
+    # Output parameters
+    status: bpy.props.StringProperty(
+        name="Smoothing Status", default="Status not set"
+    )
+
+    def A(self):
+        if self.matrix_selection_mode == 'ROTATION':
+            self.A_matrix = mathutils.Vector(self.A_rotation).rotation_difference([0, 0, 1]).to_matrix()
+        if self.matrix_selection_mode == 'SCALE':
+            self.A_matrix = mathutils.Matrix([
+                [self.A_scale.x, 0, 0],
+                [0, self.A_scale.y, 0],
+                [0, 0, self.A_scale.z],
+            ])
+        return self.A_matrix
+
+    @classmethod
+    def poll(cls, context):
+        return (
+                context.view_layer.objects.active is not None
+                and context.view_layer.objects.active.type == 'MESH'
+        )
+
+    def draw(self, context):
+        layout = self.layout
+
+        row = layout.row(align=True)
+        row.label(text="Object to deform: ")
+        row.separator()
+        row.prop(context.view_layer.objects, 'active', text="", expand=True, emboss=False)
+        layout.separator()
+
+        layout.prop(self, 'matrix_selection_mode')
+        if self.matrix_selection_mode == 'CUSTOM':
+            layout.prop(self, 'A_matrix', text='')
+        elif self.matrix_selection_mode == 'ROTATION':
+            layout.prop(self, 'A_rotation', text='')
+        elif self.matrix_selection_mode == 'SCALE':
+            layout.prop(self, 'A_scale', text='')
+
+        layout.separator()
+        self.draw_solver_properties(layout)
+
+        layout.prop(self, 'status', text="Status", emboss=False)
+
+
+class DifferentialCoordinateDeform(DifferentialCoordinateDeformBase):
+    bl_idname = "object.differential_deform"
+    bl_label = "Mesh Gradient Deformation"
+
+    def invoke(self, context, event):
+        return self.execute(context)
+
+    def execute(self, context):
+        from assignment3.matrices.instrumentation import TRACER
+        from assignment3.matrices.util import numpy_mesh, set_verts
+        from .deform import deform_vertices
+
+        with TRACER.operation(self.bl_label) as trace:
+            active_object = context.view_layer.objects.active
+
+            # Polygons are split into (cached) triangles on the fly, so the mesh itself doesn't need to be triangulated
+            mesh = active_object.data
+
+            # Apply the deformation
+            self.status = f"Computing deformation"
+            new_verts = deform_vertices(*numpy_mesh(mesh), self.A(), **self.solver_options())
+
+            # Write the results back to the underlying mesh (only the vertices move, the topology is left untouched)
+            self.status = f"Updating Mesh"
+            set_verts(mesh, new_verts)
+            mesh.update()
+
+        self.status = trace.summary() if trace else "Done"
+        return {'FINISHED'}
+
+    @staticmethod
+    def menu_func(menu, context):
+        menu.layout.operator(DifferentialCoordinateDeform.bl_idname)
+
+
+class ModalDifferentialCoordinateDeform(DifferentialCoordinateDeform):
+    bl_idname = "object.modal_differential_deform"
+    bl_label = "Interactive Mesh Gradient Deformation"
+
+    modal_axis: bpy.props.EnumProperty(
+        name="Axis", description="Axis which is scaled or rotated around when moving the mouse (press X, Y or Z)",
+        items=[
+            ('X', "X", ""),
+            ('Y', "Y", ""),
+            ('Z', "Z", ""),
+        ],
+        # Rotating the direction of A (rotation) around itself has no effect, so the default axis must not be
+        # parallel to its default (the Z axis), or moving the mouse would do nothing until X or Y is pressed
+        default='X'
+    )
+
+    @classmethod
+    def poll(cls, context):
+        # The mesh data is only up-to-date in object mode
+        return super().poll(context) and context.mode == 'OBJECT'
+
+    def invoke(self, context, event):
+        from assignment3.matrices.util import numpy_mesh
+        from .deform import GradientDeformer
+
+        active_object = context.view_layer.objects.active
+
+        # Polygons are split into (cached) triangles on the fly, so the mesh itself doesn't need to be triangulated
+        verts, faces = numpy_mesh(active_object.data)
+
+        # Everything except the right-hand side and the back-substitution is done once, up front
+        self.status = f"Factorizing"
+        self._deformer = GradientDeformer(verts, faces, **self.solver_options())
+        self._start_mouse_x = event.mouse_x
+        self._start_A_matrix = mathutils.Matrix(self.A_matrix)
+        self._start_A_rotation = mathutils.Vector(self.A_rotation)
+        self._start_A_scale = mathutils.Vector(self.A_scale)
+
+        context.window_manager.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        from assignment3.matrices.util import set_verts
+        from .deform import transform_gradients
+
+        active_object = context.view_layer.objects.active
+
+        if event.type in {'X', 'Y', 'Z'} and event.value == 'PRESS':
+            self.modal_axis = event.type
+        elif event.type in {'LEFTMOUSE', 'RET', 'NUMPAD_ENTER'} and event.value == 'PRESS':
+            context.area.header_text_set(None)
+            return {'FINISHED'}
+        elif event.type in {'RIGHTMOUSE', 'ESC'} and event.value == 'PRESS':
+            set_verts(active_object.data, self._deformer.verts)
+            active_object.data.update()
+            context.area.header_text_set(None)
+            return {'CANCELLED'}
+        elif event.type != 'MOUSEMOVE':
+            return {'RUNNING_MODAL'}
+
+        self.update_A(event.mouse_x - self._start_mouse_x)
+
+        # Only the right-hand side and a back-substitution have to be computed for each event
+        start = time.perf_counter()
+        G_transformed = transform_gradients(self._deformer.gradients, self.A())
+        new_verts = self._deformer.solve(G_transformed, recenter=True)
+        solve_time = time.perf_counter() - start
+
+        set_verts(active_object.data, new_verts)
+        active_object.data.update()
+
+        self.status = f"Solve: {1000 * solve_time:.1f} ms"
+        context.area.header_text_set(f"Gradient deformation ({self.modal_axis} axis), {self.status}")
+        return {'RUNNING_MODAL'}
+
+    def update_A(self, mouse_offset: int):
+        """
+        Changes the rotation or scale of A based on how far the mouse has moved since the operator was started.
+
+        :param mouse_offset: Horizontal mouse movement in pixels.
+        """
+        axis = 'XYZ'.index(self.modal_axis)
+        if self.matrix_selection_mode == 'ROTATION':
+            rotation = mathutils.Matrix.Rotation(mouse_offset * 0.01, 3, self.modal_axis)
+            self.A_rotation = rotation @ self._start_A_rotation
+        elif self.matrix_selection_mode == 'SCALE':
+            scale = mathutils.Vector(self._start_A_scale)
+            scale[axis] *= max(1.0 + mouse_offset * 0.005, 0.0)
+            self.A_scale = scale
+        else:
+            self.A_matrix = self._start_A_matrix * max(1.0 + mouse_offset * 0.005, 0.0)
+
+    @staticmethod
+    def menu_func(menu, context):
+        menu.layout.operator(ModalDifferentialCoordinateDeform.bl_idname)
+
+
+class ConstrainedDifferentialCoordinateDeform(DifferentialCoordinateDeformBase):
+    bl_idname = "object.constrained_differential_deform"
+    bl_label = "Constrained Mesh Gradient Deformation"
+
+    def invoke(self, context, event):
+        return self.execute(context)
+
+    def execute(self, context):
+        from assignment3.matrices.instrumentation import TRACER
+        from assignment3.matrices.util import numpy_selected_faces, numpy_tessellated_mesh, set_verts, triangle_selection
+        from .deform import deform_vertices
+
+        with TRACER.operation(self.bl_label) as trace:
+            active_object = context.view_layer.objects.active
+
+            # Produce BMesh types to work with
+            mesh = bmesh.from_edit_mesh(active_object.data)
+
+            # Determine selected faces, and the triangles they are split into (the mesh itself isn't triangulated)
+            selected_face_indices = numpy_selected_faces(mesh)
+            self.num_selected_faces = len(selected_face_indices)
+            verts, faces, polygon_index = numpy_tessellated_mesh(mesh)
+            selected_triangles, _ = triangle_selection(polygon_index, selected_face_indices)
+
+            # Apply the deformation
+            self.status = f"Computing deformation"
+            new_verts = deform_vertices(verts, faces, self.A(), selected_triangles, **self.solver_options())
+
+            # Update the original mesh
+            self.status = f"Updating Mesh"
+            set_verts(mesh, new_verts)
+            bmesh.update_edit_mesh(active_object.data)
+
+        self.status = trace.summary() if trace else "Done"
+        return {'FINISHED'}
+
+    @staticmethod
+    def menu_func(menu, context):
+        menu.layout.operator(ConstrainedDifferentialCoordinateDeform.bl_idname)
+
+
+def register():
+    bpy.types.VIEW3D_MT_object.append(DifferentialCoordinateDeform.menu_func)
+    bpy.types.VIEW3D_MT_object.append(ModalDifferentialCoordinateDeform.menu_func)
+    bpy.types.VIEW3D_MT_edit_mesh.append(ConstrainedDifferentialCoordinateDeform.menu_func)
@@ -1,7 +1,55 @@
 import unittest
+import bmesh
+import mathutils
 from data import primitives, meshes
 from .deform import *
 
 
 # HINT: Add your own unit tests here
 
+class TestGradientDeform(unittest.TestCase):
+
+    def test_identity_leaves_mesh_unchanged(self):
+        mesh = primitives.TORUS.copy()
+        bmesh.ops.triangulate(mesh, faces=mesh.faces)
+
+        new_verts = gradient_deform(mesh, mathutils.Matrix.Identity(3))
+        np.testing.assert_allclose(new_verts, numpy_verts(mesh), atol=1e-5)
+
+    def test_quads_are_not_triangulated(self):
+        mesh = primitives.TORUS.copy()
+        num_faces = len(mesh.faces)
+
+        new_verts = constrained_gradient_deform(mesh, [0, 1, 2], mathutils.Matrix.Identity(3))
+        np.testing.assert_allclose(new_verts, numpy_verts(mesh), atol=1e-5)
+        self.assertEqual(len(mesh.faces), num_faces)
+
+    def test_several_components(self):
+        # Every torus gets its own pin, so the system isn't singular, and both stay in place
+        verts, loops, loop_totals = meshes.load_arrays('two-tori')
+        verts, faces = np.array(verts), meshes.triangulate_polygons(loops, loop_totals)
+        np.testing.assert_allclose(deform_vertices(verts, faces, np.identity(3)), verts, atol=1e-8)
+
+        deformer = GradientDeformer(verts, faces)
+        self.assertEqual(len(deformer.pinned), 2)
+        np.testing.assert_array_equal(np.unique(deformer.components[deformer.pinned]), [0, 1])
+
+
+
+class TestTransformGradients(unittest.TestCase):
+
+    def test_matches_per_row_transform(self):
+        gradients = np.random.rand(3 * 10, 3)
+        A = mathutils.Matrix.Rotation(0.3, 3, 'X')
+        selected_face_indices = [1, 4, 7]
+
+        expected = gradients.copy()
+        for i in selected_face_indices:
+            for j in range(3):
+                expected[i * 3 + j] = expected[i * 3 + j] @ A.transposed()
+
+        np.testing.assert_allclose(transform_gradients(gradients, A, selected_face_indices), expected)
+
+        # A stack with a (here identical) matrix per selected face gives the same result
+        A_stack = np.stack([np.asarray(A)] * len(selected_face_indices))
+        np.testing.assert_allclose(transform_gradients(gradients, A_stack, selected_face_indices), expected)
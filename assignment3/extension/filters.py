@@ -0,0 +1,285 @@
+import numpy as np
+import numpy.polynomial.chebyshev as chebyshev
+import scipy
+import scipy.linalg
+import scipy.sparse.linalg
+from scipy.sparse import sparray
+
+from assignment3.matrices.instrumentation import traced
+
+try:
+    # Computes Y += A @ X for a CSR matrix A, without allocating a result (this is what scipy uses internally)
+    from scipy.sparse._sparsetools import csr_matvecs
+except ImportError:  # pragma: no cover, the module is private so it may move in future scipy versions
+    csr_matvecs = None
+
+# Filters available through `ExplicitSmoother.smooth`
+EXPLICIT_FILTERS = ('EXPLICIT', 'CHEBYSHEV', 'TAUBIN')
+
+
+class ExplicitSmoother:
+    """
+    Applies explicit Laplacian smoothing filters to all three coordinates of a mesh at once.
+
+    L is converted to CSR once, and each step is a single sparse product with the whole Nx3 block of vertices,
+    written into one of two (ping-pong) buffers which are reused for every step.
+
+    Three filters are available:
+        - 'EXPLICIT': `iterations` steps of x <- (I - tau L) x, like `explicit_laplace_smooth`.
+        - 'CHEBYSHEV': the same filter (1 - tau lambda)^iterations, approximated by a Chebyshev polynomial in L.
+                       Smooth filters need a far lower degree than `iterations`, so this needs fewer products.
+        - 'TAUBIN': alternating shrinking (tau) and inflating (mu < -tau) steps,
+                    which smooths without shrinking the mesh.
+
+    This assumes the spectrum of L lies in [0, 2], which holds for the normalized combinatorial Laplacian.
+    """
+
+    def __init__(self, L: sparray):
+        """
+        :param L: The NxN sparse Laplacian matrix.
+        """
+        self.L = scipy.sparse.csr_array(L, dtype=np.float64)
+        self.L.sum_duplicates()
+        self.identity = scipy.sparse.identity(self.L.shape[0], dtype=np.float64, format='csr')
+
+        # Number of sparse products performed by the most recent call to `smooth`
+        self.products = 0
+
+    def step_matrix(self, scale: float) -> sparray:
+        """
+        :param scale: Weight of the Laplacian.
+        :return: The sparse matrix (I + scale * L), in CSR format.
+        """
+        B = scipy.sparse.csr_array(self.identity + scale * self.L)
+        B.sum_duplicates()
+        return B
+
+    def _product(self, B: sparray, X: np.ndarray, out: np.ndarray):
+        # Writes B @ X into out, for Nx3 arrays X and out
+        if csr_matvecs is None:
+            out[:] = B @ X
+        else:
+            out.fill(0.0)
+            csr_matvecs(B.shape[0], B.shape[1], X.shape[1], B.indptr, B.indices, B.data, X.ravel(), out.ravel())
+        self.products += 1
+
+    def explicit(self, X: np.ndarray, tau: float, iterations: int) -> np.ndarray:
+        """
+        :param X: An Nx3 array of vertex positions.
+        :param tau: Update weight of every step.
+        :param iterations: Number of steps.
+        :return: The smoothed positions, as a new Nx3 array.
+        """
+        B = self.step_matrix(-tau)
+        current, scratch = np.array(X, dtype=np.float64, order='C'), np.empty(X.shape)
+        for _ in range(iterations):
+            self._product(B, current, scratch)
+            current, scratch = scratch, current
+        return current
+
+    def taubin(self, X: np.ndarray, tau: float, iterations: int, pass_band: float = 0.1) -> np.ndarray:
+        """
+        :param X: An Nx3 array of vertex positions.
+        :param tau: Weight of the shrinking steps.
+        :param iterations: Number of shrinking and inflating step pairs.
+        :param pass_band: Frequency below which the filter leaves the shape (nearly) unchanged,
+                          this determines the weight of the inflating steps: 1 / tau + 1 / mu = pass_band.
+        :return: The smoothed positions, as a new Nx3 array.
+        """
+        if tau == 0.0:
+            # Without shrinking there is nothing to compensate for, like explicit steps with tau = 0
+            return np.array(X, dtype=np.float64)
+        mu = 1.0 / (pass_band - 1.0 / tau)
+        shrink, inflate = self.step_matrix(-tau), self.step_matrix(-mu)
+        current, scratch = np.array(X, dtype=np.float64, order='C'), np.empty(X.shape)
+        for _ in range(iterations):
+            self._product(shrink, current, scratch)
+            self._product(inflate, scratch, current)
+        return current
+
+    @staticmethod
+    def chebyshev_coefficients(tau: float, iterations: int, tol: float = 1e-4) -> np.ndarray:
+        """
+        Finds the lowest degree Chebyshev series which approximates (1 - tau lambda)^iterations on [0, 2].
+
+        :param tau: Update weight of the explicit steps.
+        :param iterations: Number of explicit steps.
+        :param tol: Largest allowed error of the approximation.
+        :return: The coefficients of the series in t = lambda - 1.
+        """
+
+        def response(t):
+            return (1.0 - tau * (t + 1.0)) ** iterations
+
+        samples = np.linspace(-1, 1, 4 * iterations + 8)
+        exact = response(samples)
+        for degree in range(1, iterations):
+            coefficients = chebyshev.chebinterpolate(response, degree)
+            if np.abs(chebyshev.chebval(samples, coefficients) - exact).max() < tol:
+                return coefficients
+
+        # The filter is a polynomial of degree `iterations`, so this is exact
+        return chebyshev.chebinterpolate(response, iterations)
+
+    def chebyshev(self, X: np.ndarray, tau: float, iterations: int, tol: float = 1e-4) -> np.ndarray:
+        """
+        :param X: An Nx3 array of vertex positions.
+        :param tau: Update weight of the explicit steps which are approximated.
+        :param iterations: Number of explicit steps which are approximated.
+        :param tol: Largest allowed error of the filter response.
+        :return: The smoothed positions, as a new Nx3 array.
+        """
+        coefficients = self.chebyshev_coefficients(tau, iterations, tol)
+
+        # Three term recurrence T_{k+1} = 2 (L - I) T_k - T_{k-1}, with T_0 = X and T_1 = (L - I) X
+        shifted = scipy.sparse.csr_array(self.L - self.identity)
+        shifted.sum_duplicates()
+        doubled = scipy.sparse.csr_array(2.0 * shifted)
+
+        previous = np.array(X, dtype=np.float64, order='C')
+        current, scratch = np.empty(X.shape), np.empty(X.shape)
+        result = coefficients[0] * previous
+        if len(coefficients) > 1:
+            self._product(shifted, previous, current)
+            np.multiply(current, coefficients[1], out=scratch)
+            result += scratch
+
+        for c in coefficients[2:]:
+            # T_{k+1} = 2 (L - I) T_k - T_{k-1}, written over T_{k-1}
+            np.negative(previous, out=scratch)
+            self._product(doubled, current, previous)
+            previous += scratch
+            previous, current = current, previous
+
+            np.multiply(current, c, out=scratch)
+            result += scratch
+
+        return result
+
+    @traced('solve')
+    def smooth(self, X: np.ndarray, tau: float, iterations: int, method: str = 'EXPLICIT', **options) -> np.ndarray:
+        """
+        Smooths an array of vertices with one of the available filters.
+
+        :param X: An Nx3 array of vertex positions.
+        :param tau: Update weight.
+        :param iterations: Number of explicit smoothing iterations (or Taubin step pairs).
+        :param method: One of 'EXPLICIT', 'CHEBYSHEV' or 'TAUBIN'.
+        :param options: Further options of the filter (tol for 'CHEBYSHEV', pass_band for 'TAUBIN').
+        :return: The smoothed positions, as a new Nx3 array.
+        """
+        self.products = 0
+        if method == 'EXPLICIT':
+            return self.explicit(X, tau, iterations)
+        if method == 'CHEBYSHEV':
+            return self.chebyshev(X, tau, iterations, **options)
+        if method == 'TAUBIN':
+            return self.taubin(X, tau, iterations, **options)
+        raise ValueError(f"Unknown explicit filter '{method}', expected one of {EXPLICIT_FILTERS}")
+
+
+# Filters available through `spectral_response`
+SPECTRAL_FILTERS = ('IMPLICIT', 'EXPLICIT', 'LOW_PASS', 'EXAGGERATE')
+
+
+class SpectralBasis:
+    """
+    The lowest k generalized eigenpairs S phi = lambda M phi of a mesh Laplacian.
+
+    The eigenvectors Phi are M-orthonormal (Phi^T M Phi = I), so the spectral coefficients of vertex positions X
+    are C = Phi^T M X. Once the basis is known, any filter g(lambda) is applied with two O(Nk) products:
+
+        X' = Phi (g(lambda) * C) + r (X - Phi C)
+
+    where the residual X - Phi C holds the frequencies above the basis, which are all scaled by the response r
+    of the highest eigenvalue in the basis.
+
+    For the cotangent Laplacian, S is the cotangent matrix and M the mass matrix. For the normalized combinatorial
+    Laplacian L = I - D^-1 A, S = D - A and M = D (the degree matrix), which has the same eigenvalues as L.
+    """
+
+    @traced('factorization')
+    def __init__(self, S: sparray, M: sparray, k: int = 100):
+        """
+        :param S: The NxN sparse (symmetric positive semi-definite) stiffness matrix.
+        :param M: The NxN sparse (symmetric positive definite) mass matrix.
+        :param k: Number of eigenpairs to compute.
+        """
+        S, M = scipy.sparse.csc_array(S, dtype=np.float64), scipy.sparse.csc_array(M, dtype=np.float64)
+        num_verts = S.shape[0]
+        k = min(k, num_verts)
+
+        if k >= num_verts - 1:
+            # The iterative eigensolver needs k < N - 1, but then a dense solve is cheap anyway
+            eigenvalues, basis = scipy.linalg.eigh(S.toarray(), M.toarray())
+        else:
+            # Shift-invert Lanczos around a small negative shift, which keeps S - sigma M positive definite
+            sigma = -1e-6 * float(np.mean(S.diagonal() / M.diagonal()))
+            eigenvalues, basis = scipy.sparse.linalg.eigsh(S, k=k, M=M, sigma=sigma, which='LM')
+
+        order = np.argsort(eigenvalues)[:k]
+        self.eigenvalues, self.basis = eigenvalues[order], np.ascontiguousarray(basis[:, order])
+        self.M = M
+
+    def coefficients(self, X: np.ndarray) -> np.ndarray:
+        """
+        :param X: An Nx3 array of vertex positions.
+        :return: The kx3 spectral coefficients of X.
+        """
+        return self.basis.T @ (self.M @ X)
+
+    @traced('solve')
+    def filter(self, X: np.ndarray, response, coefficients: np.ndarray = None) -> np.ndarray:
+        """
+        Applies a spectral filter to an array of vertices.
+
+        :param X: An Nx3 array of vertex positions.
+        :param response: The response of the filter, either a function of the eigenvalues or an array of k values.
+        :param coefficients: The spectral coefficients of X, if they were already computed.
+        :return: The filtered vertex positions, as an Nx3 array.
+        """
+        if coefficients is None:
+            coefficients = self.coefficients(X)
+        if callable(response):
+            response = response(self.eigenvalues)
+        response = np.asarray(response, dtype=np.float64)
+
+        low_frequencies = self.basis @ coefficients
+        return self.basis @ (response[:, None] * coefficients) + response[-1] * (X - low_frequencies)
+
+
+def spectral_response(
+        eigenvalues: np.ndarray,
+        method: str,
+        tau: float = 0.0,
+        iterations: int = 1,
+        cutoff: int = None,
+        gain: float = 1.0
+) -> np.ndarray:
+    """
+    Computes the response of one of the standard spectral filters.
+
+        - 'IMPLICIT': (1 + tau lambda)^-iterations, the same as implicit smoothing with a fixed operator.
+        - 'EXPLICIT': (1 - tau lambda)^iterations, the same as explicit smoothing.
+        - 'LOW_PASS': keeps the lowest `cutoff` frequencies, and removes all others.
+        - 'EXAGGERATE': scales all but the lowest `cutoff` frequencies by (1 + gain), enhancing details.
+
+    :param eigenvalues: The k eigenvalues of a `SpectralBasis`, in increasing order.
+    :param method: One of 'IMPLICIT', 'EXPLICIT', 'LOW_PASS' or 'EXAGGERATE'.
+    :param tau: Update weight of the smoothing filters.
+    :param iterations: Number of smoothing iterations of the smoothing filters.
+    :param cutoff: Number of frequencies which are kept (by 'LOW_PASS') or left unchanged (by 'EXAGGERATE').
+    :param gain: Amount by which 'EXAGGERATE' enhances the higher frequencies.
+    :return: An array with the response for each eigenvalue.
+    """
+    if method == 'IMPLICIT':
+        return (1.0 + tau * eigenvalues) ** -iterations
+    if method == 'EXPLICIT':
+        return (1.0 - tau * eigenvalues) ** iterations
+
+    is_low = np.arange(len(eigenvalues)) < (cutoff if cutoff is not None else len(eigenvalues) // 2)
+    if method == 'LOW_PASS':
+        return is_low.astype(np.float64)
+    if method == 'EXAGGERATE':
+        return np.where(is_low, 1.0, 1.0 + gain)
+    raise ValueError(f"Unknown spectral filter '{method}', expected one of {SPECTRAL_FILTERS}")
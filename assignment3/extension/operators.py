@@ -0,0 +1,404 @@
+import bmesh
+import bpy.props
+import mathutils
+
+from assignment3.solver_properties import SolverProperties
+
+# The smoothing code (and scipy) is only imported when an operator is first used, see `assignment3.operator_classes`
+
+# Choices for how often implicit smoothing rebuilds its operator, see `implicit_smoothing_iterations`
+OPERATOR_UPDATE_ITEMS = [
+    ('EVERY', "Every Iteration", "Rebuild and factorize the operator from the current geometry for every iteration"),
+    ('LAGGED', "Lagged", "Only rebuild the operator every few iterations"),
+    ('FIXED', "Fixed", "Build and factorize the operator once, from the original geometry"),
+]
+
+
+class LaplaceCoordinateDeformBase(SolverProperties, bpy.types.Operator):
+    bl_options = {'REGISTER', 'UNDO'}
+
+    # Whether this operator solves a linear system (and should show the solver settings)
+    uses_solver = False
+
+    # Whether this operator only changes the selected part of the mesh (and should show the region settings)
+    uses_selection = False
+
+    # Input parameters
+    matrix_selection_mode: bpy.props.EnumProperty(
+        name="Matrix Selection Mode", description="Method for setting up the gradient transformation matrix A.",
+        items=[
+            ('CUSTOM', "Custom Matrix", ""),
+            ('ROTATION', "Rotation", ""),
+            ('SCALE', "Scale (X, Y, Z)", ""),
+        ]
+    )
+
+    tau: bpy.props.FloatProperty(
+        name="Tau",
+        description="Weight for the deformation",
+        default=0.0001,
+        min=0.0,
+        max=1.0
+    )
+
+    it: bpy.props.IntProperty(
+        name="Iterations",
+        description="Number of iterations",
+        default=1,
+        min=1
+    )
+
+    operator_update: bpy.props.EnumProperty(
+        name="Operator Update", description="How often the implicit smoothing operator is rebuilt.",
+        items=OPERATOR_UPDATE_ITEMS, default='EVERY'
+    )
+
+    refresh_interval: bpy.props.IntProperty(
+        name="Refresh Interval",
+        description="Number of iterations between operator updates",
+        default=5,
+        min=1
+    )
+
+    local_solve: bpy.props.BoolProperty(
+        name="Local Region",
+        description="Only smooth the selection and its surroundings, holding the ring around them fixed",
+        default=True
+    )
+
+    halo: bpy.props.IntProperty(
+        name="Halo",
+        description="Number of rings of neighbours around the selection which are smoothed with it",
+        default=4,
+        min=0
+    )
+
+    explicit_method: bpy.props.EnumProperty(
+        name="Filter", description="Filter used for explicit smoothing.",
+        items=[
+            ('EXPLICIT', "Explicit Steps", "Apply the explicit smoothing step once per iteration"),
+            ('CHEBYSHEV', "Chebyshev", "Approximate all iterations at once with a (lower degree) Chebyshev polynomial"),
+            ('TAUBIN', "Taubin", "Alternate shrinking and inflating steps, which smooths without shrinking the mesh"),
+        ]
+    )
+
+    # Output parameters
+    status: bpy.props.StringProperty(
+        name="Smoothing Status", default="Status not set"
+    )
+
+    def tau(self):
+        return self.tau
+
+    @classmethod
+    def poll(cls, context):
+        return (
+                context.view_layer.objects.active is not None
+                and context.view_layer.objects.active.type == 'MESH'
+        )
+
+    def draw(self, context):
+        layout = self.layout
+
+        row = layout.row(align=True)
+        row.label(text="Object to deform: ")
+        row.separator()
+        row.prop(context.view_layer.objects, 'active', text="", expand=True, emboss=False)
+        layout.separator()
+
+        layout.prop(self, 'tau', text="Tau")
+        layout.prop(self, 'it', text="Iterations")
+
+        if self.uses_selection:
+            layout.prop(self, 'local_solve')
+            if self.local_solve:
+                layout.prop(self, 'halo')
+
+        if self.uses_solver:
+            layout.prop(self, 'operator_update')
+            if self.operator_update == 'LAGGED':
+                layout.prop(self, 'refresh_interval')
+            layout.separator()
+            self.draw_solver_properties(layout)
+        else:
+            layout.prop(self, 'explicit_method')
+
+        layout.prop(self, 'status', text="Status", emboss=False)
+
+class ImplicitLaplaceCoordinateDeform(LaplaceCoordinateDeformBase):
+    bl_idname = "object.implicit_laplace_deform"
+    bl_label = "Implicit Laplace coordinates Deformation"
+    uses_solver = True
+
+    def invoke(self, context, event):
+        return self.execute(context)
+
+    def execute(self, context):
+        from assignment3.matrices.instrumentation import TRACER
+        from .smooth_brush import laplace_deform
+
+        with TRACER.operation(self.bl_label) as trace:
+            active_object = context.view_layer.objects.active
+
+            # Polygons are split into (cached) triangles on the fly, so the mesh itself doesn't need to be triangulated
+            mesh = active_object.data
+
+            # Apply the deformation
+            self.status = f"Computing deformation"
+
+            laplace_deform(
+                mesh, tau=self.tau, it=self.it, operator_update=self.operator_update,
+                refresh_interval=self.refresh_interval, **self.solver_options()
+            )
+
+            # Only the vertices were moved, so the mesh just needs to be told it changed
+            self.status = f"Updating Mesh"
+            mesh.update()
+
+        self.status = trace.summary() if trace else "Done"
+        return {'FINISHED'}
+
+    @staticmethod
+    def menu_func(menu, context):
+        menu.layout.operator(ImplicitLaplaceCoordinateDeform.bl_idname)
+
+class ExplicitLaplaceCoordinateDeform(LaplaceCoordinateDeformBase):
+    bl_idname = "object.explicit_laplace_deform"
+    bl_label = "Explicit Laplace coordinates Deformation"
+
+    def invoke(self, context, event):
+        return self.execute(context)
+
+    def execute(self, context):
+        from assignment3.matrices.instrumentation import TRACER
+        from .smooth_brush import iterative_explicit_laplace_smooth
+
+        with TRACER.operation(self.bl_label) as trace:
+            active_object = context.view_layer.objects.active
+
+            # Polygons are split into (cached) triangles on the fly, so the mesh itself doesn't need to be triangulated
+            mesh = active_object.data
+
+            # Apply the deformation
+            self.status = f"Computing deformation"
+
+            iterative_explicit_laplace_smooth(mesh, tau=self.tau, it=self.it, method=self.explicit_method)
+
+            # Only the vertices were moved, so the mesh just needs to be told it changed
+            self.status = f"Updating Mesh"
+            mesh.update()
+
+        self.status = trace.summary() if trace else "Done"
+        return {'FINISHED'}
+
+    @staticmethod
+    def menu_func(menu, context):
+        menu.layout.operator(ExplicitLaplaceCoordinateDeform.bl_idname)
+
+
+class ImplicitConstrainedLaplaceCoordinateDeform(LaplaceCoordinateDeformBase):
+    bl_idname = "object.implicit_constrained_laplace_deform"
+    bl_label = "Implicit Constrained Laplace Coordinates Deformation"
+    uses_solver = True
+    uses_selection = True
+
+    # The constrained deformation smooths with the operator of the original geometry by default
+    operator_update: bpy.props.EnumProperty(
+        name="Operator Update", description="How often the implicit smoothing operator is rebuilt.",
+        items=OPERATOR_UPDATE_ITEMS, default='FIXED'
+    )
+
+    def invoke(self, context, event):
+        return self.execute(context)
+
+    def execute(self, context):
+        from assignment3.matrices.instrumentation import TRACER
+        from assignment3.matrices.util import numpy_selected_faces
+        from .smooth_brush import constrained_implicit_laplace_deform
+
+        with TRACER.operation(self.bl_label) as trace:
+            active_object = context.view_layer.objects.active
+
+            # Produce BMesh types to work with (the faces are split into triangles on the fly, without triangulating)
+            mesh = bmesh.from_edit_mesh(active_object.data)
+
+            # Determine selected faces
+            selected_face_indices = numpy_selected_faces(mesh)
+            self.num_selected_faces = len(selected_face_indices)
+
+            # Apply the deformation
+            constrained_implicit_laplace_deform(
+                mesh, selected_face_indices, self.tau, self.it, operator_update=self.operator_update,
+                refresh_interval=self.refresh_interval, halo=self.halo if self.local_solve else None,
+                **self.solver_options()
+            )
+
+            # Update the original mesh
+            self.status = f"Updating Mesh"
+            # set_verts(mesh, new_verts)
+            bmesh.update_edit_mesh(active_object.data)
+
+        self.status = trace.summary() if trace else "Done"
+        return {'FINISHED'}
+
+    @staticmethod
+    def menu_func(menu, context):
+        menu.layout.operator(ImplicitConstrainedLaplaceCoordinateDeform.bl_idname)
+
+class ExplicitConstrainedLaplaceCoordinateDeform(LaplaceCoordinateDeformBase):
+    bl_idname = "object.explicit_constrained_laplace_deform"
+    bl_label = "Explicit Constrained Laplace Coordinates Deformation"
+    uses_selection = True
+
+    def invoke(self, context, event):
+        return self.execute(context)
+
+    def execute(self, context):
+        from assignment3.matrices.instrumentation import TRACER
+        from assignment3.matrices.util import numpy_selected_faces
+        from .smooth_brush import constrained_explicit_laplace_deform
+
+        with TRACER.operation(self.bl_label) as trace:
+            active_object = context.view_layer.objects.active
+
+            # Produce BMesh types to work with (the faces are split into triangles on the fly, without triangulating)
+            mesh = bmesh.from_edit_mesh(active_object.data)
+
+            # Determine selected faces
+            selected_face_indices = numpy_selected_faces(mesh)
+            self.num_selected_faces = len(selected_face_indices)
+
+            # Apply the deformation
+            constrained_explicit_laplace_deform(
+                mesh, selected_face_indices, self.tau, self.it, self.explicit_method,
+                halo=self.halo if self.local_solve else None
+            )
+
+            # Update the original mesh
+            self.status = f"Updating Mesh"
+            # set_verts(mesh, new_verts)
+            bmesh.update_edit_mesh(active_object.data)
+
+        self.status = trace.summary() if trace else "Done"
+        return {'FINISHED'}
+
+    @staticmethod
+    def menu_func(menu, context):
+        menu.layout.operator(ExplicitConstrainedLaplaceCoordinateDeform.bl_idname)
+
+
+class SpectralLaplaceCoordinateDeform(LaplaceCoordinateDeformBase):
+    bl_idname = "object.spectral_laplace_deform"
+    bl_label = "Spectral Laplace coordinates Deformation"
+
+    laplacian: bpy.props.EnumProperty(
+        name="Laplacian", description="Laplacian whose eigenvectors are used as the frequency basis.",
+        items=[
+            ('COTANGENT', "Cotangent", "Cotangent Laplacian with the mass matrix (depends on the geometry)"),
+            ('COMBINATORIAL', "Combinatorial", "Normalized combinatorial Laplacian (only depends on the connectivity)"),
+        ]
+    )
+
+    spectral_filter: bpy.props.EnumProperty(
+        name="Filter", description="Filter applied to the spectral coefficients of the vertex positions.",
+        items=[
+            ('IMPLICIT', "Implicit Smoothing", "Same as repeated implicit smoothing with Tau"),
+            ('EXPLICIT', "Explicit Smoothing", "Same as repeated explicit smoothing with Tau"),
+            ('LOW_PASS', "Low Pass", "Only keep the lowest frequencies"),
+            ('EXAGGERATE', "Exaggerate", "Enhance all but the lowest frequencies"),
+        ]
+    )
+
+    num_eigenvectors: bpy.props.IntProperty(
+        name="Eigenvectors",
+        description="Number of eigenvectors in the basis (computed once per mesh)",
+        default=100,
+        min=2
+    )
+
+    cutoff: bpy.props.IntProperty(
+        name="Cutoff",
+        description="Number of low frequencies which are kept or left unchanged",
+        default=20,
+        min=1
+    )
+
+    gain: bpy.props.FloatProperty(
+        name="Gain",
+        description="Amount by which the higher frequencies are enhanced",
+        default=1.0,
+        min=0.0
+    )
+
+    def invoke(self, context, event):
+        return self.execute(context)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, 'laplacian')
+        layout.prop(self, 'num_eigenvectors')
+        layout.prop(self, 'spectral_filter')
+        if self.spectral_filter in ('IMPLICIT', 'EXPLICIT'):
+            layout.prop(self, 'tau', text="Tau")
+            layout.prop(self, 'it', text="Iterations")
+        else:
+            layout.prop(self, 'cutoff')
+            if self.spectral_filter == 'EXAGGERATE':
+                layout.prop(self, 'gain')
+        layout.prop(self, 'status', text="Status", emboss=False)
+
+    def execute(self, context):
+        from assignment3.matrices.instrumentation import TRACER
+        from .smooth_brush import spectral_smooth
+
+        with TRACER.operation(self.bl_label) as trace:
+            active_object = context.view_layer.objects.active
+
+            # Polygons are split into (cached) triangles on the fly, so the mesh itself doesn't need to be triangulated
+            mesh = active_object.data
+
+            # Apply the filter (the eigenbasis is cached, so changing the filter settings is cheap)
+            self.status = f"Computing deformation"
+            spectral_smooth(
+                mesh, self.spectral_filter, self.laplacian, self.num_eigenvectors,
+                tau=self.tau, iterations=self.it, cutoff=self.cutoff, gain=self.gain
+            )
+
+            # Only the vertices were moved, so the mesh just needs to be told it changed
+            self.status = f"Updating Mesh"
+            mesh.update()
+
+        self.status = trace.summary() if trace else "Done"
+        return {'FINISHED'}
+
+    @staticmethod
+    def menu_func(menu, context):
+        menu.layout.operator(SpectralLaplaceCoordinateDeform.bl_idname)
+
+
+def register():
+    bpy.types.VIEW3D_MT_object.append(ImplicitLaplaceCoordinateDeform.menu_func)
+    bpy.types.VIEW3D_MT_object.append(ExplicitLaplaceCoordinateDeform.menu_func)
+    bpy.types.VIEW3D_MT_edit_mesh.append(ImplicitConstrainedLaplaceCoordinateDeform.menu_func)
+    bpy.types.VIEW3D_MT_edit_mesh.append(ExplicitConstrainedLaplaceCoordinateDeform.menu_func)
+    bpy.types.VIEW3D_MT_object.append(SpectralLaplaceCoordinateDeform.menu_func)
+    # TODO: If you created an operator that belongs in a particular menu, add its menu func here.
+    #       For an example, you can see how the deformation operators are added in assignment3/deformation/operators.py
+
+    # TODO: If you have functionality which depends on global state, you can add that here
+    #       For examples, see how boolean options are set up at the bottom of assignment2/planes/__init__.py
+    #     bpy.types.VIEW3D_MT_object.append(LaplaceCoordinateDeform.menu_func)
+    #     bpy.types.VIEW3D_MT_edit_mesh.append(ConstrainedLaplaceCoordinateDeform.menu_func)
+    pass
+#
+#
+# # TODO: Define operators, panels, etc.
+#
+# # NOTE: Nothing in the `extension` directory will be automatically graded,
+# #       Feel free to structure your code however you prefer!
+# #
+# #       You should document anything you want graded in your report and short screen recording.
+#
+#
+#
+#
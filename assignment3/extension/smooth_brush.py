@@ -1,36 +1,19 @@
-from scipy.sparse import coo_array
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
-from assignment3.matrices.util import *
-from assignment3.matrices.differential_coordinates import *
 from scipy.sparse import coo_array
 
+from assignment3.extension.filters import *
+from assignment3.matrices.array_mesh import *
+from assignment3.matrices.cache import *
 from assignment3.matrices.differential_coordinates import *
+from assignment3.matrices.instrumentation import *
+from assignment3.matrices.solvers import *
 from assignment3.matrices.util import *
 
-
-def numpy_verts(mesh: bmesh.types.BMesh) -> np.ndarray:
-    """
-    Extracts a numpy array of (x, y, z) vertices from a blender mesh
-
-    :param mesh: The BMesh to extract the vertices of.
-    :return: A numpy array of shape [n, 3], where array[i, :] is the x, y, z coordinate of vertex i.
-    """
-    data = bpy.data.meshes.new('tmp')
-    mesh.to_mesh(data)
-    # Explained here:
-    # https://blog.michelanders.nl/2016/02/copying-vertices-to-numpy-arrays-in_4.html
-    vertices = np.zeros(len(mesh.verts) * 3, dtype=np.float64)
-    data.vertices.foreach_get('co', vertices)
-    return vertices.reshape([len(mesh.verts), 3])
-
-
-def set_verts(mesh: bmesh.types.BMesh, verts: np.ndarray) -> bmesh.types.BMesh:
-    data = bpy.data.meshes.new('tmp1')  # temp Blender Mesh to perform fast setting
-    mesh.to_mesh(data)
-    data.vertices.foreach_set('co', verts.ravel())
-    mesh.clear()
-    mesh.from_mesh(data)
-    return mesh
+if TYPE_CHECKING:
+    import bmesh
 
 
 # HINT: This is a helper method which you can change (for example, if you want to try different sparse formats)
@@ -45,17 +28,8 @@ def adjacency_matrix(mesh: bmesh.types.BMesh) -> scipy.sparse.coo_matrix:
     :param mesh: Mesh to compute the adjacency matrix of.
     :return: A sparse matrix representing the mesh adjacency matrix.
     """
-    # HINT: Iterating over mesh.edges is significantly faster than iterating over mesh.verts and getting neighbors!
-    #       Building a sparse matrix from a set of I, J, V triplets is also faster than adding elements sequentially.
-
-    num_verts = len(mesh.verts)
-    rows, cols = [], []
-    for edge in mesh.edges:
-        i, j = edge.verts[0].index, edge.verts[1].index
-        rows.extend([i, j])
-        cols.extend([j, i])
-    data = np.ones(len(rows), dtype=np.float64)
-    return scipy.sparse.coo_matrix((data, (rows, cols)), shape=(num_verts, num_verts))
+    # The edges are read in bulk, without visiting any BMesh elements (and without the diagonals of split polygons)
+    return scipy.sparse.coo_matrix(edge_adjacency(numpy_edges(mesh), vertex_count(mesh)))
 
 
 # !!! This function will be used for automatic grading, don't edit the signature !!!
@@ -86,41 +60,240 @@ def build_combinatorial_laplacian(mesh: bmesh.types.BMesh) -> scipy.sparse.sparr
     return L
 
 
-def laplace_deform(mesh: bmesh.types.BMesh, tau: float, it: int = 1) -> np.ndarray:
-    return iterative_implicit_laplace_smooth(mesh, tau, it)
+@traced('assembly')
+def combinatorial_laplacian(mesh: bmesh.types.BMesh) -> scipy.sparse.sparray:
+    """
+    Finds the normalized combinatorial Laplacian of a mesh, reusing the result for meshes with the same topology.
 
+    :param mesh: Mesh to find the normalized combinatorial Laplacian matrix of.
+    :return: A sparse array representing the mesh Laplacian matrix.
+    """
+    # The matrix is built from the edges, which include loose edges, and loose vertices only show up in the count
+    key = mesh_key(None, numpy_edges(mesh))
+    return OPERATOR_CACHE.get(
+        (key, 'combinatorial_laplacian', vertex_count(mesh)), lambda: build_combinatorial_laplacian(mesh)
+    )
 
-def constrained_implicit_laplace_deform(mesh: bmesh.types.BMesh, selected_face_indices: list[int], tau: float,
-                                        it: int) -> np.ndarray:
-    # Convert mesh vertices to numpy array
-    X = numpy_verts(mesh)
 
-    # Perform smoothing operations
-    result = mesh.copy()
-    X_transformed = X.copy()
-    for _ in range(it):
-        M, Mv = build_mass_matrices(result)
+def explicit_smoother(mesh: bmesh.types.BMesh) -> ExplicitSmoother:
+    """
+    Finds an explicit smoothing engine for the normalized combinatorial Laplacian of a mesh, reusing earlier results.
 
-        G = build_gradient_matrix(result)  # currently not used
+    :param mesh: Mesh to smooth.
+    :return: An `ExplicitSmoother` for the mesh's combinatorial Laplacian.
+    """
+    return edge_explicit_smoother(numpy_edges(mesh), vertex_count(mesh))
 
-        S = other_cotangent(result)
 
-        # Unfortunately it does not work as expected, but to see what it looks like with the G.T @ Mv @ G cotangent matrix, just uncomment the line below.
-        # S = build_cotangent_matrix(G, Mv)
+def edge_explicit_smoother(edges: np.ndarray, num_verts: int) -> ExplicitSmoother:
+    """
+    Finds an explicit smoothing engine for the combinatorial Laplacian of a set of edges, reusing earlier results.
 
-        Xb = X_transformed.copy()
-        X_transformed = implicit_laplace_smooth(Xb, M, S, tau)
+    :param edges: An Ex2 array of vertex indices, one row per edge.
+    :param num_verts: Number of vertices.
+    :return: An `ExplicitSmoother` for the combinatorial Laplacian of the edges (see `edge_combinatorial_laplacian`).
+    """
+    return OPERATOR_CACHE.get(
+        (mesh_key(None, edges), 'explicit_smoother', num_verts),
+        lambda: ExplicitSmoother(edge_combinatorial_laplacian(edges, num_verts))
+    )
+
+
+def laplace_matrices(
+        verts: np.ndarray,
+        faces: np.ndarray,
+        key: str = None,
+        storage: str = 'FULL'
+) -> tuple[sparray, sparray]:
+    """
+    Finds the mass matrix and cotangent Laplacian used for implicit smoothing, reusing earlier results.
 
-    selected_verts = set()
-    for i, face in enumerate(mesh.faces):
-        if (i in selected_face_indices):
-            for vert in face.verts:
-                selected_verts.add(vert.index)
-    selected_verts = list(selected_verts)
+    :param verts: An Nx3 array of vertex positions.
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :param key: The `mesh_key` of the vertices and faces, if it was already computed.
+    :param storage: How the cotangent Laplacian is stored, 'FULL' or 'UPPER' (see `cotangent_laplacian`).
+    :return: A tuple containing the NxN mass matrix $M$ and the NxN cotangent Laplacian (see `other_cotangent`).
+    """
+    key = key or mesh_key(verts, faces)
+    return OPERATOR_CACHE.get((key, 'laplace_matrices', storage), lambda: build_laplace_matrices(verts, faces, storage))
 
-    X_final = X.copy()
-    for i in selected_verts:
-        X_final[i] = X_transformed[i]
+
+@traced('assembly')
+def build_laplace_matrices(verts: np.ndarray, faces: np.ndarray, storage: str = 'FULL') -> tuple[sparray, sparray]:
+    """
+    :param verts: An Nx3 array of vertex positions.
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :param storage: How the cotangent Laplacian is stored, 'FULL' or 'UPPER' (see `cotangent_laplacian`).
+    :return: A tuple containing the NxN mass matrix $M$ and the NxN cotangent Laplacian (see `laplace_matrices`).
+    """
+    M, _ = mass_matrices(verts, faces)
+    return M, 2. * cotangent_laplacian(verts, faces, storage)
+
+
+def implicit_laplace_solver(
+        M: sparray,
+        S: sparray,
+        tau: float,
+        key: str,
+        positions: np.ndarray = None,
+        pinned: np.ndarray = None,
+        **solver_options
+) -> PinnedSolver:
+    """
+    Finds a solver for the implicit smoothing system (M + tau * S), reusing earlier factorizations.
+
+    :param M: The sparse mass matrix
+    :param S: The sparse cotangent matrix
+    :param tau: Update weight.
+    :param key: The `mesh_key` of the mesh which M and S belong to.
+    :param positions: The Nx3 vertex positions of the mesh, needed by some solvers.
+    :param pinned: Indices of vertices which are held fixed, if any.
+    :param solver_options: Solver backend and its settings, passed on to `make_solver`.
+    :return: A solver for (M + tau * S).
+    """
+    pinned_key = None if pinned is None else np.asarray(pinned).tobytes()
+    return OPERATOR_CACHE.get(
+        (key, 'implicit_laplace_solver', tau, type(S).__name__, pinned_key, tuple(sorted(solver_options.items()))),
+        # A `SymmetricMatrix` S keeps the sum in upper triangular form
+        lambda: make_solver(tau * S + M, pinned=pinned, positions=positions, **solver_options)
+    )
+
+
+@traced('extraction')
+def local_region(
+        faces: np.ndarray,
+        selected_face_indices: list[int],
+        num_verts: int,
+        halo: int = 1
+) -> tuple[np.ndarray, np.ndarray, int]:
+    """
+    Extracts the part of a mesh around a selection, so it can be smoothed without touching the rest of the mesh.
+
+    The region consists of the vertices of the selected faces, grown by `halo` rings of neighbours,
+    plus one more ring of boundary vertices, which should be held fixed (Dirichlet boundary conditions).
+    All faces touching the free vertices are included, so their rows of the local Laplacian are exact.
+
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :param selected_face_indices: Indices of the selected faces.
+    :param num_verts: Number of vertices of the mesh.
+    :param halo: Number of rings of neighbours around the selection which are free to move.
+    :return: A tuple containing the (global) indices of the region's vertices, with the free vertices first,
+             the faces of the region in local indices, and the number of free vertices.
+    """
+    # Only the vertices and faces near the selection are visited
+    topology = mesh_topology(faces, num_verts)
+    is_free = topology.grow(selected_vertex_mask(faces, selected_face_indices, num_verts), halo)
+    free = np.flatnonzero(is_free)
+    region_faces = faces[topology.faces_of(free)]
+
+    vertices = np.concatenate([free, topology.boundary_ring(is_free)])
+    to_local = np.full(num_verts, -1, dtype=np.int64)
+    to_local[vertices] = np.arange(len(vertices))
+    return vertices, to_local[region_faces], len(free)
+
+
+@traced('assembly')
+def edge_combinatorial_laplacian(edges: np.ndarray, num_verts: int) -> sparray:
+    """
+    Computes the normalized combinatorial Laplacian L = I - D^-1 A from an array of edges.
+
+    :param edges: An Ex2 array of vertex indices, one row per edge.
+    :param num_verts: Number of vertices.
+    :return: An NxN sparse Laplacian matrix (see `build_combinatorial_laplacian`), in CSR format.
+    """
+    A = edge_adjacency(edges, num_verts)
+    degrees = np.maximum(A.sum(axis=1), 1)
+    return scipy.sparse.csr_array(scipy.sparse.identity(num_verts) - scipy.sparse.diags_array(1.0 / degrees) @ A)
+
+
+# How often implicit smoothing rebuilds (M + tau * S) from the current geometry, see `implicit_smoothing_iterations`
+OPERATOR_UPDATE_MODES = ('EVERY', 'LAGGED', 'FIXED')
+
+
+def implicit_smoothing_iterations(
+        X: np.ndarray,
+        faces: np.ndarray,
+        tau: float,
+        iterations: int,
+        operator_update: str = 'EVERY',
+        refresh_interval: int = 1,
+        pinned: np.ndarray = None,
+        storage: str = 'FULL',
+        **solver_options
+) -> np.ndarray:
+    """
+    Performs several implicit smoothing steps (M + tau * S) X_{i+1} = M X_i on an array of vertices.
+
+    Assembling and factorizing (M + tau * S) is far more expensive than solving with it,
+    so the operator doesn't have to be rebuilt for every step:
+        - 'EVERY': M and S are rebuilt from the current geometry before every step.
+        - 'LAGGED': M and S are only rebuilt every `refresh_interval` steps.
+        - 'FIXED': M and S are built once, from the initial geometry, and reused for all steps.
+
+    Only the operator of the initial geometry is cached: repeating the smoothing (e.g. with another number of
+    iterations) finds it again, but the later iterates are practically never seen twice, as they change with tau.
+
+    :param X: An Nx3 array of vertex positions.
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :param tau: Update weight.
+    :param iterations: Number of smoothing steps to perform.
+    :param operator_update: One of 'EVERY', 'LAGGED' or 'FIXED'.
+    :param refresh_interval: Number of steps between operator updates in 'LAGGED' mode.
+    :param pinned: Indices of vertices which are held fixed, if any.
+    :param storage: How the cotangent Laplacian is stored, 'FULL' or 'UPPER' (see `cotangent_laplacian`).
+    :param solver_options: Solver backend and its settings, passed on to `make_solver`.
+    :return: The smoothed vertex positions, as an Nx3 array.
+    """
+    if operator_update == 'EVERY':
+        refresh_interval = 1
+    elif operator_update == 'FIXED':
+        refresh_interval = max(iterations, 1)
+    elif operator_update == 'LAGGED':
+        refresh_interval = max(refresh_interval, 1)
+    else:
+        raise ValueError(f"Unknown operator update mode '{operator_update}', expected one of {OPERATOR_UPDATE_MODES}")
+
+    for i in range(iterations):
+        if i == 0:
+            # Repeating the same smoothing finds these operators in the cache
+            key = mesh_key(X, faces)
+            M, S = laplace_matrices(X, faces, key, storage)
+            solver = implicit_laplace_solver(M, S, tau, key, positions=X, pinned=pinned, **solver_options)
+        elif i % refresh_interval == 0:
+            # Caching these would only evict operators which are worth keeping
+            M, S = build_laplace_matrices(X, faces, storage)
+            solver = make_solver(tau * S + M, pinned=pinned, positions=X, **solver_options)
+
+        X = solver.solve(M @ X, None if pinned is None else X[pinned], x0=X)
+
+    return X
+
+
+def laplace_deform(
+        mesh: bmesh.types.BMesh,
+        tau: float,
+        it: int = 1,
+        operator_update: str = 'EVERY',
+        refresh_interval: int = 1,
+        **solver_options
+) -> np.ndarray:
+    return iterative_implicit_laplace_smooth(
+        mesh, tau, it, operator_update=operator_update, refresh_interval=refresh_interval, **solver_options
+    )
+
+
+def constrained_implicit_laplace_deform(mesh: bmesh.types.BMesh, selected_face_indices: list[int], tau: float,
+                                        it: int, operator_update: str = 'FIXED', refresh_interval: int = 1,
+                                        halo: int = None, **solver_options) -> np.ndarray:
+    # Convert mesh vertices to numpy array
+    X, faces, polygon_index = numpy_tessellated_mesh(mesh)
+    selected_triangles, _ = triangle_selection(polygon_index, selected_face_indices)
+
+    # Perform smoothing operations
+    X_final = constrained_implicit_smoothing(
+        X, faces, selected_triangles, tau, it, operator_update=operator_update, refresh_interval=refresh_interval,
+        halo=halo, **solver_options
+    )
 
     result = set_verts(mesh, X_final)
 
@@ -128,33 +301,105 @@ def constrained_implicit_laplace_deform(mesh: bmesh.types.BMesh, selected_face_i
 
 
 def constrained_explicit_laplace_deform(mesh: bmesh.types.BMesh, selected_face_indices: list[int], tau: float,
-                                        it: int) -> bmesh.types.BMesh:
-    X = numpy_verts(mesh)
+                                        it: int, method: str = 'EXPLICIT', halo: int = None) -> bmesh.types.BMesh:
+    X, faces, polygon_index = numpy_tessellated_mesh(mesh)
+    selected_triangles, _ = triangle_selection(polygon_index, selected_face_indices)
+
+    X_final = constrained_explicit_smoothing(X, faces, numpy_edges(mesh), selected_triangles, tau, it, method, halo)
 
-    L = build_combinatorial_laplacian(mesh)
+    set_verts(mesh, X_final)
 
-    X_transformed = X.copy()
-    for _ in range(it):
-        for i in range(3):
-            X_transformed[:, i] = X_transformed[:, i] - tau * L @ X_transformed[:, i]
+    return mesh
 
-    selected_verts = set()
-    for i, face in enumerate(mesh.faces):
-        if (i in selected_face_indices):
-            for vert in face.verts:
-                selected_verts.add(vert.index)
-    selected_verts = list(selected_verts)
 
+def constrained_implicit_smoothing(
+        X: np.ndarray,
+        faces: np.ndarray,
+        selected_face_indices: np.ndarray,
+        tau: float,
+        iterations: int,
+        halo: int = None,
+        **options
+) -> np.ndarray:
+    """
+    Implicitly smooths the selected part of a mesh given as arrays (see `constrained_implicit_laplace_deform`).
+
+    :param X: An Nx3 array of vertex positions.
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :param selected_face_indices: Indices of the selected triangles.
+    :param tau: Update weight.
+    :param iterations: Number of smoothing steps to perform.
+    :param halo: Number of rings around the selection which are smoothed with it, or None to smooth the whole mesh.
+    :param options: Operator update mode and solver settings, passed on to `implicit_smoothing_iterations`.
+    :return: The new vertex positions, where only the vertices of the selected faces have moved.
+    """
+    if halo is None:
+        X_transformed = implicit_smoothing_iterations(X, faces, tau, iterations, **options)
+    else:
+        # Only smooth the selection and its surroundings, with the ring around them held in place
+        vertices, region_faces, num_free = local_region(faces, selected_face_indices, len(X), halo)
+        X_transformed = X.copy()
+        X_transformed[vertices] = implicit_smoothing_iterations(
+            X[vertices], region_faces, tau, iterations, pinned=np.arange(num_free, len(vertices)), **options
+        )
+
+    # Only the vertices of the selected faces are changed
+    is_selected = selected_vertex_mask(faces, selected_face_indices, len(X))
     X_final = X.copy()
-    for i in selected_verts:
-        X_final[i] = X_transformed[i]
+    X_final[is_selected] = X_transformed[is_selected]
+    return X_final
 
-    set_verts(mesh, X_final)
 
-    return mesh
+def constrained_explicit_smoothing(
+        X: np.ndarray,
+        faces: np.ndarray,
+        edges: np.ndarray,
+        selected_face_indices: np.ndarray,
+        tau: float,
+        iterations: int,
+        method: str = 'EXPLICIT',
+        halo: int = None
+) -> np.ndarray:
+    """
+    Explicitly smooths the selected part of a mesh given as arrays (see `constrained_explicit_laplace_deform`).
+
+    :param X: An Nx3 array of vertex positions.
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :param edges: An Ex2 array of the edges of the mesh, which the combinatorial Laplacian is built from.
+    :param selected_face_indices: Indices of the selected triangles.
+    :param tau: Update weight.
+    :param iterations: Number of smoothing steps to perform.
+    :param method: The explicit filter to apply (see `ExplicitSmoother`).
+    :param halo: Number of rings around the selection which are smoothed with it, or None to smooth the whole mesh.
+    :return: The new vertex positions, where only the vertices of the selected faces have moved.
+    """
+    if halo is None:
+        X_transformed = edge_explicit_smoother(edges, len(X)).smooth(X, tau, iterations, method=method)
+    else:
+        # Only smooth the selection and its surroundings, with the ring around them held in place
+        vertices, region_faces, num_free = local_region(faces, selected_face_indices, len(X), halo)
+        to_local = np.full(len(X), -1, dtype=np.int64)
+        to_local[vertices] = np.arange(len(vertices))
+        edges = to_local[edges]
+        L = edge_combinatorial_laplacian(edges[np.all(edges >= 0, axis=1)], len(vertices))
+        L = scipy.sparse.diags_array(np.arange(len(vertices)) < num_free, dtype=np.float64) @ L  # Fixed boundary
+        X_transformed = X.copy()
+        X_transformed[vertices] = ExplicitSmoother(L).smooth(X[vertices], tau, iterations, method=method)
+
+    # Only the vertices of the selected faces are changed
+    is_selected = selected_vertex_mask(faces, selected_face_indices, len(X))
+    X_final = X.copy()
+    X_final[is_selected] = X_transformed[is_selected]
+    return X_final
 
 
-def implicit_laplace_smooth(x: np.ndarray, M: scipy.sparse.sparray, S: scipy.sparse.sparray, tau: float) -> np.ndarray:
+def implicit_laplace_smooth(
+        x: np.ndarray,
+        M: scipy.sparse.sparray,
+        S: scipy.sparse.sparray,
+        tau: float,
+        **solver_options
+) -> np.ndarray:
     """
     Performs smoothing of a list of vertices given a combinatorial Laplace matrix and a weight Tau.
 
@@ -164,15 +409,17 @@ def implicit_laplace_smooth(x: np.ndarray, M: scipy.sparse.sparray, S: scipy.spa
     :param M: The sparse mass matrix
     :param S: The sparse cotangent matrix
     :param tau: Update weight, tau=0 leaves the vertices unchanged, and tau=1 applies the full update.
+    :param solver_options: Solver backend and its settings, passed on to `make_solver`.
     :return: The new positions of the vertices as an Nx3 numpy array.
     """
 
     # Comute the implicit laplace smoothing by solving the linear system (M + tau * S)xi+1 = Mx
-    Mi = M.tocsr()  # convert to csr
-    Si = S.tocsr()  # convert to csr
-    A = Mi + (tau * Si)
-    b = Mi @ x
-    x = scipy.sparse.linalg.spsolve(A, b)
+    # (the sum is converted to CSR once, and a `SymmetricMatrix` S keeps it in upper triangular form)
+    A = tau * S + M
+    b = M @ x
+
+    # Iterative solvers can start from the current positions, which are close to the solution for small tau
+    x = make_solver(A, positions=x, **solver_options).solve(b, x0=x)
 
     return x
 
@@ -194,9 +441,8 @@ def explicit_laplace_smooth(
     :param tau: Update weight, tau=0 leaves the vertices unchanged, and tau=1 applies the full update.
     :return: The new positions of the vertices as an Nx3 numpy array.
     """
-    for i in range(3):  # Apply smoothing for x, y, z coordinates separately
-        x = vertices[:, i]
-        vertices[:, i] = x - tau * L @ x
+    # Smooth the x, y and z coordinates with a single sparse product
+    vertices -= tau * (scipy.sparse.csr_array(L) @ vertices)
 
     return vertices
 
@@ -204,7 +450,8 @@ def explicit_laplace_smooth(
 def iterative_explicit_laplace_smooth(
         mesh: bmesh.types.BMesh,
         tau: float,
-        it: int
+        it: int,
+        method: str = 'EXPLICIT'
 ) -> bmesh.types.BMesh:
     """
     Performs smoothing of a given mesh using the iterative explicit Laplace smoothing.
@@ -216,18 +463,15 @@ def iterative_explicit_laplace_smooth(
     :param mesh: Mesh to smooth.
     :param tau: Update weight.
     :param iterations: Number of smoothing iterations to perform.
+    :param method: The explicit filter to apply, one of 'EXPLICIT', 'CHEBYSHEV' or 'TAUBIN' (see `ExplicitSmoother`).
     :return: A mesh with the updated coordinates after smoothing.
     """
 
     # Get coordinate vectors as numpy arrays
     X = numpy_verts(mesh)
 
-    # Compute combinatorial Laplace matrix
-    L = build_combinatorial_laplacian(mesh)
-
-    # Perform smoothing operations
-    for _ in range(it):
-        X = explicit_laplace_smooth(X, L, tau)
+    # Perform smoothing operations, with the (cached) combinatorial Laplace matrix
+    X = explicit_smoother(mesh).smooth(X, tau, it, method=method)
 
     # Write smoothed vertices back to output mesh
     set_verts(mesh, X)
@@ -238,7 +482,10 @@ def iterative_explicit_laplace_smooth(
 def iterative_implicit_laplace_smooth(
         mesh: bmesh.types.BMesh,
         tau: float,
-        iterations: int
+        iterations: int,
+        operator_update: str = 'EVERY',
+        refresh_interval: int = 1,
+        **solver_options
 ) -> bmesh.types.BMesh:
     """
     Performs smoothing of a given mesh using the iterative implicit Laplace smoothing.
@@ -250,69 +497,89 @@ def iterative_implicit_laplace_smooth(
     :param mesh: Mesh to smooth.
     :param tau: Update weight.
     :param iterations: Number of smoothing iterations to perform.
+    :param operator_update: How often the operator is rebuilt, see `implicit_smoothing_iterations`.
+    :param refresh_interval: Number of iterations between operator updates in 'LAGGED' mode.
+    :param solver_options: Solver backend and its settings, passed on to `make_solver`.
     :return: A mesh with the updated coordinates after smoothing.
     """
 
     # Get coordinate vectors as numpy arrays
-    X = numpy_verts(mesh)
+    X, faces = numpy_mesh(mesh)
 
     # Perform smoothing operations
-    result = mesh.copy()
-    for _ in range(iterations):
-        M, Mv = build_mass_matrices(mesh)
+    X = implicit_smoothing_iterations(
+        X, faces, tau, iterations, operator_update=operator_update, refresh_interval=refresh_interval,
+        **solver_options
+    )
+
+    # Write smoothed vertices back to the mesh (only once, at the end)
+    return set_verts(mesh, X)
 
-        G = build_gradient_matrix(mesh)
 
-        S = other_cotangent(mesh)
+def spectral_basis(mesh: bmesh.types.BMesh, laplacian: str = 'COTANGENT', k: int = 100) -> SpectralBasis:
+    """
+    Finds the lowest k eigenpairs of a mesh Laplacian, reusing earlier results.
+
+    :param mesh: Triangular mesh to find the eigenbasis of.
+    :param laplacian: Either 'COTANGENT' (the cotangent matrix with the mass matrix, see `laplace_matrices`)
+                      or 'COMBINATORIAL' (the normalized combinatorial Laplacian, see `build_combinatorial_laplacian`).
+    :param k: Number of eigenpairs.
+    :return: A `SpectralBasis` for the mesh.
+    """
+    verts, faces = numpy_mesh(mesh)
 
-        # Unfortunately it does not work as expected, but to see what it looks like with the G.T @ Mv @ G cotangent matrix, just uncomment the line below.
-        # S = build_cotangent_matrix(G, Mv)
+    if laplacian == 'COTANGENT':
+        key = mesh_key(verts, faces)
 
-        Xb = X.copy()
-        X = implicit_laplace_smooth(Xb, M, S, tau)
-        result = set_verts(mesh, X)
+        def build():
+            M, S = laplace_matrices(verts, faces, key)
+            return SpectralBasis(S, M, k=k)
+    elif laplacian == 'COMBINATORIAL':
+        # Only depends on the connectivity of the mesh
+        key = mesh_key(None, faces)
 
-    return result
+        def build():
+            A = scipy.sparse.csr_array(adjacency_matrix(mesh))
+            D = scipy.sparse.diags_array(A.sum(axis=1))
+            return SpectralBasis(D - A, D, k=k)
+    else:
+        raise ValueError(f"Unknown Laplacian '{laplacian}', expected 'COTANGENT' or 'COMBINATORIAL'")
 
+    return OPERATOR_CACHE.get((key, 'spectral_basis', laplacian, k), build)
 
-def cotangent_weight(v1, v2, v3):
+
+def spectral_smooth(
+        mesh: bmesh.types.BMesh,
+        method: str = 'IMPLICIT',
+        laplacian: str = 'COTANGENT',
+        k: int = 100,
+        **filter_options
+) -> bmesh.types.BMesh:
     """
-    Compute the cotangent weight for edge v1-v2 with the opposite vertex v3.
+    Smooths (or enhances) a mesh by filtering its vertex positions in the eigenbasis of a Laplacian.
+
+    The eigenbasis is only computed once per mesh, after which changing the filter (or its strength)
+    only costs a projection onto the basis.
+
+    :param mesh: Triangular mesh to filter.
+    :param method: The filter to apply, see `spectral_response`.
+    :param laplacian: Either 'COTANGENT' or 'COMBINATORIAL', see `spectral_basis`.
+    :param k: Number of eigenpairs in the basis.
+    :param filter_options: Settings of the filter (tau, iterations, cutoff, gain), see `spectral_response`.
+    :return: The mesh with the filtered vertex positions.
     """
-    u = v1 - v2
-    v = v3 - v2
-    cos_theta = np.dot(u, v) / (np.linalg.norm(u) * np.linalg.norm(v))
-    sin_theta = np.sqrt(1 - cos_theta ** 2)
-    return cos_theta / sin_theta
+    basis = spectral_basis(mesh, laplacian, k)
+    X = basis.filter(numpy_verts(mesh), spectral_response(basis.eigenvalues, method, **filter_options))
+    return set_verts(mesh, X)
 
 
 def other_cotangent(mesh: bmesh.types.BMesh):
-    num_verts = len(mesh.verts)
-    row = []
-    col = []
-    data = []
-
-    for face in mesh.faces:
-        verts = [vert for vert in face.verts]
-        indices = [vert.index for vert in face.verts]
-        for i in range(3):
-            v1, v2, v3 = verts[i], verts[(i + 1) % 3], verts[(i + 2) % 3]
-            idx1, idx2 = indices[i], indices[(i + 1) % 3]
-            weight = cotangent_weight(np.array(v1.co), np.array(v2.co), np.array(v3.co))
-            row.append(idx1)
-            col.append(idx2)
-            data.append(weight)
-            row.append(idx2)
-            col.append(idx1)
-            data.append(weight)
-
-    # Convert the list to a sparse matrix
-    L = coo_array((data, (row, col)), shape=(num_verts, num_verts))
-
-    # Degree matrix (diagonal)
-    D = coo_array((L.sum(axis=1).flatten(), (np.arange(num_verts), np.arange(num_verts))), shape=(num_verts, num_verts))
-
-    # Laplacian matrix
-    S = D - L
-
-    return S
+    """
+    Computes the cotangent Laplacian of a triangle mesh, with a full cot(alpha) + cot(beta) weight per edge.
+
+    This is twice the cotangent matrix S from part 1, see `cotangent_laplacian`.
+
+    :param mesh: Triangular mesh to find the cotangent Laplacian of.
+    :return: A NxN sparse cotangent Laplacian.
+    """
+    return 2. * cotangent_laplacian(*numpy_mesh(mesh))
@@ -0,0 +1,102 @@
+import unittest
+import bmesh
+from data import primitives, meshes
+from .smooth_brush import *
+
+
+class TestImplicitSmoothingIterations(unittest.TestCase):
+
+    def test_operator_update_modes(self):
+        mesh = primitives.TORUS.copy()
+        bmesh.ops.triangulate(mesh, faces=mesh.faces)
+        X, faces = numpy_verts(mesh), numpy_faces(mesh)
+
+        # A fixed operator repeats the same solve, using the matrices of the original geometry
+        M, S = laplace_matrices(X, faces)
+        A = scipy.sparse.csc_array(M) + 1e-3 * scipy.sparse.csc_array(S)
+        expected = X
+        for _ in range(3):
+            expected = scipy.sparse.linalg.spsolve(A, M @ expected)
+
+        fixed = implicit_smoothing_iterations(X, faces, 1e-3, 3, operator_update='FIXED')
+        lagged = implicit_smoothing_iterations(X, faces, 1e-3, 3, operator_update='LAGGED', refresh_interval=3)
+        np.testing.assert_allclose(fixed, expected, atol=1e-8)
+        np.testing.assert_allclose(lagged, expected, atol=1e-8)
+
+        # Rebuilding the operator moves the result away from the fixed operator's
+        OPERATOR_CACHE.clear()
+        every = implicit_smoothing_iterations(X, faces, 1e-3, 3, operator_update='EVERY')
+        self.assertFalse(np.allclose(every, fixed))
+
+        # Only the operators of the initial geometry are cached
+        self.assertEqual(len(OPERATOR_CACHE), 2)
+
+
+class TestExplicitSmoother(unittest.TestCase):
+
+    def test_filters_match_explicit_steps(self):
+        mesh = primitives.TORUS.copy()
+        bmesh.ops.triangulate(mesh, faces=mesh.faces)
+        X, L = numpy_verts(mesh), build_combinatorial_laplacian(mesh)
+
+        expected = X.copy()
+        for _ in range(40):
+            expected = explicit_laplace_smooth(expected, L, 0.2)
+
+        smoother = ExplicitSmoother(L)
+        np.testing.assert_allclose(smoother.smooth(X, 0.2, 40, method='EXPLICIT'), expected, atol=1e-10)
+
+        # The Chebyshev filter reaches (nearly) the same result with fewer products
+        chebyshev = smoother.smooth(X, 0.2, 40, method='CHEBYSHEV', tol=1e-6)
+        self.assertLess(smoother.products, 40)
+        np.testing.assert_allclose(chebyshev, expected, atol=1e-5 * np.abs(X).max())
+
+        # With tau = 0 every filter leaves the vertices where they are
+        for method in ('EXPLICIT', 'CHEBYSHEV', 'TAUBIN'):
+            np.testing.assert_allclose(smoother.smooth(X, 0.0, 3, method=method), X, atol=1e-12)
+
+
+class TestSpectralBasis(unittest.TestCase):
+
+    def test_full_basis_matches_implicit_smoothing(self):
+        mesh = primitives.TORUS.copy()
+        bmesh.ops.triangulate(mesh, faces=mesh.faces)
+        X, faces = numpy_verts(mesh), numpy_faces(mesh)
+
+        # With a complete basis, the implicit filter is exactly repeated implicit smoothing
+        M, S = laplace_matrices(X, faces)
+        basis = SpectralBasis(S, M, k=len(X))
+        expected = implicit_smoothing_iterations(X, faces, 1e-3, 2, operator_update='FIXED')
+        smoothed = basis.filter(X, spectral_response(basis.eigenvalues, 'IMPLICIT', tau=1e-3, iterations=2))
+        np.testing.assert_allclose(smoothed, expected, atol=1e-8)
+
+    def test_partial_basis_is_m_orthonormal(self):
+        mesh = primitives.TORUS.copy()
+        bmesh.ops.triangulate(mesh, faces=mesh.faces)
+        M, S = laplace_matrices(numpy_verts(mesh), numpy_faces(mesh))
+
+        basis = SpectralBasis(S, M, k=10)
+        np.testing.assert_allclose(basis.basis.T @ (M @ basis.basis), np.eye(10), atol=1e-8)
+        self.assertAlmostEqual(basis.eigenvalues[0], 0.0, places=8)
+
+
+class TestLocalRegion(unittest.TestCase):
+
+    def test_local_solves_match_global(self):
+        selected_face_indices = [0, 1, 2]
+
+        # Explicit smoothing only spreads one ring per iteration, so a large enough halo gives the exact result
+        results = []
+        for halo in [None, 3]:
+            mesh = primitives.TORUS.copy()
+            bmesh.ops.triangulate(mesh, faces=mesh.faces)
+            constrained_explicit_laplace_deform(mesh, selected_face_indices, 0.5, 4, halo=halo)
+            results.append(numpy_verts(mesh))
+        np.testing.assert_allclose(results[0], results[1], atol=1e-10)
+
+        # The region around a small selection doesn't include the whole mesh
+        mesh = primitives.TORUS.copy()
+        bmesh.ops.triangulate(mesh, faces=mesh.faces)
+        vertices, region_faces, num_free = local_region(numpy_faces(mesh), selected_face_indices, len(mesh.verts), 1)
+        self.assertLess(len(vertices), len(mesh.verts))
+        self.assertTrue(np.all(region_faces >= 0))
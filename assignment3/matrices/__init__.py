@@ -1,3 +1,9 @@
+from .array_mesh import *
+from .cache import *
 from .differential_coordinates import *
+from .instrumentation import *
+from .solvers import *
+from .symmetric import *
+from .multigrid import *
+from .topology import *
 from .util import *
-from .test import *
\ No newline at end of file
@@ -0,0 +1,192 @@
+import numpy as np
+import scipy
+from scipy.sparse import sparray
+
+from assignment3.matrices.cache import OPERATOR_CACHE, mesh_key
+from assignment3.matrices.util import numpy_mesh
+
+
+def edge_adjacency(edges: np.ndarray, num_verts: int) -> sparray:
+    """
+    Builds the adjacency matrix of a set of (unique) edges.
+
+    :param edges: An Ex2 array of vertex indices, one row per edge.
+    :param num_verts: Number of vertices.
+    :return: An NxN sparse matrix in CSR format, with A_ij = 1 if vertices i and j share an edge.
+    """
+    i, j = np.asarray(edges, dtype=np.int64).T
+    return scipy.sparse.csr_array(
+        (np.ones(2 * len(i)), (np.concatenate([i, j]), np.concatenate([j, i]))), shape=(num_verts, num_verts)
+    )
+
+
+class MeshTopology:
+    """
+    Connectivity of a triangle mesh, built from its face array.
+
+    Every part of the index is only computed when it is first used, and then kept:
+        - `edges`: an Ex2 array of the unique (sorted) edges.
+        - `edge_face_counts`: the number of faces containing each edge.
+        - `boundary_edges`: the edges which belong to a single face.
+        - `vertex_faces`: an NxF CSR incidence matrix, where row i lists the faces of vertex i.
+        - `adjacency`: an NxN CSR adjacency matrix, where row i lists the neighbours of vertex i.
+
+    The topology doesn't depend on vertex positions, so it can be shared by all meshes with the same faces
+    (see `mesh_topology`).
+    """
+
+    __slots__ = ('faces', 'num_verts', '_edges', '_edge_face_counts', '_vertex_faces', '_adjacency')
+
+    def __init__(self, faces: np.ndarray, num_verts: int):
+        """
+        :param faces: An Mx3 array of vertex indices, one row per triangle.
+        :param num_verts: Number of vertices.
+        """
+        self.faces = np.ascontiguousarray(faces, dtype=np.int32)
+        self.num_verts = int(num_verts)
+        self._edges = self._edge_face_counts = self._vertex_faces = self._adjacency = None
+
+    @property
+    def num_faces(self) -> int:
+        return len(self.faces)
+
+    def _build_edges(self):
+        # Encode every (sorted) half-edge as a single integer, which is much faster to deduplicate than rows
+        half_edges = np.sort(self.faces[:, [0, 1, 1, 2, 2, 0]].reshape([-1, 2]).astype(np.int64), axis=1)
+        codes, counts = np.unique(half_edges[:, 0] * self.num_verts + half_edges[:, 1], return_counts=True)
+        self._edges = np.stack([codes // self.num_verts, codes % self.num_verts], axis=1).astype(np.int32)
+        self._edge_face_counts = counts
+
+    @property
+    def edges(self) -> np.ndarray:
+        if self._edges is None:
+            self._build_edges()
+        return self._edges
+
+    @property
+    def edge_face_counts(self) -> np.ndarray:
+        if self._edge_face_counts is None:
+            self._build_edges()
+        return self._edge_face_counts
+
+    @property
+    def boundary_edges(self) -> np.ndarray:
+        return self.edges[self.edge_face_counts == 1]
+
+    @property
+    def vertex_faces(self) -> sparray:
+        if self._vertex_faces is None:
+            face_indices = np.repeat(np.arange(self.num_faces, dtype=np.int32), 3)
+            self._vertex_faces = scipy.sparse.csr_array(
+                (np.ones(3 * self.num_faces), (self.faces.ravel(), face_indices)),
+                shape=(self.num_verts, self.num_faces)
+            )
+        return self._vertex_faces
+
+    @property
+    def adjacency(self) -> sparray:
+        if self._adjacency is None:
+            self._adjacency = edge_adjacency(self.edges, self.num_verts)
+        return self._adjacency
+
+    @property
+    def degrees(self) -> np.ndarray:
+        return np.diff(self.adjacency.indptr)
+
+    def neighbours(self, vertices: np.ndarray) -> np.ndarray:
+        """
+        :param vertices: Indices of a set of vertices.
+        :return: The (unique) indices of all vertices which share an edge with one of them.
+        """
+        return np.unique(self.adjacency[np.asarray(vertices)].indices)
+
+    def faces_of(self, vertices: np.ndarray) -> np.ndarray:
+        """
+        :param vertices: Indices of a set of vertices.
+        :return: The (unique) indices of all faces which contain one of them.
+        """
+        return np.unique(self.vertex_faces[np.asarray(vertices)].indices)
+
+    def grow(self, mask: np.ndarray, rings: int = 1) -> np.ndarray:
+        """
+        Grows a set of vertices by `rings` rings of neighbours, only visiting the vertices near the set.
+
+        :param mask: A boolean array of length N, marking the vertices in the set.
+        :param rings: Number of rings of neighbours to add.
+        :return: A new boolean array, marking the grown set.
+        """
+        mask = mask.copy()
+        frontier = np.flatnonzero(mask)
+        for _ in range(rings):
+            frontier = self.neighbours(frontier)
+            frontier = frontier[~mask[frontier]]
+            mask[frontier] = True
+        return mask
+
+    def boundary_ring(self, mask: np.ndarray) -> np.ndarray:
+        """
+        :param mask: A boolean array of length N, marking the vertices in a set.
+        :return: The sorted indices of the vertices outside the set which share an edge with a vertex in the set.
+        """
+        ring = self.neighbours(np.flatnonzero(mask))
+        return ring[~mask[ring]]
+
+
+class ArrayMesh:
+    """
+    A triangle mesh stored as numpy arrays: float64 vertex positions and int32 faces, plus its `MeshTopology`.
+    """
+
+    __slots__ = ('verts', 'faces', '_topology')
+
+    def __init__(self, verts: np.ndarray, faces: np.ndarray, topology: MeshTopology = None):
+        """
+        :param verts: An Nx3 array of vertex positions.
+        :param faces: An Mx3 array of vertex indices, one row per triangle.
+        :param topology: The topology of the faces, if it is already known.
+        """
+        self.verts = np.ascontiguousarray(verts, dtype=np.float64)
+        self.faces = np.ascontiguousarray(faces, dtype=np.int32)
+        self._topology = topology
+
+    @classmethod
+    def from_mesh(cls, mesh) -> 'ArrayMesh':
+        """
+        :param mesh: A BMesh (or Mesh), polygons with more than three vertices are split into triangles.
+        :return: An ArrayMesh with the same vertices, and the triangles of its faces.
+        """
+        return cls(*numpy_mesh(mesh))
+
+    @property
+    def num_verts(self) -> int:
+        return len(self.verts)
+
+    @property
+    def num_faces(self) -> int:
+        return len(self.faces)
+
+    @property
+    def topology(self) -> MeshTopology:
+        if self._topology is None:
+            self._topology = mesh_topology(self.faces, self.num_verts)
+        return self._topology
+
+    def with_verts(self, verts: np.ndarray) -> 'ArrayMesh':
+        """
+        :param verts: New Nx3 vertex positions.
+        :return: A mesh with the same faces (and topology), but different vertex positions.
+        """
+        return ArrayMesh(verts, self.faces, self._topology)
+
+
+def mesh_topology(faces: np.ndarray, num_verts: int, key: str = None) -> MeshTopology:
+    """
+    Finds the topology of a face array, reusing the index built for earlier meshes with the same faces.
+
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :param num_verts: Number of vertices.
+    :param key: The `mesh_key` of the faces (without vertices), if it was already computed.
+    :return: The (shared) `MeshTopology` of the faces.
+    """
+    key = key or mesh_key(None, faces)
+    return OPERATOR_CACHE.get((key, 'topology', num_verts), lambda: MeshTopology(faces, num_verts))
@@ -0,0 +1,127 @@
+import hashlib
+from collections import OrderedDict
+from typing import Callable
+
+import numpy as np
+import scipy
+import scipy.sparse.linalg
+
+
+def mesh_key(verts: np.ndarray, faces: np.ndarray = None) -> str:
+    """
+    Computes a cheap fingerprint of a mesh's geometry and topology.
+
+    Two meshes with the same key have bit-identical vertex and face arrays,
+    so any matrix or factorization built from one can be reused for the other.
+
+    :param verts: An Nx3 array of vertex positions (or None, to only hash the topology).
+    :param faces: An Mx3 array of vertex indices (or None, to only hash the geometry).
+    :return: A short hexadecimal digest.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for array in (verts, faces):
+        if array is not None:
+            array = np.ascontiguousarray(array)
+            digest.update(str((array.dtype, array.shape)).encode())
+            digest.update(array.data)
+    return digest.hexdigest()
+
+
+def estimate_nbytes(value) -> int:
+    """
+    Roughly estimates how much memory a cached value keeps alive.
+
+    Understands numpy arrays, scipy sparse matrices, SuperLU factorizations,
+    and tuples, lists, dicts and plain (or slotted) objects containing those.
+
+    :param value: The value to measure.
+    :return: The estimated size in bytes.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if scipy.sparse.issparse(value):
+        return sum(getattr(value, name).nbytes for name in ('data', 'indices', 'indptr', 'row', 'col', 'offsets')
+                   if isinstance(getattr(value, name, None), np.ndarray))
+    if isinstance(value, scipy.sparse.linalg.SuperLU):
+        # Values plus (at least) one index per non-zero, and the permutations
+        return (value.L.nnz + value.U.nnz) * (value.L.dtype.itemsize + 4) + 2 * 8 * value.shape[0]
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(estimate_nbytes(v) for v in value.values())
+    if hasattr(value, '__slots__'):
+        return sum(estimate_nbytes(getattr(value, name, None)) for name in value.__slots__)
+    if hasattr(value, '__dict__'):
+        return estimate_nbytes(vars(value))
+    return 0
+
+
+class OperatorCache:
+    """
+    An in-process least-recently-used cache for assembled matrices and factorizations.
+
+    Blender re-executes `REGISTER, UNDO` operators whenever a setting in the redo panel is tweaked,
+    even though the mesh itself hasn't changed. Looking up the expensive operators by `mesh_key`
+    means only the cheap, parameter-dependent part of the computation has to be repeated.
+    When the estimated memory use goes over `max_bytes`, the least recently used entries are evicted.
+    """
+
+    def __init__(self, max_bytes: int = 1 << 30):
+        """
+        :param max_bytes: Memory cap for the cached values, 0 disables caching.
+        """
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, build: Callable[[], object]):
+        """
+        Finds a cached value, or builds (and caches) it if it isn't present.
+
+        :param key: A hashable key, typically a tuple starting with a `mesh_key`.
+        :param build: Function without arguments which computes the value on a cache miss.
+        :return: The cached or newly built value.
+        """
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+        self.misses += 1
+        value = build()
+        nbytes = estimate_nbytes(value)
+        if nbytes <= self.max_bytes:
+            self._entries[key] = (value, nbytes)
+            self.size_bytes += nbytes
+            self._evict()
+        return value
+
+    def resize(self, max_bytes: int):
+        """
+        Changes the memory cap, evicting entries if necessary.
+
+        :param max_bytes: The new memory cap in bytes.
+        """
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def clear(self):
+        self._entries.clear()
+        self.size_bytes = 0
+
+    def _evict(self):
+        while self.size_bytes > self.max_bytes and self._entries:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self.size_bytes -= nbytes
+
+
+# Shared by all operators of the add-on
+OPERATOR_CACHE = OperatorCache()
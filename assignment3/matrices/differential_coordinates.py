@@ -1,9 +1,18 @@
-import bmesh
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
 import numpy
 import numpy as np
 import scipy
 from scipy.sparse import coo_array, sparray
 
+from assignment3.matrices.symmetric import OPERATOR_STORAGE, SymmetricMatrix
+from assignment3.matrices.util import numpy_verts, numpy_faces
+
+if TYPE_CHECKING:
+    import bmesh
+
 
 # !!! This function will be used for automatic grading, don't edit the signature !!!
 def triangle_gradient(triangle: bmesh.types.BMFace) -> np.ndarray:
@@ -35,14 +44,72 @@ def triangle_gradient(triangle: bmesh.types.BMFace) -> np.ndarray:
 
     edges = [e0, e1, e2]
 
-    local_gradient[0] = np.cross(normal, edges[0]) / (2. * area)
-    local_gradient[1] = np.cross(normal, edges[1]) / (2. * area)
-    local_gradient[2] = np.cross(normal, edges[2]) / (2. * area)
+    local_gradient[:, 0] = np.cross(normal, edges[0]) / (2. * area)
+    local_gradient[:, 1] = np.cross(normal, edges[1]) / (2. * area)
+    local_gradient[:, 2] = np.cross(normal, edges[2]) / (2. * area)
 
     # TODO: Find the local gradient for this triangle.
     return local_gradient
 
 
+def triangle_areas(verts: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """
+    Computes the area of every triangle of a mesh at once.
+
+    The result can be passed on to `gradient_matrix` and `mass_matrices`,
+    so the areas only need to be computed once per deformation.
+
+    :param verts: An Nx3 array of vertex positions.
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :return: An array of length M containing the area of each triangle.
+    """
+    v0, v1, v2 = verts[faces[:, 0]], verts[faces[:, 1]], verts[faces[:, 2]]
+    return np.linalg.norm(np.cross(v1 - v0, v2 - v0), axis=1) / 2.
+
+
+def gradient_matrix(verts: np.ndarray, faces: np.ndarray, areas: np.ndarray = None) -> sparray:
+    """
+    Computes the gradient matrix $G$ directly from vertex and face index arrays.
+
+    This is the batched equivalent of calling `triangle_gradient` on every face:
+    the normals, areas and edge cross products of all triangles are computed at once,
+    and the I, J, V triplets are written into preallocated arrays, such that rows 3i to 3i+2 of the column
+    of the face's jth vertex hold column j of the local gradient of face i.
+
+    :param verts: An Nx3 array of vertex positions.
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :param areas: Optional precomputed triangle areas (see `triangle_areas`).
+    :return: A 3MxN gradient matrix,
+             where M and N are the number of triangles and number of vertices in the mesh, respectively.
+    """
+    faces = np.asarray(faces)
+    num_faces, num_verts = len(faces), len(verts)
+
+    v0, v1, v2 = verts[faces[:, 0]], verts[faces[:, 1]], verts[faces[:, 2]]
+
+    # Edge e_j lies opposite vertex j, shape [m, 3 (edge), 3 (xyz)]
+    edges = np.stack([v2 - v1, v0 - v2, v1 - v0], axis=1)
+
+    # The length of the (unnormalized) normal is twice the triangle area
+    normals = np.cross(v1 - v0, v2 - v0)
+    double_areas = 2. * areas if areas is not None else np.linalg.norm(normals, axis=1)
+    normals /= double_areas[:, None]
+
+    # local_gradients[i, j] is column j of `triangle_gradient` for face i
+    local_gradients = np.cross(normals[:, None, :], edges) / double_areas[:, None, None]
+
+    # Triplets are laid out as [face, vertex, component]:
+    # row 3i+k of column j holds component k of the gradient of vertex j's hat function
+    row = np.empty([num_faces, 3, 3], dtype=np.int64)
+    col = np.empty([num_faces, 3, 3], dtype=np.int64)
+    data = np.empty([num_faces, 3, 3], dtype=np.float64)
+    row[...] = 3 * np.arange(num_faces)[:, None, None] + np.arange(3)[None, None, :]
+    col[...] = faces[:, :, None]
+    data[...] = local_gradients
+
+    return coo_array((data.ravel(), (row.ravel(), col.ravel())), shape=(num_faces * 3, num_verts))
+
+
 # !!! This function will be used for automatic grading, don't edit the signature !!!
 def build_gradient_matrix(mesh: bmesh.types.BMesh) -> sparray:
     """
@@ -52,27 +119,39 @@ def build_gradient_matrix(mesh: bmesh.types.BMesh) -> sparray:
     but its rows are distributed along the columns according to the index of the vertex they are associated with.
     For more information, see the slides.
 
+    The actual assembly is done by `gradient_matrix`, which works on vertex and face arrays.
+
     :param mesh: Triangular mesh to find the gradient matrix of.
     :return: A 3MxN gradient matrix,
              where M and N are the number of triangles and number of vertices in the mesh, respectively.
     """
-    num_faces, num_verts = len(mesh.faces), len(mesh.verts)
+    return gradient_matrix(numpy_verts(mesh), numpy_faces(mesh))
 
-    row = []
-    col = []
-    data = []
 
-    for i, face in enumerate(mesh.faces):
-        gradient_matrix = triangle_gradient(face)
+def mass_matrices(verts: np.ndarray, faces: np.ndarray, areas: np.ndarray = None) -> tuple[sparray, sparray]:
+    """
+    Computes the mass matrices $M$ and $Mv$ directly from vertex and face index arrays.
 
-        for j, vert in enumerate(face.verts):
-            for k in range(3):
-                row.append(3 * i + k)
-                col.append(vert.index)
-                data.append(gradient_matrix[k, j])
+    All triangle areas are computed at once (or taken from `areas`),
+    and the per-vertex masses are accumulated with a single `np.bincount` scatter.
 
-    # TODO: construct the sparse gradient matrix for the mesh
-    return coo_array((data, (row, col)), shape=(num_faces * 3, num_verts))
+    :param verts: An Nx3 array of vertex positions.
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :param areas: Optional precomputed triangle areas (see `triangle_areas`).
+    :return: A tuple containing the NxN sparse matrix $M$ and the 3Mx3M sparse matrix $Mv$,
+             where M and N are the number of triangles and number of vertices in the mesh, respectively.
+    """
+    if areas is None:
+        areas = triangle_areas(verts, faces)
+
+    # Each triangle contributes its area to each of its three vertices (and to each of its three rows of Mv)
+    corner_areas = np.repeat(areas, 3)
+    M_diag = np.bincount(np.asarray(faces).ravel(), weights=corner_areas, minlength=len(verts)) / 3.0
+
+    M = scipy.sparse.diags(M_diag)
+    Mv = scipy.sparse.diags(corner_areas)
+
+    return M, Mv
 
 
 # !!! This function will be used for automatic grading, don't edit the signature !!!
@@ -87,30 +166,13 @@ def build_mass_matrices(mesh: bmesh.types.BMesh) -> tuple[sparray, sparray]:
         $Mv_(3i+l)(3i+l)$ is the area of triangle $i$, where $l$ is the index (0, 1, 2) of each vertex of the triangle.
 
     For more information, see the slides.
+    The actual assembly is done by `mass_matrices`, which works on vertex and face arrays.
 
     :param mesh: Triangular mesh to find the mass matrices of.
     :return: A tuple containing the NxN sparse matrix $M$ and the 3Mx3M sparse matrix $Mv$,
              where M and N are the number of triangles and number of vertices in the mesh, respectively.
     """
-    num_face, num_verts = len(mesh.faces), len(mesh.verts)
-    # TODO: construct the mass matrices M and Mv for the mesh
-
-    M_diag = np.zeros(num_verts)
-    Mv_diag = np.zeros(3 * num_face)
-
-    for i, face in enumerate(mesh.faces):
-        area = face.calc_area()
-
-        for j, vert in enumerate(face.verts):
-            M_diag[vert.index] += area
-
-            Mv_diag[3 * i + j] = area
-
-    M_diag[M_diag != 0] /= 3.0
-    M = scipy.sparse.diags(M_diag)
-    Mv = scipy.sparse.diags(Mv_diag)
-
-    return M, Mv
+    return mass_matrices(numpy_verts(mesh), numpy_faces(mesh))
 
 
 # !!! This function will be used for automatic grading, don't edit the signature !!!
@@ -123,6 +185,71 @@ def build_cotangent_matrix(G: sparray, Mv: sparray) -> sparray:
     :return: A NxN cotangent matrix.
     """
     # TODO: find the cotangent matrix S based on G and Mv
-    S = G.T @ Mv @ G
+    # Mv is diagonal, so G.T @ Mv @ G only needs the rows of G to be scaled (one sparse product instead of two).
+    # When the mesh itself is available, `cotangent_laplacian` builds the same matrix without G at all.
+    S = G.T @ scipy.sparse.csr_array(G).multiply(Mv.diagonal()[:, None])
 
     return S
+
+
+def cotangent_laplacian(
+        verts: np.ndarray,
+        faces: np.ndarray,
+        storage: str = 'FULL',
+        dtype=np.float64
+) -> sparray | SymmetricMatrix:
+    """
+    Computes the cotangent matrix $S$ in closed form from vertex and face index arrays.
+
+    This is the same matrix as `build_cotangent_matrix(G, Mv)`, but it is written directly from the corner cotangents:
+    for the corner of each triangle opposite edge (j, k) with angle alpha,
+
+        S_jk -= cot(alpha) / 2,  S_kj -= cot(alpha) / 2,  S_jj += cot(alpha) / 2,  S_kk += cot(alpha) / 2
+
+    which gives 12 entries per triangle, without the 3Mx3M intermediate of the triple product.
+    Degenerate (zero-area) triangles contribute nothing instead of producing NaNs.
+
+    With 'UPPER' storage, only the entries of the upper triangle are assembled (9 instead of 12 per triangle),
+    and the result is a `SymmetricMatrix`, which takes half the memory.
+
+    :param verts: An Nx3 array of vertex positions.
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :param storage: Either 'FULL' or 'UPPER' (see `OPERATOR_STORAGE`).
+    :param dtype: The type of the values, e.g. np.float32 to halve their memory.
+    :return: A NxN cotangent matrix, in COO format for 'FULL' storage.
+    """
+    if storage not in OPERATOR_STORAGE:
+        raise ValueError(f"Unknown operator storage '{storage}', expected one of {OPERATOR_STORAGE}")
+    faces = np.asarray(faces)
+    num_faces, num_verts = len(faces), len(verts)
+
+    # For every corner i, the edges towards the next two corners of the triangle, shape [m, 3 (corner), 3 (xyz)]
+    corners = verts[faces]
+    u = np.roll(corners, -1, axis=1) - corners
+    v = np.roll(corners, -2, axis=1) - corners
+
+    dots = np.einsum('fcx,fcx->fc', u, v)
+    cross_norms = np.linalg.norm(np.cross(u, v), axis=2)
+    half_cot = np.divide(dots, 2. * cross_norms, out=np.zeros_like(dots), where=cross_norms > 0)
+
+    # The edge opposite corner i connects corners i+1 and i+2
+    j, k = np.roll(faces, -1, axis=1), np.roll(faces, -2, axis=1)
+
+    if storage == 'UPPER':
+        # The off-diagonal entry is only stored once, in the row of the smaller index
+        row = np.stack([np.minimum(j, k), j, k], axis=2)
+        col = np.stack([np.maximum(j, k), j, k], axis=2)
+        data = np.stack([-half_cot, half_cot, half_cot], axis=2)
+        return SymmetricMatrix.from_triplets(
+            data.ravel(), row.ravel(), col.ravel(), (num_verts, num_verts), dtype=dtype
+        )
+
+    row = np.empty([num_faces, 3, 4], dtype=np.int64)
+    col = np.empty([num_faces, 3, 4], dtype=np.int64)
+    data = np.empty([num_faces, 3, 4], dtype=dtype)
+    row[..., 0], col[..., 0], data[..., 0] = j, k, -half_cot
+    row[..., 1], col[..., 1], data[..., 1] = k, j, -half_cot
+    row[..., 2], col[..., 2], data[..., 2] = j, j, half_cot
+    row[..., 3], col[..., 3], data[..., 3] = k, k, half_cot
+
+    return coo_array((data.ravel(), (row.ravel(), col.ravel())), shape=(num_verts, num_verts))
@@ -0,0 +1,179 @@
+import contextlib
+import functools
+import json
+import os
+import time
+from collections import defaultdict
+from typing import Callable
+
+# Stages which the mesh operations are split into
+STAGES = ['triangulation', 'extraction', 'assembly', 'factorization', 'solve', 'write-back']
+
+
+class OperationTrace:
+    """
+    Timings and counters of a single operation (e.g. one run of an operator).
+
+    Stage times are exclusive: time spent in a stage nested inside another one is only counted for the inner stage,
+    so the stage times add up to (at most) the total time.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.started_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.total = None
+        self.stage_times = defaultdict(float)
+        self.stage_calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        # Open stages, as [name, start time, time spent in nested stages]
+        self._open = []
+
+    def enter(self, stage: str):
+        self._open.append([stage, time.perf_counter(), 0.0])
+
+    def exit(self):
+        stage, start, nested = self._open.pop()
+        elapsed = time.perf_counter() - start
+        self.stage_times[stage] += elapsed - nested
+        self.stage_calls[stage] += 1
+        if self._open:
+            self._open[-1][2] += elapsed
+
+    def finish(self):
+        self.total = time.perf_counter() - self.start
+
+    def summary(self) -> str:
+        """
+        :return: A one-line summary, such as "Done in 412 ms (assembly 85, factorization 270, solve 41 ms; nnz 81234)".
+        """
+        stages = ', '.join(f"{stage} {1000 * self.stage_times[stage]:.0f}" for stage in self.ordered_stages())
+        counters = ', '.join(f"{name} {value}" for name, value in self.counters.items())
+        details = '; '.join(filter(None, [stages and stages + ' ms', counters]))
+        return f"Done in {1000 * self.total:.0f} ms" + (f" ({details})" if details else '')
+
+    def ordered_stages(self) -> list[str]:
+        return sorted(self.stage_times, key=lambda stage: STAGES.index(stage) if stage in STAGES else len(STAGES))
+
+    def as_record(self) -> dict:
+        return dict(
+            operation=self.name, started_at=self.started_at, total_s=self.total,
+            stages={stage: dict(time_s=self.stage_times[stage], calls=self.stage_calls[stage])
+                    for stage in self.ordered_stages()},
+            counters=dict(self.counters)
+        )
+
+
+class _Stage:
+    """
+    Context manager which records the time spent in a stage of the current operation.
+    """
+
+    __slots__ = ('trace', 'name')
+
+    def __init__(self, trace: OperationTrace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.trace.enter(self.name)
+
+    def __exit__(self, *exc_info):
+        self.trace.exit()
+
+
+# Returned by `Tracer.stage` whenever nothing is being traced
+_NO_STAGE = contextlib.nullcontext()
+
+
+class Tracer:
+    """
+    Records how long each stage of an operation takes, and counts things like nnz and solver iterations.
+
+    Code is instrumented with `stage` (a context manager), the `traced` decorator, and `count`.
+    These only record anything inside an `operation`, and only while the tracer is enabled;
+    otherwise they cost a single attribute check, so the instrumentation can stay in place permanently.
+
+    The tracer is enabled by setting the ASSIGNMENT3_TRACE environment variable (to anything),
+    or ASSIGNMENT3_TRACE_FILE to the path of a JSONL file, which gets one record per operation appended to it.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_path = None
+        # The operation which is currently being traced (None when disabled)
+        self.current = None
+
+    def enable(self, trace_path: str = None):
+        """
+        :param trace_path: Path of a JSONL file which a record of every operation is appended to, if any.
+        """
+        self.enabled = True
+        self.trace_path = trace_path
+
+    def disable(self):
+        self.enabled = False
+        self.trace_path = None
+
+    @contextlib.contextmanager
+    def operation(self, name: str):
+        """
+        Traces everything which happens inside the with-block as a single operation.
+
+        :param name: Name of the operation, e.g. the operator's label.
+        :return: The `OperationTrace` (or None when the tracer is disabled, or another operation is already traced).
+        """
+        if not self.enabled or self.current is not None:
+            yield None
+            return
+
+        self.current = trace = OperationTrace(name)
+        try:
+            yield trace
+        finally:
+            self.current = None
+            trace.finish()
+            if self.trace_path is not None:
+                with open(self.trace_path, 'a') as file:
+                    file.write(json.dumps(trace.as_record()) + '\n')
+
+    def stage(self, name: str):
+        """
+        :param name: Name of the stage, preferably one of `STAGES`.
+        :return: A context manager which records the time spent inside it.
+        """
+        if self.current is None:
+            return _NO_STAGE
+        return _Stage(self.current, name)
+
+    def count(self, name: str, value: int = 1):
+        """
+        Adds to a counter of the current operation (e.g. 'nnz' or 'iterations').
+        """
+        if self.current is not None:
+            self.current.counters[name] += int(value)
+
+
+TRACER = Tracer()
+if os.environ.get('ASSIGNMENT3_TRACE') or os.environ.get('ASSIGNMENT3_TRACE_FILE'):
+    TRACER.enable(os.environ.get('ASSIGNMENT3_TRACE_FILE'))
+
+
+def traced(stage: str) -> Callable:
+    """
+    Decorator which records every call of a function as a stage of the current operation (see `Tracer.stage`).
+
+    :param stage: Name of the stage.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if TRACER.current is None:
+                return function(*args, **kwargs)
+            with _Stage(TRACER.current, stage):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,195 @@
+import numpy as np
+import scipy
+import scipy.sparse.linalg
+from scipy.sparse import sparray
+
+from assignment3.matrices.solvers import PinnedSolver, SOLVER_BACKENDS
+from assignment3.matrices.symmetric import full_matrix
+
+
+def cluster_vertices(positions: np.ndarray, cell_size: float) -> np.ndarray:
+    """
+    Clusters vertices by the cell of a regular grid which they fall into.
+
+    :param positions: An Nx3 array of vertex positions.
+    :param cell_size: The edge length of the grid cells.
+    :return: An array of length N, containing the (consecutive) cluster index of each vertex.
+    """
+    cells = np.floor((positions - positions.min(axis=0)) / cell_size).astype(np.int64)
+    _, clusters = np.unique(cells, axis=0, return_inverse=True)
+    return clusters.ravel()
+
+
+def mean_edge_length(A: sparray, positions: np.ndarray) -> float:
+    """
+    Estimates the mesh resolution from the sparsity pattern of a Laplacian-like matrix.
+
+    :param A: An NxN sparse matrix, where A_ij != 0 if vertices i and j share an edge.
+    :param positions: An Nx3 array of vertex positions.
+    :return: The mean distance between connected vertices.
+    """
+    A = scipy.sparse.coo_array(A)
+    off_diagonal = A.row != A.col
+    if not off_diagonal.any():
+        return 1.0
+    lengths = np.linalg.norm(positions[A.row[off_diagonal]] - positions[A.col[off_diagonal]], axis=1)
+    return float(lengths.mean())
+
+
+def smoothed_prolongation(A: sparray, clusters: np.ndarray, omega: float = 2. / 3.) -> sparray:
+    """
+    Builds the prolongation operator from a coarse level (one unknown per cluster) to the fine level.
+
+    The tentative prolongation copies each cluster's value to all of its vertices,
+    it is then smoothed with one damped Jacobi step (smoothed aggregation), which makes coarse corrections
+    for Laplacian-like systems far more accurate than piecewise constant interpolation.
+
+    :param A: The NxN fine level matrix.
+    :param clusters: Cluster index of each of the N fine vertices.
+    :param omega: Damping of the smoothing step.
+    :return: An NxC sparse prolongation matrix, where C is the number of clusters.
+    """
+    num_rows, num_clusters = len(clusters), int(clusters.max()) + 1
+    tentative = scipy.sparse.csr_array(
+        (np.ones(num_rows), (np.arange(num_rows), clusters)), shape=(num_rows, num_clusters)
+    )
+    inverse_diagonal = scipy.sparse.diags_array(1.0 / A.diagonal())
+    return scipy.sparse.csr_array(tentative - omega * (inverse_diagonal @ (A @ tentative)))
+
+
+class MultigridSolver(PinnedSolver):
+    """
+    Solves symmetric positive definite systems on meshes with geometric multigrid.
+
+    The hierarchy is built by clustering the vertices into grid cells whose size doubles with every level.
+    Each level has a (smoothed aggregation) prolongation P, the restriction is its transpose,
+    and the coarse matrices are the Galerkin products P^T A P. The coarsest level is solved directly.
+
+    Two modes are available:
+        - 'V': V-cycles starting from the initial guess, until the residual drops below the tolerance.
+        - 'FMG': full multigrid, which starts from the coarsest level and interpolates upwards,
+                 running a V-cycle on each level, before continuing with V-cycles on the finest level.
+
+    Each cycle costs O(nnz(A)), so the total cost grows (close to) linearly with the size of the mesh.
+    """
+
+    needs_positions = True
+
+    def __init__(
+            self,
+            A: sparray,
+            pinned: list[int] = None,
+            regularization: float = 0.0,
+            positions: np.ndarray = None,
+            mode: str = 'V',
+            tol: float = 1e-8,
+            maxiter: int = 100,
+            smoothing_steps: int = 2,
+            coarse_size: int = 1000
+    ):
+        """
+        :param A: The NxN sparse system matrix, which must be symmetric positive (semi-)definite.
+        :param pinned: Indices of the entries of x which are held fixed, these are removed from the system.
+        :param regularization: Optional weight of an identity term added to the reduced system.
+        :param positions: An Nx3 array of vertex positions, used to build the hierarchy.
+        :param mode: Either 'V' or 'FMG'.
+        :param tol: Relative residual at which the iteration stops.
+        :param maxiter: Maximum number of cycles.
+        :param smoothing_steps: Number of damped Jacobi steps before and after each coarse correction.
+        :param coarse_size: Number of unknowns below which a level is solved directly.
+        """
+        if positions is None:
+            raise ValueError("The multigrid solver needs the vertex positions to build its hierarchy")
+        if mode not in ('V', 'FMG'):
+            raise ValueError(f"Unknown multigrid mode '{mode}', expected 'V' or 'FMG'")
+
+        self.positions = np.asarray(positions, dtype=np.float64)
+        self.mode = mode
+        self.tol = tol
+        self.maxiter = maxiter
+        self.smoothing_steps = smoothing_steps
+        self.coarse_size = coarse_size
+
+        # Number of cycles used by the most recent solve
+        self.iterations = 0
+
+        super().__init__(A, pinned=pinned, regularization=regularization)
+
+    def _setup(self, A_ff: sparray):
+        positions = self.positions[self.free]
+        # Every level of the hierarchy is a full matrix, so a symmetric one is expanded once
+        A = scipy.sparse.csr_array(full_matrix(A_ff))
+        cell_size = 2 * mean_edge_length(A, positions)
+
+        # Lists with one entry per level, from fine to coarse
+        self.matrices, self.prolongations, self.inverse_diagonals = [A], [], [1.0 / A.diagonal()]
+        while A.shape[0] > self.coarse_size:
+            clusters = cluster_vertices(positions, cell_size)
+            num_clusters = int(clusters.max()) + 1
+            if num_clusters > 0.8 * A.shape[0]:
+                # The grid is still finer than the mesh, so try again with bigger cells
+                cell_size *= 2
+                continue
+
+            P = smoothed_prolongation(A, clusters)
+            A = scipy.sparse.csr_array(P.T @ A @ P)
+            positions = np.stack([np.bincount(clusters, weights=positions[:, i]) for i in range(3)], axis=1)
+            positions /= np.bincount(clusters)[:, None]
+            cell_size *= 2
+
+            self.prolongations.append(P)
+            self.matrices.append(A)
+            self.inverse_diagonals.append(1.0 / A.diagonal())
+
+        self.coarse_factorization = scipy.sparse.linalg.splu(scipy.sparse.csc_matrix(A))
+
+    @property
+    def num_levels(self) -> int:
+        return len(self.matrices)
+
+    def _smooth(self, level: int, x: np.ndarray, b: np.ndarray) -> np.ndarray:
+        A, inverse_diagonal = self.matrices[level], self.inverse_diagonals[level]
+        for _ in range(self.smoothing_steps):
+            x = x + (2. / 3.) * inverse_diagonal[:, None] * (b - A @ x)
+        return x
+
+    def _cycle(self, level: int, x: np.ndarray, b: np.ndarray) -> np.ndarray:
+        if level == self.num_levels - 1:
+            return self.coarse_factorization.solve(b)
+
+        P = self.prolongations[level]
+        x = self._smooth(level, x, b)
+        residual = b - self.matrices[level] @ x
+        x = x + P @ self._cycle(level + 1, np.zeros([P.shape[1], b.shape[1]]), P.T @ residual)
+        return self._smooth(level, x, b)
+
+    def _solve(self, b: np.ndarray, x0: np.ndarray = None) -> np.ndarray:
+        shape = b.shape
+        b = b.reshape([len(b), -1])
+        A = self.matrices[0]
+
+        if self.mode == 'FMG':
+            # Restrict the right-hand side to every level, then work upwards from the coarsest solution
+            right_hand_sides = [b]
+            for P in self.prolongations:
+                right_hand_sides.append(P.T @ right_hand_sides[-1])
+            x = self.coarse_factorization.solve(right_hand_sides[-1])
+            for level in reversed(range(self.num_levels - 1)):
+                x = self._cycle(level, self.prolongations[level] @ x, right_hand_sides[level])
+            self.iterations = 1
+        else:
+            x = x0.reshape(b.shape) if x0 is not None else np.zeros_like(b)
+            self.iterations = 0
+
+        b_norm = np.linalg.norm(b)
+        while True:
+            self.converged = bool(np.linalg.norm(b - A @ x) <= self.tol * b_norm)
+            if self.converged or self.iterations >= self.maxiter:
+                break
+            x = self._cycle(0, x, b)
+            self.iterations += 1
+
+        return x.reshape(shape)
+
+
+SOLVER_BACKENDS['MULTIGRID'] = MultigridSolver
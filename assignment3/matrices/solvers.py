@@ -0,0 +1,415 @@
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import numpy as np
+import scipy
+import scipy.sparse.linalg
+from scipy.sparse import sparray
+from scipy.sparse.csgraph import connected_components
+
+from assignment3.matrices.instrumentation import TRACER, traced
+from assignment3.matrices.symmetric import PRECISIONS, SymmetricMatrix, full_matrix
+
+
+class PinnedSolver:
+    """
+    Solves the sparse system A x = b for several right-hand sides, while holding some entries of x fixed.
+
+    Matrices like the cotangent matrix S are only positive semi-definite: translating every vertex by the same
+    amount doesn't change S x, so S is singular. Pinning one vertex (or adding a small regularization) removes
+    this null space. The reduced system is factorized once when the solver is created,
+    after which every call to `solve` only performs the (cheap) triangular solves.
+
+    With 'SINGLE' precision the factorization is stored as float32, which halves its memory.
+    Its solutions are then improved with iterative refinement: the residual is computed in float64,
+    and solved for with the same factorization, which recovers (close to) float64 accuracy in a few steps.
+
+    Subclasses can replace the direct factorization by overriding `_setup` and `_solve`.
+    """
+
+    # Whether the solver needs to know the vertex positions (see `make_solver`)
+    needs_positions = False
+
+    # Whether the most recent solve reached its tolerance, the direct solver always does
+    converged = True
+
+    def __init__(
+            self,
+            A: sparray | SymmetricMatrix,
+            pinned: list[int] = None,
+            regularization: float = 0.0,
+            precision: str = 'DOUBLE',
+            refinement_tol: float = 1e-12,
+            max_refinements: int = 10
+    ):
+        """
+        :param A: The NxN sparse system matrix (or a `SymmetricMatrix`).
+        :param pinned: Indices of the entries of x which are held fixed, these are removed from the system.
+        :param regularization: Optional weight of an identity term added to the reduced system.
+        :param precision: Precision of the factorization, either 'DOUBLE' or 'SINGLE' (see `PRECISIONS`).
+        :param refinement_tol: Relative residual at which iterative refinement stops, for 'SINGLE' precision.
+        :param max_refinements: Maximum number of refinement steps per solve, for 'SINGLE' precision.
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}', expected one of {list(PRECISIONS)}")
+        self.precision = precision
+        self.refinement_tol = refinement_tol
+        self.max_refinements = max_refinements
+
+        symmetric = isinstance(A, SymmetricMatrix)
+        if not symmetric:
+            A = scipy.sparse.csc_array(A)
+        num_rows = A.shape[0]
+
+        self.pinned = np.asarray(pinned if pinned is not None else [], dtype=np.int64)
+        is_free = np.ones(num_rows, dtype=bool)
+        is_free[self.pinned] = False
+        self.free = np.flatnonzero(is_free)
+
+        # Split A into the free block, and the coupling of the free entries to the pinned ones
+        if not len(self.pinned):
+            A_ff = A
+            self.A_fp = None
+        elif symmetric:
+            # The free entries keep their order, so the free block of the upper triangle is still upper triangular,
+            # while the coupling combines the entries above the diagonal with the (transposed) ones below it
+            upper = A.upper
+            A_ff = SymmetricMatrix(upper[self.free][:, self.free])
+            self.A_fp = scipy.sparse.csr_array(upper[self.free][:, self.pinned] + upper[self.pinned][:, self.free].T)
+        else:
+            A_ff = scipy.sparse.csc_array(A[:, self.free][self.free, :])
+            self.A_fp = scipy.sparse.csr_array(A[:, self.pinned][self.free, :])
+
+        if regularization:
+            A_ff = A_ff + regularization * scipy.sparse.identity(len(self.free), format='csc')
+
+        if self.precision != 'DOUBLE':
+            # The residuals of the refinement need the system in float64 (of a symmetric one, only half)
+            self.A_ff = A_ff if symmetric else scipy.sparse.csr_array(A_ff)
+            # Number of refinement steps used by the most recent solve
+            self.iterations = 0
+
+        self._setup(A_ff)
+
+    def _setup(self, A_ff: sparray | SymmetricMatrix):
+        # A symmetric matrix is only expanded to its full form for the factorization
+        dtype = PRECISIONS[self.precision]
+        A_ff = A_ff.full(dtype) if isinstance(A_ff, SymmetricMatrix) else A_ff
+        self.factorization = scipy.sparse.linalg.splu(scipy.sparse.csc_matrix(A_ff, dtype=dtype))
+
+    def _solve(self, b: np.ndarray, x0: np.ndarray = None) -> np.ndarray:
+        if self.precision == 'DOUBLE':
+            return self.factorization.solve(b)
+
+        dtype = PRECISIONS[self.precision]
+        x = self.factorization.solve(b.astype(dtype)).astype(np.float64)
+        tolerance = self.refinement_tol * np.linalg.norm(b)
+        self.iterations = 0
+        self.converged = False
+        while self.iterations < self.max_refinements:
+            residual = b - self.A_ff @ x
+            if np.linalg.norm(residual) <= tolerance:
+                self.converged = True
+                break
+            x += self.factorization.solve(residual.astype(dtype))
+            self.iterations += 1
+        return x
+
+    @traced('solve')
+    def solve(self, rhs: np.ndarray, pinned_values: np.ndarray = None, x0: np.ndarray = None) -> np.ndarray:
+        """
+        Finds x such that A x = rhs, for all columns of rhs at once.
+
+        :param rhs: An N or NxK array of right-hand sides.
+        :param pinned_values: The values of the pinned entries of x, as an array of shape [len(pinned)] or [len(pinned), K].
+        :param x0: Optional initial guess with the same shape as rhs, used by the iterative solvers.
+        :return: The solution x, with the same shape as rhs.
+        """
+        rhs = np.asarray(rhs, dtype=np.float64)
+        x = np.empty_like(rhs)
+
+        b = rhs[self.free]
+        if len(self.pinned):
+            x[self.pinned] = pinned_values
+            b = b - self.A_fp @ x[self.pinned]
+
+        x[self.free] = self._solve(b, None if x0 is None else np.asarray(x0, dtype=np.float64)[self.free])
+        # The iterative solvers keep the number of iterations (or cycles) of their last solve
+        TRACER.count('iterations', np.sum(getattr(self, 'iterations', 0)))
+        if not self.converged:
+            # The result is still used, but it is reported both in the trace and as a warning
+            TRACER.count('unconverged')
+            warnings.warn(f"{type(self).__name__} stopped before reaching its tolerance", RuntimeWarning)
+        return x
+
+
+class ConjugateGradientSolver(PinnedSolver):
+    """
+    Solves symmetric positive definite systems with the preconditioned conjugate gradient method.
+
+    Unlike the direct solver, this never forms a factorization of A, so memory use stays proportional to nnz(A).
+    A `SymmetricMatrix` is kept as it is, so only its upper triangle is stored.
+    When a good initial guess is available (such as the current vertex positions, for small smoothing steps),
+    CG converges in a small number of iterations.
+
+    Available preconditioners:
+        - 'NONE': plain conjugate gradients.
+        - 'JACOBI': scales by the inverse of the diagonal of A, practically free.
+        - 'ILU': a threshold incomplete factorization of A (scipy's `spilu`) with a symmetric ordering and
+                 no pivoting, which for symmetric positive definite matrices plays the role of incomplete Cholesky.
+    """
+
+    def __init__(
+            self,
+            A: sparray,
+            pinned: list[int] = None,
+            regularization: float = 0.0,
+            preconditioner: str = 'JACOBI',
+            tol: float = 1e-8,
+            maxiter: int = None
+    ):
+        """
+        :param A: The NxN sparse system matrix, which must be symmetric positive (semi-)definite.
+        :param pinned: Indices of the entries of x which are held fixed, these are removed from the system.
+        :param regularization: Optional weight of an identity term added to the reduced system.
+        :param preconditioner: One of 'NONE', 'JACOBI' or 'ILU'.
+        :param tol: Relative residual at which the iteration stops.
+        :param maxiter: Maximum number of iterations per right-hand side.
+        """
+        self.preconditioner = preconditioner
+        self.tol = tol
+        self.maxiter = maxiter
+
+        # Number of iterations used for each column of the most recent solve
+        self.iterations = []
+
+        super().__init__(A, pinned=pinned, regularization=regularization)
+
+    def _setup(self, A_ff: sparray | SymmetricMatrix):
+        # CG only needs products with A, which a symmetric matrix computes from its triangle (see `_solve`)
+        self.A_ff = A_ff if isinstance(A_ff, SymmetricMatrix) else scipy.sparse.csr_array(A_ff)
+        num_rows = self.A_ff.shape[0]
+
+        if self.preconditioner == 'JACOBI':
+            inverse_diagonal = 1.0 / self.A_ff.diagonal()
+            self.M = scipy.sparse.linalg.LinearOperator(
+                (num_rows, num_rows), matvec=lambda x: inverse_diagonal * x.ravel(), dtype=np.float64
+            )
+        elif self.preconditioner == 'ILU':
+            # A symmetric ordering without pivoting keeps the incomplete factors close to L D L^T,
+            # which CG needs (the default settings of spilu produce a poor, non-symmetric preconditioner)
+            self.incomplete = scipy.sparse.linalg.spilu(
+                scipy.sparse.csc_matrix(full_matrix(A_ff)), drop_tol=1e-4, fill_factor=10, drop_rule='basic',
+                permc_spec='MMD_AT_PLUS_A', diag_pivot_thresh=0.
+            )
+            self.M = scipy.sparse.linalg.LinearOperator(
+                (num_rows, num_rows), matvec=self.incomplete.solve, dtype=np.float64
+            )
+        elif self.preconditioner == 'NONE':
+            self.M = None
+        else:
+            raise ValueError(f"Unknown preconditioner '{self.preconditioner}'")
+
+    def _solve(self, b: np.ndarray, x0: np.ndarray = None) -> np.ndarray:
+        columns = b.reshape([len(b), -1])
+        guesses = x0.reshape(columns.shape) if x0 is not None else np.zeros_like(columns)
+
+        A = self.A_ff
+        if isinstance(A, SymmetricMatrix):
+            A = scipy.sparse.linalg.LinearOperator(A.shape, matvec=lambda v: self.A_ff @ v.ravel(), dtype=np.float64)
+
+        x = np.empty_like(columns)
+        self.iterations = []
+        self.converged = True
+        for c in range(columns.shape[1]):
+            count = [0]
+
+            def callback(_):
+                count[0] += 1
+
+            # A positive info means the maximum number of iterations was reached without meeting the tolerance
+            x[:, c], info = scipy.sparse.linalg.cg(
+                A, columns[:, c], x0=guesses[:, c], rtol=self.tol, maxiter=self.maxiter,
+                M=self.M, callback=callback
+            )
+            self.iterations.append(count[0])
+            self.converged = self.converged and info == 0
+
+        return x.reshape(b.shape)
+
+
+def matrix_components(A: sparray) -> tuple[int, np.ndarray]:
+    """
+    Finds the independent blocks of a symmetric matrix, i.e. the connected components of the graph which has
+    an edge between i and j wherever A_ij is non-zero (for mesh matrices: the connected components of the mesh).
+
+    :param A: An NxN sparse matrix (or a `SymmetricMatrix`).
+    :return: A tuple containing the number of components, and the component of each row.
+    """
+    # The upper triangle of a symmetric matrix has the same (undirected) graph
+    graph = A.upper if isinstance(A, SymmetricMatrix) else A
+    return connected_components(scipy.sparse.csr_matrix(graph), directed=False)
+
+
+def component_pins(labels: np.ndarray, candidates: np.ndarray = None) -> np.ndarray:
+    """
+    Picks one entry to pin in every component, which removes the null space each component of S has.
+
+    :param labels: The component of each entry (see `matrix_components`).
+    :param candidates: Entries which may be pinned, in order of preference (any entry if None).
+    :return: The sorted indices of the pinned entries: the first candidate in each component,
+             or the first entry of a component which contains no candidates.
+    """
+    labels = np.asarray(labels)
+    _, pins = np.unique(labels, return_index=True)
+    if candidates is not None:
+        candidates = np.asarray(candidates, dtype=np.int64)
+        components, first_candidates = np.unique(labels[candidates], return_index=True)
+        pins[components] = candidates[first_candidates]
+    return np.sort(pins)
+
+
+class BlockSolver(PinnedSolver):
+    """
+    Solves a system whose matrix falls apart into independent blocks, such as a matrix of a mesh with several
+    connected components (e.g. `two-tori.obj`), or a scan which consists of hundreds of disjoint pieces.
+
+    The free entries are sorted by the connected component they belong to, which permutes the reduced matrix
+    into a block diagonal one. Every block gets its own solver (of any backend), and the blocks are set up and
+    solved independently on a pool of threads (SuperLU releases the GIL while factorizing and solving).
+
+    Like S as a whole, every block of S is singular on its own, so it needs a pinned entry (see `component_pins`).
+    """
+
+    def __init__(
+            self,
+            A: sparray,
+            pinned: list[int] = None,
+            regularization: float = 0.0,
+            block_type: type = PinnedSolver,
+            positions: np.ndarray = None,
+            workers: int = None,
+            **options
+    ):
+        """
+        :param A: The NxN sparse system matrix (or a `SymmetricMatrix`).
+        :param pinned: Indices of the entries of x which are held fixed, these are removed from the system.
+        :param regularization: Optional weight of an identity term added to the reduced system.
+        :param block_type: The solver class used for each block.
+        :param positions: An Nx3 array of vertex positions, only passed on if the block solver needs it.
+        :param workers: Number of threads (by default one per CPU), with 1 no threads are used.
+        :param options: Any further options, passed on to the solver of each block.
+        """
+        self.block_type = block_type
+        self.positions = positions
+        self.workers = workers
+        self.options = options
+        self.symmetric = isinstance(A, SymmetricMatrix)
+        super().__init__(A, pinned=pinned, regularization=regularization)
+
+    def _map(self, function: Callable, num_blocks: int) -> list:
+        workers = min(self.workers or os.cpu_count() or 1, num_blocks)
+        if workers == 1:
+            return [function(block) for block in range(num_blocks)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(function, range(num_blocks)))
+
+    def _setup(self, A_ff: sparray):
+        num_blocks, labels = matrix_components(A_ff)
+        self.order = np.argsort(labels, kind='stable')
+        self.bounds = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=num_blocks))])
+
+        if self.symmetric:
+            # The stable sort keeps the order within each block, so the blocks of the triangle stay triangular
+            A = scipy.sparse.csr_array(A_ff.upper[self.order][:, self.order])
+        else:
+            # Kept in CSC format, which is what the block solvers factorize
+            A = scipy.sparse.csc_array(scipy.sparse.csr_array(A_ff)[self.order][:, self.order])
+        positions = None if self.positions is None else np.asarray(self.positions)[self.free][self.order]
+
+        def setup_block(block: int) -> PinnedSolver:
+            start, stop = self.bounds[block], self.bounds[block + 1]
+            options = dict(self.options)
+            if self.block_type.needs_positions:
+                options['positions'] = positions[start:stop]
+            block = A[start:stop, start:stop]
+            return self.block_type(SymmetricMatrix(block) if self.symmetric else block, **options)
+
+        self.blocks = self._map(setup_block, num_blocks)
+
+    def _solve(self, b: np.ndarray, x0: np.ndarray = None) -> np.ndarray:
+        b = b[self.order]
+        x0 = None if x0 is None else x0[self.order]
+        x = np.empty_like(b)
+
+        def solve_block(block: int):
+            # The blocks have no pinned entries of their own, so they can be solved directly
+            start, stop = self.bounds[block], self.bounds[block + 1]
+            x[start:stop] = self.blocks[block]._solve(b[start:stop], None if x0 is None else x0[start:stop])
+
+        self._map(solve_block, len(self.blocks))
+        result = np.empty_like(x)
+        result[self.order] = x
+        return result
+
+    @property
+    def iterations(self) -> int:
+        return sum(int(np.sum(getattr(block, 'iterations', 0))) for block in self.blocks)
+
+    @property
+    def converged(self) -> bool:
+        return all(block.converged for block in self.blocks)
+
+
+# Solvers which can be selected by name, see `make_solver`
+# ('MULTIGRID' is added by `assignment3.matrices.multigrid`, which the package imports along with this module)
+SOLVER_BACKENDS = {
+    'DIRECT': PinnedSolver,
+    'CG': ConjugateGradientSolver,
+}
+
+
+@traced('factorization')
+def make_solver(
+        A: sparray | SymmetricMatrix,
+        pinned: list[int] = None,
+        backend: str = 'DIRECT',
+        positions: np.ndarray = None,
+        split_components: bool = True,
+        workers: int = None,
+        **options
+) -> PinnedSolver:
+    """
+    Creates a solver for A x = b using one of the available backends.
+
+    If A falls apart into several independent blocks (the mesh has several connected components),
+    every block is solved separately and concurrently by a `BlockSolver`.
+
+    :param A: The NxN sparse system matrix (or a `SymmetricMatrix`).
+    :param pinned: Indices of the entries of x which are held fixed.
+    :param backend: The name of the solver backend (see `SOLVER_BACKENDS`).
+    :param positions: An Nx3 array of vertex positions, only passed on to solvers which need it (e.g. 'MULTIGRID').
+    :param split_components: Whether to solve the blocks of a matrix with several components separately.
+    :param workers: Number of threads for the blocks (see `BlockSolver`).
+    :param options: Any further options, passed on to the solver
+                    (e.g. precision for 'DIRECT', which is the only backend supporting 'SINGLE' precision,
+                    or preconditioner, tol, or maxiter for 'CG').
+    :return: A solver, which has been set up for A.
+    """
+    if backend not in SOLVER_BACKENDS:
+        raise ValueError(f"Unknown solver backend '{backend}', expected one of {list(SOLVER_BACKENDS)}")
+
+    solver_type = SOLVER_BACKENDS[backend]
+    if backend != 'DIRECT':
+        # Only the direct solver has a float32 factorization, the iterative ones always work in float64
+        if options.pop('precision', 'DOUBLE') != 'DOUBLE':
+            raise ValueError(f"The '{backend}' solver backend only supports 'DOUBLE' precision")
+
+    TRACER.count('nnz', A.nnz)
+    if solver_type.needs_positions:
+        options['positions'] = positions
+    if split_components and matrix_components(A)[0] > 1:
+        return BlockSolver(A, pinned=pinned, block_type=solver_type, workers=workers, **options)
+    return solver_type(A, pinned=pinned, **options)
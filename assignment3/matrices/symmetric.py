@@ -0,0 +1,116 @@
+import numpy as np
+import scipy
+import scipy.sparse
+from scipy.sparse import sparray
+
+# How Laplacian-type operators are stored, see `SymmetricMatrix`
+OPERATOR_STORAGE = ('FULL', 'UPPER')
+
+# Precision of the factorizations of the direct solver, see `PinnedSolver`
+PRECISIONS = {'DOUBLE': np.float64, 'SINGLE': np.float32}
+
+
+class SymmetricMatrix:
+    """
+    A symmetric sparse matrix of which only the upper triangle (including the diagonal) is stored, in CSR format.
+
+    This halves the memory of matrices like S and M + tau * S, and the values can be stored as float32 as well.
+    Products are computed from the triangle directly as A x = U x + U^T x - diag(U) x, always in float64,
+    so the full matrix is only formed when a solver needs it (see `full`).
+    """
+
+    __slots__ = ('upper',)
+
+    def __init__(self, upper: sparray):
+        """
+        :param upper: The upper triangle of the matrix, including its diagonal.
+        """
+        self.upper = scipy.sparse.csr_array(upper)
+        self.upper.sum_duplicates()
+
+    @classmethod
+    def from_triplets(cls, data: np.ndarray, row: np.ndarray, col: np.ndarray, shape: tuple,
+                      dtype=np.float64) -> 'SymmetricMatrix':
+        """
+        Assembles a symmetric matrix from (COO) triplets of its upper triangle, duplicates are summed.
+
+        :param data: The values of the entries.
+        :param row: The row of each entry, which must not be larger than its column.
+        :param col: The column of each entry.
+        :param shape: The shape of the matrix.
+        :param dtype: The type which the values are stored as.
+        """
+        upper = scipy.sparse.csr_array((data, (row, col)), shape=shape)
+        return cls(upper.astype(dtype, copy=False))
+
+    @classmethod
+    def from_full(cls, A: sparray, dtype=np.float64) -> 'SymmetricMatrix':
+        """
+        :param A: A symmetric sparse matrix.
+        :param dtype: The type which the values are stored as.
+        """
+        return cls(scipy.sparse.triu(A, format='csr').astype(dtype, copy=False))
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.upper.shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.upper.dtype
+
+    @property
+    def nnz(self) -> int:
+        """
+        :return: The number of non-zeros of the full matrix.
+        """
+        rows = np.repeat(np.arange(self.shape[0]), np.diff(self.upper.indptr))
+        return 2 * self.upper.nnz - int(np.count_nonzero(self.upper.indices == rows))
+
+    @property
+    def nbytes(self) -> int:
+        return self.upper.data.nbytes + self.upper.indices.nbytes + self.upper.indptr.nbytes
+
+    def diagonal(self) -> np.ndarray:
+        return self.upper.diagonal()
+
+    def full(self, dtype=None, format: str = 'csc') -> sparray:
+        """
+        :param dtype: The type of the values (by default the stored type).
+        :param format: The sparse format of the result.
+        :return: The full matrix.
+        """
+        # With its diagonal halved, the triangle V gives A = V + V^T, where V^T in CSC shares the arrays of V in CSR,
+        # so only one transposed copy of the triangle is made on top of the result
+        upper = self.upper
+        rows = np.repeat(np.arange(self.shape[0], dtype=upper.indices.dtype), np.diff(upper.indptr))
+        data = np.where(upper.indices == rows, 0.5 * upper.data, upper.data).astype(dtype or self.dtype, copy=False)
+        del rows
+        V = scipy.sparse.csr_array((data, upper.indices, upper.indptr), shape=self.shape)
+        V_transposed = scipy.sparse.csc_array((data, upper.indices, upper.indptr), shape=self.shape)
+        return (V.tocsc() + V_transposed).asformat(format)
+
+    def __matmul__(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        diagonal = self.upper.diagonal().astype(np.float64)
+        return self.upper @ X + self.upper.T @ X - (diagonal if X.ndim == 1 else diagonal[:, None]) * X
+
+    def __mul__(self, scale: float) -> 'SymmetricMatrix':
+        return SymmetricMatrix(self.upper * scale)
+
+    __rmul__ = __mul__
+
+    def __add__(self, other) -> 'SymmetricMatrix':
+        # Other symmetric matrices (like the diagonal mass matrix) only contribute their upper triangle
+        other_upper = other.upper if isinstance(other, SymmetricMatrix) else scipy.sparse.triu(other, format='csr')
+        return SymmetricMatrix((self.upper + other_upper).astype(self.dtype, copy=False))
+
+    __radd__ = __add__
+
+
+def full_matrix(A) -> sparray:
+    """
+    :param A: A sparse matrix, or a `SymmetricMatrix`.
+    :return: The matrix itself, or the full version of a `SymmetricMatrix` (in float64).
+    """
+    return A.full(np.float64) if isinstance(A, SymmetricMatrix) else A
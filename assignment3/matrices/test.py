@@ -1,20 +1,53 @@
+import csv
+import json
+import os
+import tempfile
 import unittest
+import bmesh
+import bpy
 import numpy as np
 from mathutils import Matrix, Vector
 from scipy.sparse import csr_array
 
+from .array_mesh import *
+from .cache import *
 from .differential_coordinates import *
+from .instrumentation import *
+from .solvers import *
+from .symmetric import *
+from .multigrid import *
+from .topology import *
+from .util import *
+from assignment3.benchmark import BENCHMARK_CASES, benchmark_cases, compare_results
+from assignment3.mesh_properties import directory_properties
 from data import primitives, meshes
 
 
 class TestGradient(unittest.TestCase):
     # HINT: Add your own unit tests here
-    pass
+
+    def test_matches_triangle_gradient(self):
+        mesh = primitives.TORUS.copy()
+        bmesh.ops.triangulate(mesh, faces=mesh.faces)
+
+        G = build_gradient_matrix(mesh).toarray()
+        for i, face in enumerate(mesh.faces):
+            local_gradient = triangle_gradient(face)
+            for j, vert in enumerate(face.verts):
+                np.testing.assert_allclose(G[3 * i:3 * i + 3, vert.index], local_gradient[:, j], atol=1e-6)
 
 
 class TestMassMatrices(unittest.TestCase):
     # HINT: Add your own unit tests here
-    pass
+
+    def test_matches_face_areas(self):
+        mesh = primitives.UV_SPHERE.copy()
+        bmesh.ops.triangulate(mesh, faces=mesh.faces)
+
+        M, Mv = build_mass_matrices(mesh)
+        areas = np.array([face.calc_area() for face in mesh.faces])
+        np.testing.assert_allclose(Mv.diagonal(), np.repeat(areas, 3), rtol=1e-5)
+        self.assertAlmostEqual(M.sum(), areas.sum(), places=4)
 
 
 class TestCotangentMatrix(unittest.TestCase):
@@ -28,3 +61,312 @@ class TestCotangentMatrix(unittest.TestCase):
     print(cotang)
     print(S)
     assert True
+
+    def test_closed_form_matches_triple_product(self):
+        mesh = primitives.TORUS.copy()
+        bmesh.ops.triangulate(mesh, faces=mesh.faces)
+        verts, faces = numpy_verts(mesh), numpy_faces(mesh)
+
+        G = build_gradient_matrix(mesh)
+        M, Mv = build_mass_matrices(mesh)
+        np.testing.assert_allclose(
+            cotangent_laplacian(verts, faces).toarray(),
+            build_cotangent_matrix(G, Mv).toarray(),
+            atol=1e-8
+        )
+
+    def test_degenerate_triangle(self):
+        verts = np.array([[0., 0., 0.], [1., 0., 0.], [2., 0., 0.]])
+        S = cotangent_laplacian(verts, np.array([[0, 1, 2]]))
+        self.assertTrue(np.all(np.isfinite(S.toarray())))
+
+
+class TestPinnedSolver(unittest.TestCase):
+
+    def test_path_laplacian(self):
+        # The Laplacian of a path graph is singular, but becomes solvable once one end is pinned
+        L = scipy.sparse.diags([[-1.] * 4, [1., 2., 2., 2., 1.], [-1.] * 4], [-1, 0, 1])
+        x = np.stack([np.arange(5.), np.arange(5.) ** 2], axis=1)
+
+        solver = PinnedSolver(L, pinned=[0])
+        np.testing.assert_allclose(solver.solve(L @ x, x[[0]]), x, atol=1e-10)
+
+    def test_conjugate_gradient_backends(self):
+        L = scipy.sparse.diags([[-1.] * 9, [1.] + [2.] * 8 + [1.], [-1.] * 9], [-1, 0, 1])
+        x = np.stack([np.arange(10.), np.sin(np.arange(10.))], axis=1)
+
+        for preconditioner in ['NONE', 'JACOBI', 'ILU']:
+            solver = make_solver(L, pinned=[0], backend='CG', preconditioner=preconditioner, tol=1e-12)
+            np.testing.assert_allclose(solver.solve(L @ x, x[[0]], x0=np.zeros_like(x)), x, atol=1e-8)
+            self.assertTrue(solver.converged)
+
+        # Running out of iterations is reported rather than silently returning the unfinished result
+        solver = make_solver(L, pinned=[0], backend='CG', preconditioner='NONE', tol=1e-12, maxiter=2)
+        with self.assertWarns(RuntimeWarning):
+            solver.solve(L @ x, x[[0]], x0=np.zeros_like(x))
+        self.assertFalse(solver.converged)
+
+    def test_multigrid_modes(self):
+        # A path of 200 vertices along the x-axis, small enough coarse levels force a hierarchy of several levels
+        n = 200
+        L = scipy.sparse.diags([[-1.] * (n - 1), [1.] + [2.] * (n - 2) + [1.], [-1.] * (n - 1)], [-1, 0, 1])
+        positions = np.stack([np.arange(n, dtype=float), np.zeros(n), np.zeros(n)], axis=1)
+        x = np.stack([np.sin(np.arange(n) / 10.), np.arange(n) / n], axis=1)
+
+        for mode in ['V', 'FMG']:
+            solver = make_solver(
+                L, pinned=[0], backend='MULTIGRID', positions=positions, mode=mode, tol=1e-12, coarse_size=20
+            )
+            self.assertGreater(solver.num_levels, 2)
+            np.testing.assert_allclose(solver.solve(L @ x, x[[0]]), x, atol=1e-6)
+
+    def test_components_are_solved_separately(self):
+        # Two separate paths, so pinning only one vertex would leave the other path singular
+        path = scipy.sparse.diags([[-1.] * 4, [1., 2., 2., 2., 1.], [-1.] * 4], [-1, 0, 1])
+        L = scipy.sparse.block_diag([path, path], format='csr')
+        x = np.stack([np.arange(10.), np.arange(10.) ** 2], axis=1)
+
+        num_components, labels = matrix_components(L)
+        pinned = component_pins(labels, [9, 0, 3])
+        self.assertEqual(num_components, 2)
+        np.testing.assert_array_equal(pinned, [0, 9])
+
+        for backend in ['DIRECT', 'CG']:
+            solver = make_solver(L, pinned=pinned, backend=backend, workers=2)
+            self.assertIsInstance(solver, BlockSolver)
+            self.assertEqual(len(solver.blocks), 2)
+            np.testing.assert_allclose(solver.solve(L @ x, x[pinned], x0=np.zeros_like(x)), x, atol=1e-8)
+
+
+class TestSymmetricStorage(unittest.TestCase):
+
+    def test_upper_cotangent_matrix(self):
+        verts, faces = numpy_mesh(primitives.TORUS.copy())
+        S = scipy.sparse.csr_array(cotangent_laplacian(verts, faces))
+        upper = cotangent_laplacian(verts, faces, storage='UPPER')
+
+        self.assertIsInstance(upper, SymmetricMatrix)
+        self.assertEqual(upper.nnz, S.nnz)
+        np.testing.assert_allclose(upper.full().toarray(), S.toarray(), atol=1e-12)
+        np.testing.assert_allclose(upper @ verts, S @ verts, atol=1e-12)
+
+    def test_single_precision_refinement(self):
+        verts, faces = numpy_mesh(primitives.TORUS.copy())
+        M, _ = mass_matrices(verts, faces)
+        A = 1e-3 * cotangent_laplacian(verts, faces, storage='UPPER') + M
+        expected = make_solver(A).solve(M @ verts)
+
+        solver = make_solver(A, precision='SINGLE')
+        self.assertEqual(solver.factorization.L.dtype, np.float32)
+        np.testing.assert_allclose(solver.solve(M @ verts), expected, atol=1e-10)
+        self.assertGreater(solver.iterations, 0)
+
+        # The solvers keep (and CG works on) only the triangle of the pinned system
+        pinned = [0, 5]
+        expected = make_solver(full_matrix(A), pinned=pinned).solve(M @ verts, verts[pinned])
+        for options in [dict(precision='SINGLE'), dict(backend='CG', tol=1e-12)]:
+            solver = make_solver(A, pinned=pinned, **options)
+            self.assertIsInstance(solver.A_ff, SymmetricMatrix)
+            np.testing.assert_allclose(solver.solve(M @ verts, verts[pinned]), expected, atol=1e-8)
+
+        # The iterative backends have no single precision mode
+        with self.assertRaises(ValueError):
+            make_solver(A, backend='CG', precision='SINGLE')
+
+
+class TestOperatorCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = OperatorCache(max_bytes=2 * 8 * 100)
+        for name in ['a', 'b', 'a', 'c']:
+            cache.get(name, lambda: np.zeros(100))
+
+        # 'b' was least recently used when 'c' pushed the cache over its limit
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(cache.hits, 1)
+
+    def test_key_depends_on_geometry(self):
+        verts, faces = np.eye(3), np.array([[0, 1, 2]])
+        self.assertEqual(mesh_key(verts, faces), mesh_key(verts.copy(), faces.copy()))
+        self.assertNotEqual(mesh_key(verts, faces), mesh_key(2 * verts, faces))
+
+
+class TestSelection(unittest.TestCase):
+
+    def test_strip_selection(self):
+        # A strip of triangles (i, i + 1, i + 2), selecting the middle faces
+        faces = np.stack([np.arange(8), np.arange(1, 9), np.arange(2, 10)], axis=1)
+        mask = selected_vertex_mask(faces, [3, 4], 10)
+
+        np.testing.assert_array_equal(np.flatnonzero(mask), [3, 4, 5, 6])
+        np.testing.assert_array_equal(selected_vertices(faces, [3, 4], 10), [3, 4, 5, 6])
+        np.testing.assert_array_equal(boundary_ring(faces, mask), [1, 2, 7, 8])
+        self.assertFalse(selected_vertex_mask(faces, [], 10).any())
+
+
+class TestMeshBridge(unittest.TestCase):
+
+    def test_round_trip_reuses_scratch(self):
+        mesh = primitives.TORUS.copy()
+        bmesh.ops.triangulate(mesh, faces=mesh.faces)
+
+        num_datablocks = len(bpy.data.meshes)
+        verts, faces = numpy_mesh(mesh)
+        set_verts(mesh, verts + 1.0)
+        np.testing.assert_allclose(numpy_verts(mesh), verts + 1.0, atol=1e-5)
+        np.testing.assert_array_equal(numpy_faces(mesh), faces)
+
+        # At most the scratch datablock was added
+        self.assertLessEqual(len(bpy.data.meshes), num_datablocks + 1)
+
+
+class TestMeshTopology(unittest.TestCase):
+
+    def test_strip(self):
+        # A strip of 8 triangles (i, i + 1, i + 2) over 10 vertices
+        faces = np.stack([np.arange(8), np.arange(1, 9), np.arange(2, 10)], axis=1)
+        topology = MeshTopology(faces, 10)
+
+        self.assertEqual(len(topology.edges), 17)
+        self.assertEqual(len(topology.boundary_edges), 10)
+        np.testing.assert_array_equal(topology.degrees, [2, 3, 4, 4, 4, 4, 4, 4, 3, 2])
+        np.testing.assert_array_equal(topology.faces_of([0]), [0])
+
+        mask = np.zeros(10, dtype=bool)
+        mask[5] = True
+        np.testing.assert_array_equal(np.flatnonzero(topology.grow(mask, 1)), [3, 4, 5, 6, 7])
+        np.testing.assert_array_equal(topology.boundary_ring(topology.grow(mask, 1)), [1, 2, 8, 9])
+
+
+class TestTessellation(unittest.TestCase):
+
+    def test_cube_quads(self):
+        faces, polygon_index = MESH_BRIDGE.tessellation(primitives.CUBE)
+        self.assertEqual(faces.shape, (12, 3))
+        np.testing.assert_array_equal(np.bincount(polygon_index), [2] * 6)
+
+        # Each selected quad selects both of its triangles
+        triangles, positions = triangle_selection(polygon_index, [4, 1])
+        np.testing.assert_array_equal(np.sort(polygon_index[triangles]), [1, 1, 4, 4])
+        np.testing.assert_array_equal(np.array([4, 1])[positions], polygon_index[triangles])
+
+
+class TestMeshLoading(unittest.TestCase):
+
+    def test_obj_arrays(self):
+        verts, loops, loop_totals = meshes.read_obj(os.path.join(meshes.MESH_DIR, 'double-torus.obj'))
+        self.assertEqual(verts.shape[1], 3)
+        self.assertEqual(len(loop_totals), 1136)
+        self.assertEqual(loop_totals.sum(), len(loops))
+        self.assertTrue(0 <= loops.min() and loops.max() < len(verts))
+
+        # The second load comes from the (memory-mapped) cache
+        meshes.load_arrays('double-torus')
+        for array, cached in zip((verts, loops, loop_totals), meshes.load_arrays('double-torus.obj')):
+            self.assertIsInstance(cached, np.memmap)
+            np.testing.assert_array_equal(array, cached)
+
+    def test_triangulate_polygons(self):
+        faces = meshes.triangulate_polygons([0, 1, 2, 3, 4, 5, 6], [4, 3])
+        np.testing.assert_array_equal(faces, [[0, 1, 2], [0, 2, 3], [4, 5, 6]])
+
+
+class TestMeshProperties(unittest.TestCase):
+
+    def test_strip(self):
+        # An open strip of triangles is a disk: one boundary loop, genus 0, and no volume
+        faces = np.stack([np.arange(8), np.arange(1, 9), np.arange(2, 10)], axis=1)
+        properties = mesh_properties(ArrayMesh(np.random.rand(11, 3), faces))
+        self.assertEqual(properties, dict(boundary_loops=1, connected_components=1, genus=0, volume=None))
+
+    def test_matches_mesh_properties_csv(self):
+        with open(os.path.join(os.path.dirname(meshes.MESH_DIR), 'mesh_properties.csv')) as file:
+            expected = list(csv.DictReader(file))
+        for row in expected:
+            verts, loops, loop_totals = meshes.load_arrays(row['file'])
+            properties = mesh_properties(ArrayMesh(verts, meshes.triangulate_polygons(loops, loop_totals)))
+            for name in ('boundary_loops', 'connected_components', 'genus'):
+                if row[name]:
+                    self.assertEqual(properties[name], int(row[name]), f"{name} of {row['file']}")
+            if row['volume']:
+                self.assertAlmostEqual(properties['volume'], float(row['volume']), delta=1e-3 * float(row['volume']))
+            else:
+                self.assertIsNone(properties['volume'])
+
+    def test_broken_file(self):
+        # A broken file is reported in its row, instead of stopping the whole run
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'broken.obj')
+            with open(path, 'w') as file:
+                file.write("v 0 0 0\nf 1 2 3\n")
+            [record] = directory_properties([path], workers=1)
+        self.assertIsNone(record['genus'])
+        self.assertIn('IndexError', record['error'])
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_cases_run(self):
+        verts, loops, loop_totals = meshes.load_arrays('double-torus')
+        faces = meshes.triangulate_polygons(loops, loop_totals)
+        cases = benchmark_cases(np.array(verts), faces)
+        self.assertEqual(list(cases), BENCHMARK_CASES)
+        for run in cases.values():
+            run()
+
+    def test_compare_results(self):
+        baseline = [dict(mesh='m', verts=10, case=case, time=1.0, peak_bytes=100) for case in ('a', 'b', 'c')]
+        results = [
+            dict(mesh='m', verts=10, case='a', time=1.1, peak_bytes=100),
+            dict(mesh='m', verts=10, case='b', time=2.0, peak_bytes=100),
+            dict(mesh='m', verts=10, case='c', time=1.0, peak_bytes=200),
+        ]
+        regressions = [c['regression'] for c in compare_results(results, baseline, tolerance=0.25)]
+        self.assertEqual(regressions, [False, True, True])
+
+        # A case which now fails, or no longer runs at all, is a regression as well
+        results = [dict(mesh='m', verts=10, case='a', error="RuntimeError: boom")]
+        comparisons = compare_results(results, baseline, tolerance=0.25)
+        self.assertEqual([c['case'] for c in comparisons], ['a', 'b', 'c'])
+        self.assertTrue(all(c['regression'] for c in comparisons))
+        self.assertEqual(comparisons[0]['error'], "RuntimeError: boom")
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_disabled_records_nothing(self):
+        # A fresh tracer, as the global one is enabled when the tests run with ASSIGNMENT3_TRACE set
+        tracer = Tracer()
+        self.assertFalse(tracer.enabled)
+        with tracer.operation('nothing') as trace:
+            self.assertIsNone(trace)
+            self.assertIs(tracer.stage('solve'), tracer.stage('assembly'))
+
+    def test_stages_and_counters(self):
+        verts, faces = numpy_mesh(primitives.TORUS.copy())
+        with tempfile.TemporaryDirectory() as directory:
+            trace_path = os.path.join(directory, 'trace.jsonl')
+            was_enabled, previous_path = TRACER.enabled, TRACER.trace_path
+            TRACER.enable(trace_path)
+            try:
+                with TRACER.operation('deform') as trace:
+                    with TRACER.stage('assembly'):
+                        S = cotangent_laplacian(verts, faces)
+                    make_solver(S, pinned=[0]).solve(S @ verts, verts[[0]])
+            finally:
+                # Leaves the global tracer as it was (e.g. enabled by ASSIGNMENT3_TRACE)
+                if was_enabled:
+                    TRACER.enable(previous_path)
+                else:
+                    TRACER.disable()
+
+            with open(trace_path) as file:
+                [record] = [json.loads(line) for line in file]
+
+        # Nested stages only count towards the innermost one, so the stages never take longer than the whole
+        self.assertEqual(list(record['stages']), ['assembly', 'factorization', 'solve'])
+        self.assertLessEqual(sum(stage['time_s'] for stage in record['stages'].values()), record['total_s'])
+        self.assertEqual(record['counters']['nnz'], S.nnz)
+        self.assertTrue(trace.summary().startswith("Done in"))
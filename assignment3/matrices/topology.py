@@ -0,0 +1,114 @@
+import numpy as np
+from scipy.sparse.csgraph import connected_components
+
+from assignment3.matrices.array_mesh import ArrayMesh, MeshTopology, edge_adjacency
+
+# Columns of data/mesh_properties.csv (after the file name)
+MESH_PROPERTIES = ['boundary_loops', 'connected_components', 'genus', 'volume']
+
+
+def component_labels(topology: MeshTopology) -> tuple[int, np.ndarray]:
+    """
+    Finds the connected components of a mesh, i.e. the sets of vertices which are connected through its edges.
+
+    Faces which only touch at a vertex therefore belong to the same component, this is also how the blocks
+    of the mesh matrices fall apart (see `matrix_components`). Vertices which don't belong to any face
+    aren't part of a component.
+
+    :param topology: The topology of the mesh.
+    :return: A tuple containing the number of components, and the component of each vertex (-1 for unused vertices).
+    """
+    used = np.zeros(topology.num_verts, dtype=bool)
+    used[topology.faces.ravel()] = True
+    _, labels = connected_components(topology.adjacency, directed=False)
+
+    # Unused vertices are components of their own, so the labels are renumbered without them
+    components, used_labels = np.unique(labels[used], return_inverse=True)
+    labels = np.full(topology.num_verts, -1, dtype=np.int64)
+    labels[used] = used_labels
+    return len(components), labels
+
+
+def boundary_loop_labels(topology: MeshTopology) -> tuple[int, np.ndarray]:
+    """
+    Finds the boundary loops of a mesh, by walking along its boundary edges (the edges which belong to a single face).
+
+    All walks are done at once, as the connected components of the graph formed by the boundary edges.
+
+    :param topology: The topology of the mesh.
+    :return: A tuple containing the number of boundary loops, and the loop of each edge in `topology.boundary_edges`.
+    """
+    edges = topology.boundary_edges
+    if len(edges) == 0:
+        return 0, np.zeros(0, dtype=np.int64)
+
+    # Only the boundary vertices are part of the graph, so its size doesn't depend on the rest of the mesh
+    boundary_verts, edges = np.unique(edges, return_inverse=True)
+    edges = edges.reshape([-1, 2])
+    num_loops, labels = connected_components(edge_adjacency(edges, len(boundary_verts)), directed=False)
+    return num_loops, labels[edges[:, 0]]
+
+
+def component_genus(topology: MeshTopology) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the genus of every connected component from its Euler characteristic V - E + F = 2 - 2g - b,
+    where b is its number of boundary loops. This assumes the mesh is an orientable manifold.
+
+    Polygons may be split into triangles first, as every extra edge also adds a face.
+
+    :param topology: The topology of the mesh.
+    :return: A tuple containing the genus and the number of boundary loops of each component.
+    """
+    num_components, labels = component_labels(topology)
+    _, loop_labels = boundary_loop_labels(topology)
+
+    V = np.bincount(labels[labels >= 0], minlength=num_components)
+    E = np.bincount(labels[topology.edges[:, 0]], minlength=num_components)
+    F = np.bincount(labels[topology.faces[:, 0]], minlength=num_components)
+
+    # Every loop lies within a single component
+    loop_components = np.zeros(len(np.unique(loop_labels)), dtype=np.int64)
+    loop_components[loop_labels] = labels[topology.boundary_edges[:, 0]]
+    b = np.bincount(loop_components, minlength=num_components)
+
+    return (2 - (V - E + F) - b) // 2, b
+
+
+def is_closed(topology: MeshTopology) -> bool:
+    """
+    :param topology: The topology of the mesh.
+    :return: Whether every edge of the mesh belongs to exactly two faces.
+    """
+    return bool(np.all(topology.edge_face_counts == 2))
+
+
+def enclosed_volume(verts: np.ndarray, faces: np.ndarray) -> float:
+    """
+    Computes the volume enclosed by a closed mesh with the divergence theorem,
+    as the sum of the signed volumes of the tetrahedra between each triangle and the origin.
+
+    :param verts: An Nx3 array of vertex positions.
+    :param faces: An Mx3 array of vertex indices, one row per triangle (consistently oriented).
+    :return: The enclosed volume, which is negative if the faces point inwards.
+    """
+    a, b, c = (verts[faces[:, i]] for i in range(3))
+    return float(np.einsum('ij,ij->', a, np.cross(b, c))) / 6
+
+
+def mesh_properties(mesh: ArrayMesh) -> dict:
+    """
+    Computes the topological properties listed in data/mesh_properties.csv.
+
+    :param mesh: The mesh (with its polygons split into triangles).
+    :return: A dict with the `MESH_PROPERTIES`: the number of boundary loops and connected components
+             (connected through vertices, see `component_labels`), the total genus of all components,
+             and the enclosed volume (None if the mesh isn't closed).
+    """
+    topology = mesh.topology
+    genus, loops = component_genus(topology)
+    return dict(
+        boundary_loops=int(loops.sum()),
+        connected_components=len(genus),
+        genus=int(genus.sum()),
+        volume=enclosed_volume(mesh.verts, mesh.faces) if is_closed(topology) else None,
+    )
@@ -1,51 +1,314 @@
 import numpy as np
 
-import bpy
-import bmesh
+from assignment3.matrices.cache import OPERATOR_CACHE, mesh_key
+from assignment3.matrices.instrumentation import traced
+
+
+def is_bmesh(mesh) -> bool:
+    """
+    :param mesh: A BMesh or a blender Mesh.
+    :return: Whether the mesh is a BMesh.
+    """
+    # bmesh is only imported here, so that the array functions in this module can be used outside of blender
+    import bmesh
+    return isinstance(mesh, bmesh.types.BMesh)
+
+
+class MeshBridge:
+    """
+    Moves vertex positions (and other mesh data) between blender meshes and numpy arrays.
+
+    Reading a BMesh goes through a single scratch `bpy.types.Mesh` datablock, which is reused for every call
+    (instead of creating a new datablock each time, which is never freed), and removed again by `release`.
+    Writing a BMesh only moves its vertices, rather than rebuilding the whole mesh from a datablock.
+    """
+
+    def __init__(self, name: str = 'assignment3_scratch'):
+        """
+        :param name: Name of the scratch datablock.
+        """
+        self.name = name
+        self._scratch = None
+
+    @property
+    def scratch(self):
+        """
+        :return: The scratch datablock, which is (re)created if it doesn't exist (e.g. after loading a new file).
+        """
+        try:
+            self._scratch.name
+        except (AttributeError, ReferenceError):
+            import bpy
+            self._scratch = bpy.data.meshes.new(self.name)
+        return self._scratch
+
+    @traced('extraction')
+    def mesh_data(self, mesh):
+        """
+        :param mesh: A BMesh or a blender Mesh.
+        :return: The blender Mesh itself, or the scratch datablock holding a copy of the BMesh.
+        """
+        if is_bmesh(mesh):
+            data = self.scratch
+            mesh.to_mesh(data)
+            return data
+        return mesh
+
+    @traced('extraction')
+    def verts(self, mesh) -> np.ndarray:
+        data = self.mesh_data(mesh)
+        vertices = np.empty(len(data.vertices) * 3, dtype=np.float64)
+        data.vertices.foreach_get('co', vertices)
+        return vertices.reshape([len(data.vertices), 3])
+
+    def normals(self, mesh) -> np.ndarray:
+        data = self.mesh_data(mesh)
+        normals = np.empty(len(data.vertices) * 3, dtype=np.float64)
+        data.vertices.foreach_get('normal', normals)
+        return normals.reshape([len(data.vertices), 3])
+
+    @traced('triangulation')
+    def tessellation(self, mesh) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Splits the polygons of a mesh into triangles, without changing the mesh itself.
+
+        The result only depends on the polygons, so it is cached until the topology of the mesh changes.
+
+        :param mesh: A BMesh or a blender Mesh.
+        :return: A tuple containing a Tx3 array with the vertex indices of each triangle,
+                 and an array with the index of the polygon each triangle belongs to.
+        """
+        data = self.mesh_data(mesh)
+        loops = np.empty(len(data.loops), dtype=np.int32)
+        data.loops.foreach_get('vertex_index', loops)
+        loop_totals = np.empty(len(data.polygons), dtype=np.int32)
+        data.polygons.foreach_get('loop_total', loop_totals)
+
+        def build():
+            if np.all(loop_totals == 3):
+                # Already a triangle mesh, so every polygon is its own triangle
+                return loops.reshape([-1, 3]), np.arange(len(loop_totals), dtype=np.int32)
+
+            data.calc_loop_triangles()
+            triangles = np.empty(len(data.loop_triangles) * 3, dtype=np.int32)
+            data.loop_triangles.foreach_get('vertices', triangles)
+            polygon_index = np.empty(len(data.loop_triangles), dtype=np.int32)
+            data.loop_triangles.foreach_get('polygon_index', polygon_index)
+            return triangles.reshape([-1, 3]), polygon_index
+
+        return OPERATOR_CACHE.get((mesh_key(loops, loop_totals), 'tessellation'), build)
+
+    def faces(self, mesh) -> np.ndarray:
+        return self.tessellation(mesh)[0]
+
+    @traced('extraction')
+    def edges(self, mesh) -> np.ndarray:
+        data = self.mesh_data(mesh)
+        edges = np.empty(len(data.edges) * 2, dtype=np.int32)
+        data.edges.foreach_get('vertices', edges)
+        return edges.reshape([len(data.edges), 2])
+
+    @traced('extraction')
+    def selected_faces(self, mesh) -> np.ndarray:
+        data = self.mesh_data(mesh)
+        selected = np.empty(len(data.polygons), dtype=bool)
+        data.polygons.foreach_get('select', selected)
+        return np.flatnonzero(selected)
+
+    def verts_and_faces(self, mesh) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Like `verts` and `tessellation`, but only copies a BMesh into the scratch datablock once.
+        """
+        data = self.mesh_data(mesh)
+        return self.verts(data), *self.tessellation(data)
+
+    @traced('write-back')
+    def set_verts(self, mesh, verts: np.ndarray):
+        if is_bmesh(mesh):
+            # BMesh has no bulk setter, but moving the vertices in place keeps all other mesh data untouched
+            for vert, co in zip(mesh.verts, verts.tolist()):
+                vert.co = co
+        else:
+            mesh.vertices.foreach_set('co', np.ascontiguousarray(verts, dtype=np.float64).ravel())
+        return mesh
+
+    def release(self):
+        """
+        Removes the scratch datablock, if it exists.
+        """
+        import bpy
+        try:
+            bpy.data.meshes.remove(self._scratch)
+        except (TypeError, ReferenceError):
+            pass
+        self._scratch = None
+
+
+# Shared by all functions below, the scratch datablock is released when the add-on is unregistered
+MESH_BRIDGE = MeshBridge()
+
+
+def vertex_count(mesh) -> int:
+    """
+    :param mesh: A BMesh or a blender Mesh.
+    :return: The number of vertices of the mesh.
+    """
+    return len(mesh.verts) if is_bmesh(mesh) else len(mesh.vertices)
 
 
 def numpy_verts(mesh) -> np.ndarray:
     """
     Extracts a numpy array of (x, y, z) vertices from a blender mesh
 
-    :param mesh: The BMesh to extract the vertices of.
+    :param mesh: The BMesh (or Mesh) to extract the vertices of.
     :return: A numpy array of shape [n, 3], where array[i, :] is the x, y, z coordinate of vertex i.
     """
     # Explained here:
     # https://blog.michelanders.nl/2016/02/copying-vertices-to-numpy-arrays-in_4.html
-    if isinstance(mesh, bmesh.types.BMesh):
-        data = bpy.data.meshes.new('tmp')
-        mesh.to_mesh(data)
-        mesh = data
-
-    vertices = np.zeros(len(mesh.vertices) * 3, dtype=np.float64)
-    mesh.vertices.foreach_get('co', vertices)
-    return vertices.reshape([len(mesh.vertices), 3])
+    return MESH_BRIDGE.verts(mesh)
 
 
 def numpy_normals(mesh) -> np.ndarray:
     """
     Extracts a numpy array of (x, y, z) normals from a blender mesh
 
-    :param mesh: The BMesh to extract the normals of.
+    :param mesh: The BMesh (or Mesh) to extract the normals of.
     :return: A numpy array of shape [n, 3], where array[i, :] is the x, y, z normal of vertex i.
     """
-    if isinstance(mesh, bmesh.types.BMesh):
-        data = bpy.data.meshes.new('tmp')
-        mesh.to_mesh(data)
-        mesh = data
+    return MESH_BRIDGE.normals(mesh)
+
+
+def numpy_faces(mesh) -> np.ndarray:
+    """
+    Extracts a numpy array of triangles from a blender mesh
+
+    Polygons with more than three vertices are split into triangles (see `MeshBridge.tessellation`),
+    so the mesh doesn't need to be triangulated first.
+
+    :param mesh: The BMesh (or Mesh) to extract the faces of.
+    :return: A numpy array of shape [m, 3], where array[i, :] contains the vertex indices of triangle i.
+    """
+    return MESH_BRIDGE.faces(mesh)
+
+
+def numpy_edges(mesh) -> np.ndarray:
+    """
+    Extracts a numpy array of edges from a blender mesh
+
+    :param mesh: The BMesh (or Mesh) to extract the edges of.
+    :return: A numpy array of shape [e, 2], where array[i, :] contains the vertex indices of edge i.
+    """
+    return MESH_BRIDGE.edges(mesh)
+
+
+def numpy_selected_faces(mesh) -> np.ndarray:
+    """
+    :param mesh: The BMesh (or Mesh) to find the selected faces of.
+    :return: The indices of the selected faces (polygons) of the mesh.
+    """
+    return MESH_BRIDGE.selected_faces(mesh)
+
+
+def numpy_mesh(mesh) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Extracts both the vertices and triangles of a blender mesh, see `numpy_verts` and `numpy_faces`.
+
+    :param mesh: The BMesh (or Mesh) to extract the vertices and faces of.
+    :return: A tuple containing an [n, 3] array of vertex positions and an [m, 3] array of vertex indices.
+    """
+    verts, triangles, _ = MESH_BRIDGE.verts_and_faces(mesh)
+    return verts, triangles
+
+
+def numpy_tessellated_mesh(mesh) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Like `numpy_mesh`, but also returns the index of the polygon each triangle belongs to.
+
+    :param mesh: The BMesh (or Mesh) to extract the vertices and faces of.
+    :return: A tuple containing an [n, 3] array of vertex positions, an [m, 3] array of vertex indices,
+             and an array of length m with the polygon index of each triangle.
+    """
+    return MESH_BRIDGE.verts_and_faces(mesh)
 
-    normals = np.zeros(len(mesh.vertices) * 3, dtype=np.float64)
-    mesh.vertices.foreach_get('normal', normals)
-    return normals.reshape([len(mesh.vertices), 3])
+
+def triangle_selection(polygon_index: np.ndarray, selected_face_indices) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Converts a selection of polygons into a selection of the triangles they were split into.
+
+    :param polygon_index: The index of the polygon each triangle belongs to.
+    :param selected_face_indices: Indices of the selected polygons.
+    :return: A tuple containing the indices of the selected triangles, and for each of them,
+             the position of its polygon in `selected_face_indices`.
+    """
+    selected = np.asarray(selected_face_indices, dtype=np.int64)
+    num_polygons = max(int(polygon_index.max(initial=-1)), int(selected.max(initial=-1))) + 1
+    position = np.full(num_polygons, -1, dtype=np.int64)
+    position[selected] = np.arange(len(selected))
+
+    triangles = np.flatnonzero(position[polygon_index] >= 0)
+    return triangles, position[polygon_index[triangles]]
 
 
 def set_verts(mesh, verts: np.ndarray):
-    if isinstance(mesh, bmesh.types.BMesh):
-        data = bpy.data.meshes.new('tmp1')
-        mesh.to_mesh(data)
-        data.vertices.foreach_set('co', verts.ravel())
-        mesh.clear()
-        mesh.from_mesh(data)
-    else:
-        mesh.vertices.foreach_set('co', verts.ravel())
+    """
+    Moves the vertices of a blender mesh, without changing anything else.
+
+    :param mesh: The BMesh (or Mesh) to update, a Mesh still needs a call to `update` afterwards.
+    :param verts: A numpy array of shape [n, 3] with the new vertex positions.
+    :return: The same mesh.
+    """
+    return MESH_BRIDGE.set_verts(mesh, verts)
+
+
+def selected_vertex_mask(faces: np.ndarray, selected_face_indices, num_verts: int) -> np.ndarray:
+    """
+    Finds which vertices belong to a selection of faces.
+
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :param selected_face_indices: Indices of the selected faces (or a boolean mask over the faces).
+    :param num_verts: Number of vertices of the mesh.
+    :return: A boolean array of length N, which is True for every vertex of a selected face.
+    """
+    selected = np.asarray(selected_face_indices)
+    if selected.dtype != bool:
+        selected = selected.astype(np.int64)  # An empty list would otherwise be an array of floats
+
+    mask = np.zeros(num_verts, dtype=bool)
+    mask[faces[selected]] = True
+    return mask
+
+
+def selected_vertices(faces: np.ndarray, selected_face_indices, num_verts: int) -> np.ndarray:
+    """
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :param selected_face_indices: Indices of the selected faces (or a boolean mask over the faces).
+    :param num_verts: Number of vertices of the mesh.
+    :return: The sorted indices of all vertices of the selected faces.
+    """
+    return np.flatnonzero(selected_vertex_mask(faces, selected_face_indices, num_verts))
+
+
+def grow_vertex_mask(faces: np.ndarray, mask: np.ndarray, rings: int = 1) -> np.ndarray:
+    """
+    Grows a set of vertices by adding every vertex which shares a face with it, `rings` times.
+
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :param mask: A boolean array of length N, marking the vertices in the set.
+    :param rings: Number of rings of neighbours to add.
+    :return: A new boolean array, marking the grown set.
+    """
+    mask = mask.copy()
+    for _ in range(rings):
+        mask[faces[mask[faces].any(axis=1)]] = True
+    return mask
+
+
+def boundary_ring(faces: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """
+    Finds the ring of vertices just outside a set of vertices.
+
+    :param faces: An Mx3 array of vertex indices, one row per triangle.
+    :param mask: A boolean array of length N, marking the vertices in the set.
+    :return: The sorted indices of the vertices outside the set which share a face with a vertex in the set.
+    """
+    return np.flatnonzero(grow_vertex_mask(faces, mask) & ~mask)
@@ -0,0 +1,110 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+from assignment3.batch import find_obj_files
+
+FIELDS = ['file', 'boundary_loops', 'connected_components', 'genus', 'volume', 'error']
+
+
+def file_properties(path: str) -> dict:
+    """
+    Loads an OBJ file and computes its topological properties (see `mesh_properties`).
+
+    Errors are caught and reported in the result, so that a single broken file doesn't stop a bulk run.
+
+    :param path: Path of the OBJ file.
+    :return: A dict with the path of the file and its properties,
+             or with empty properties and the error if the file couldn't be read or processed.
+    """
+    from data.meshes import read_obj, triangulate_polygons
+    from assignment3.matrices.array_mesh import ArrayMesh
+    from assignment3.matrices.topology import MESH_PROPERTIES, mesh_properties
+
+    try:
+        verts, loops, loop_totals = read_obj(path)
+        return dict(file=path, **mesh_properties(ArrayMesh(verts, triangulate_polygons(loops, loop_totals))))
+    except Exception as e:
+        return dict(file=path, **dict.fromkeys(MESH_PROPERTIES), error=f"{type(e).__name__}: {e}")
+
+
+def directory_properties(paths: list[str], workers: int = None) -> Iterator[dict]:
+    """
+    Computes the properties of many OBJ files, spread over a pool of processes.
+
+    :param paths: Paths of the OBJ files.
+    :param workers: Number of processes (by default one per CPU), with 1 everything is done in this process.
+    :return: The properties of each file, in the same order as the paths.
+    """
+    if workers == 1 or len(paths) <= 1:
+        yield from map(file_properties, paths)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Most meshes only take milliseconds, so they are handed out in chunks
+        chunk_size = max(1, len(paths) // (4 * (workers or os.cpu_count() or 1)))
+        yield from executor.map(file_properties, paths, chunksize=chunk_size)
+
+
+def write_properties(records: Iterator[dict], file, relative_to: str = None) -> list[dict]:
+    """
+    Writes mesh properties as CSV, in the format of data/mesh_properties.csv (with an extra error column).
+
+    Properties which are undefined (the volume of an open mesh), or couldn't be computed, are left empty.
+
+    :param records: The properties of each file.
+    :param file: The (text) file to write to.
+    :param relative_to: Directory which the file paths are written relative to, if any.
+    :return: The records which were written.
+    """
+    writer = csv.DictWriter(file, FIELDS)
+    writer.writeheader()
+    written = []
+    for record in records:
+        row = dict(record, file=os.path.relpath(record['file'], relative_to) if relative_to else record['file'])
+        if row.get('volume') is not None:
+            row['volume'] = f"{row['volume']:.4f}"
+        writer.writerow(row)
+        written.append(record)
+    return written
+
+
+def main(argv: list[str]) -> list[dict]:
+    """
+    Writes the properties of all OBJ files in a set of directories (or files, or glob patterns) to a CSV file.
+
+    :param argv: The command line arguments, run with --help for the list.
+    :return: The properties of all files.
+    """
+    parser = argparse.ArgumentParser(
+        prog='mesh_properties.py',
+        description="Computes the boundary loops, connected components, genus and volume of many OBJ files."
+    )
+    parser.add_argument('inputs', nargs='+', help="Directories, OBJ files or glob patterns")
+    parser.add_argument('--output', '-o', help="Path of the CSV file (default: standard output)")
+    parser.add_argument('--workers', '-j', type=int, default=None, help="Number of processes (default: all CPUs)")
+    args = parser.parse_args(argv)
+
+    paths = find_obj_files(args.inputs)
+    # File names are written relative to the directory which contains all of them
+    relative_to = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths]) if paths else None
+    paths = [os.path.abspath(path) for path in paths]
+
+    start = time.perf_counter()
+    if args.output is None:
+        records = write_properties(directory_properties(paths, args.workers), sys.stdout, relative_to)
+    else:
+        with open(args.output, 'w', newline='') as file:
+            records = write_properties(directory_properties(paths, args.workers), file, relative_to)
+    print(f"Computed the properties of {len(records)} meshes in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+
+    failed = [record for record in records if record.get('error')]
+    for record in failed:
+        print(f"Failed: {record['file']}: {record['error']}", file=sys.stderr)
+    if failed:
+        print(f"{len(failed)} of {len(records)} meshes failed", file=sys.stderr)
+    return records
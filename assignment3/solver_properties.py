@@ -0,0 +1,88 @@
+import bpy
+
+
+class SolverProperties:
+    """
+    Operator mixin which exposes the choice of linear solver (see `assignment3.matrices.solvers`).
+    """
+
+    solver_backend: bpy.props.EnumProperty(
+        name="Solver", description="Method used to solve the sparse linear systems.",
+        items=[
+            ('DIRECT', "Direct (LU)", "Factorize the system once, then only back-substitute"),
+            ('CG', "Conjugate Gradient", "Iterative solver, warm-started from the current vertex positions"),
+            ('MULTIGRID', "Multigrid", "Geometric multigrid on a hierarchy of vertex clusters, for very large meshes"),
+        ]
+    )
+    multigrid_mode: bpy.props.EnumProperty(
+        name="Cycle", description="Multigrid cycle type.",
+        items=[
+            ('V', "V-Cycle", "Repeated V-cycles, starting from the current vertex positions"),
+            ('FMG', "Full Multigrid", "Start from the coarsest level, then continue with V-cycles"),
+        ]
+    )
+    preconditioner: bpy.props.EnumProperty(
+        name="Preconditioner", description="Preconditioner for the conjugate gradient solver.",
+        items=[
+            ('JACOBI', "Jacobi", "Scale by the inverse diagonal"),
+            ('ILU', "Incomplete Factorization", "Incomplete LU (Cholesky) factorization"),
+            ('NONE', "None", ""),
+        ]
+    )
+    tolerance: bpy.props.FloatProperty(
+        name="Tolerance",
+        description="Relative residual at which the iterative solver stops",
+        default=1e-8,
+        min=0.0,
+        precision=10
+    )
+    max_iterations: bpy.props.IntProperty(
+        name="Max Iterations",
+        description="Maximum number of iterations of the iterative solver",
+        default=1000,
+        min=1
+    )
+
+    storage: bpy.props.EnumProperty(
+        name="Storage", description="How the cotangent matrices are stored.",
+        items=[
+            ('FULL', "Full", "Store every entry of the matrices"),
+            ('UPPER', "Upper Triangle", "Only store the upper triangle of the symmetric matrices, which halves them"),
+        ]
+    )
+    precision: bpy.props.EnumProperty(
+        name="Precision", description="Precision of the factorization of the direct solver.",
+        items=[
+            ('DOUBLE', "Double", "Factorize in float64"),
+            ('SINGLE', "Single", "Factorize in float32 with iterative refinement, which halves the factorization"),
+        ]
+    )
+
+    def solver_options(self) -> dict:
+        if self.solver_backend == 'DIRECT':
+            return dict(storage=self.storage, precision=self.precision)
+        if self.solver_backend == 'MULTIGRID':
+            return dict(
+                backend='MULTIGRID', storage=self.storage, mode=self.multigrid_mode, tol=self.tolerance,
+                maxiter=self.max_iterations
+            )
+        return dict(
+            backend=self.solver_backend,
+            storage=self.storage,
+            preconditioner=self.preconditioner,
+            tol=self.tolerance,
+            maxiter=self.max_iterations
+        )
+
+    def draw_solver_properties(self, layout):
+        layout.prop(self, 'solver_backend')
+        layout.prop(self, 'storage')
+        if self.solver_backend == 'DIRECT':
+            layout.prop(self, 'precision')
+        elif self.solver_backend == 'CG':
+            layout.prop(self, 'preconditioner')
+        elif self.solver_backend == 'MULTIGRID':
+            layout.prop(self, 'multigrid_mode')
+        if self.solver_backend != 'DIRECT':
+            layout.prop(self, 'tolerance')
+            layout.prop(self, 'max_iterations')
@@ -0,0 +1,35 @@
+# The command line tools only need numpy and scipy, so these tests run without Blender as well:
+# python -m unittest assignment3.test
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from assignment3.batch import output_paths, parse_indices, run_batch
+from data import meshes
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_parse_indices(self):
+        np.testing.assert_array_equal(parse_indices("3, 0-2,2"), [0, 1, 2, 3])
+
+    def test_output_paths(self):
+        # Files with the same name in different directories get different outputs
+        outputs = output_paths([os.path.join('in', 'a', 'mesh.obj'), os.path.join('in', 'b', 'mesh.obj')], 'out')
+        self.assertEqual(outputs, [os.path.join('out', 'a', 'mesh.obj'), os.path.join('out', 'b', 'mesh.obj')])
+
+    def test_round_trip(self):
+        path = os.path.join(meshes.MESH_DIR, 'half-torus.obj')
+        verts, loops, loop_totals = meshes.read_obj(path)
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            [record] = run_batch([path], output_dir, 'gradient', workers=1)
+            self.assertEqual(record['status'], 'ok')
+
+            # The identity leaves the mesh unchanged, and the polygons are written back as they were
+            new_verts, new_loops, new_loop_totals = meshes.read_obj(record['output'])
+            np.testing.assert_allclose(new_verts, verts, atol=1e-5)
+            np.testing.assert_array_equal(new_loops, loops)
+            np.testing.assert_array_equal(new_loop_totals, loop_totals)
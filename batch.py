@@ -0,0 +1,21 @@
+# Applies a deformation or smoothing operation to many OBJ files, outside of the Blender UI.
+# This should be invoked with the following command line (or equivalent)
+# blender --background --python batch.py -- <operation> <directories, files or globs> [options]
+# or, since it only uses the array code, with plain python
+# python batch.py <operation> <directories, files or globs> [options]
+# Run with --help for the list of options, e.g.
+# python batch.py implicit "scans/*.obj" --tau 0.001 --iterations 10 --output smoothed
+import os
+import sys
+
+# Blender will actually run this in another directory, so we need to make sure everything is available to import
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Dealing with contested command line parameters
+# see: https://blender.stackexchange.com/questions/267812/blender-doesnt-recognize-python-as-a-command-line-argument
+argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+
+from assignment3.batch import main
+
+if __name__ == '__main__':
+    main(argv)
@@ -0,0 +1,21 @@
+# This should be invoked with the following command line (or equivalent)
+# blender --background --python benchmark.py -- <command> [options]
+# where the command is one of
+#   multigrid [subdivision levels]          compares the multigrid solver to the direct solver
+#   storage [subdivision levels]            compares the memory and accuracy of symmetric and float32 storage
+#   suite [--max-verts N] [--baseline F]   measures every matrix builder and operator, and writes JSON results
+#   compare <results> <baseline>            flags regressions between two sets of results
+# Only the primitive meshes need Blender, so the other meshes can also be measured with plain python.
+import os
+import sys
+
+# Blender will actually run this in another directory, so we need to make sure everything is available to import
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Dealing with contested command line parameters
+# see: https://blender.stackexchange.com/questions/267812/blender-doesnt-recognize-python-as-a-command-line-argument
+argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+
+from assignment3.benchmark import main
+
+sys.exit(main(argv))
@@ -1 +0,0 @@
-from .primitives import *
\ No newline at end of file
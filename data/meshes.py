@@ -1,21 +1,160 @@
 import os
-import bpy, bmesh
+import numpy as np
 
 MESH_DIR = os.path.join(os.path.dirname(__file__), 'meshes')
+CACHE_DIR = os.path.join(MESH_DIR, '.cache')
 
+# Meshes which are available as module constants, they are only loaded when first used
+MESH_FILES = {
+    'BAGEL_CUT_TORUS': 'bagel-cut-torus.obj',
+    'DOUBLE_TORUS': 'double-torus.obj',
+    'HALF_BAGEL_CUT_TORUS': 'half-bagel-cut-torus.obj',
+    'HALF_TORUS': 'half-torus.obj',
+    'TWO_TORI': 'two-tori.obj',
+}
 
-def load(mesh_name: str) -> bmesh.types.BMesh:
-    # todo: maybe this should append .obj automatically? It only loads obj files anyway
+
+def read_obj(path: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Reads the vertices and faces of an OBJ file, line by line, straight into numpy arrays.
+
+    Only `v` and `f` lines are used, texture coordinates and normals (and everything else) are skipped.
+
+    :param path: Path to the OBJ file.
+    :return: A tuple containing an Nx3 array of vertex positions,
+             the vertex indices of all faces concatenated (the loops), and the number of vertices of each face.
+    """
+    vert_lines, loops, loop_totals = [], [], []
+    with open(path) as file:
+        for line in file:
+            if line.startswith('v '):
+                vert_lines.append(line.split()[1:4])
+            elif line.startswith('f '):
+                corners = line.split()[1:]
+                loop_totals.append(len(corners))
+                for corner in corners:
+                    # Corners look like v, v/vt, v//vn or v/vt/vn; indices start at 1, negative ones are relative
+                    index = int(corner.partition('/')[0])
+                    loops.append(index - 1 if index > 0 else len(vert_lines) + index)
+
+    verts = np.array(vert_lines, dtype=np.float64).reshape([-1, 3])
+    return verts, np.array(loops, dtype=np.int32), np.array(loop_totals, dtype=np.int32)
+
+
+def load_arrays(mesh_name: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Loads an OBJ file from the mesh directory as numpy arrays (see `read_obj`).
+
+    The arrays are stored next to the mesh files as .npy files, which are memory-mapped on later loads.
+    The cache is keyed by the modification time of the OBJ file, so editing it invalidates the old arrays.
+
+    :param mesh_name: File name of the mesh, the .obj extension may be left out.
+    :return: A tuple containing the vertex positions, loops and face sizes (read-only).
+    """
+    if not mesh_name.endswith('.obj'):
+        mesh_name += '.obj'
     mesh_path = os.path.join(MESH_DIR, mesh_name)
-    bpy.ops.wm.obj_import(filepath=mesh_path)
-    obj_object = bpy.context.selected_objects[-1]
+    stem = f'{mesh_name[:-len(".obj")]}.{os.stat(mesh_path).st_mtime_ns}.'
+    cache_paths = [os.path.join(CACHE_DIR, f'{stem}{part}.npy') for part in ('verts', 'loops', 'loop_totals')]
+
+    if all(os.path.exists(path) for path in cache_paths):
+        return tuple(np.load(path, mmap_mode='r') for path in cache_paths)
+
+    arrays = read_obj(mesh_path)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Arrays of older versions of the file are never used again
+        for file_name in os.listdir(CACHE_DIR):
+            if file_name.startswith(mesh_name[:-len('.obj')] + '.') and not file_name.startswith(stem):
+                os.remove(os.path.join(CACHE_DIR, file_name))
+        for path, array in zip(cache_paths, arrays):
+            # Write to a temporary file first, so that an interrupted write never leaves a broken cache behind
+            np.save(path + '.tmp.npy', array)
+            os.replace(path + '.tmp.npy', path)
+    except OSError:
+        # The mesh directory isn't writable, the arrays will just be read again next time
+        pass
+    return arrays
+
+
+def triangulate_polygons(loops: np.ndarray, loop_totals: np.ndarray) -> np.ndarray:
+    """
+    Splits polygons into triangles, by connecting the first vertex of each polygon to all of its other edges.
+
+    :param loops: The vertex indices of all polygons concatenated.
+    :param loop_totals: The number of vertices of each polygon.
+    :return: An Mx3 array of vertex indices, one row per triangle.
+    """
+    loops, loop_totals = np.asarray(loops), np.asarray(loop_totals)
+    loop_starts = np.cumsum(loop_totals) - loop_totals
+
+    # A polygon with n vertices is split into n - 2 triangles, the k-th one uses its loops 0, k + 1 and k + 2
+    triangle_counts = loop_totals - 2
+    polygons = np.repeat(np.arange(len(loop_totals)), triangle_counts)
+    k = np.arange(len(polygons)) - (np.cumsum(triangle_counts) - triangle_counts)[polygons]
+    first = loop_starts[polygons]
+    return np.stack([loops[first], loops[first + k + 1], loops[first + k + 2]], axis=1)
+
+
+def polygon_edges(loops: np.ndarray, loop_totals: np.ndarray) -> np.ndarray:
+    """
+    Finds the (unique) edges of a set of polygons.
+
+    :param loops: The vertex indices of all polygons concatenated.
+    :param loop_totals: The number of vertices of each polygon.
+    :return: An Ex2 array of vertex indices, one (sorted) row per edge.
+    """
+    loops, loop_totals = np.asarray(loops), np.asarray(loop_totals)
+    loop_starts = np.cumsum(loop_totals) - loop_totals
+
+    # Every loop is connected to the next one in its polygon, and the last loop to the first
+    next_loops = np.arange(1, len(loops) + 1)
+    next_loops[loop_starts + loop_totals - 1] = loop_starts
+    return np.unique(np.sort(np.stack([loops, loops[next_loops]], axis=1), axis=1), axis=0)
+
+
+def write_obj(path: str, verts: np.ndarray, loops: np.ndarray, loop_totals: np.ndarray):
+    """
+    Writes vertices and polygons to an OBJ file.
+
+    :param path: Path of the OBJ file to (over)write.
+    :param verts: An Nx3 array of vertex positions.
+    :param loops: The vertex indices of all polygons concatenated.
+    :param loop_totals: The number of vertices of each polygon.
+    """
+    loops, loop_totals = np.asarray(loops), np.asarray(loop_totals)
+    with open(path, 'w') as file:
+        np.savetxt(file, verts, fmt='v %.6f %.6f %.6f')
+        if len(loop_totals) and np.all(loop_totals == loop_totals[0]):
+            # All polygons have the same size, so they can be written as a single table
+            np.savetxt(file, loops.reshape([-1, loop_totals[0]]) + 1, fmt='f' + ' %d' * loop_totals[0])
+        else:
+            for polygon in np.split(loops + 1, np.cumsum(loop_totals)[:-1]):
+                file.write('f ' + ' '.join(map(str, polygon.tolist())) + '\n')
+
+
+def load(mesh_name: str) -> 'bmesh.types.BMesh':
+    """
+    Loads an OBJ file from the mesh directory as a BMesh, without importing it into the scene (requires Blender).
+
+    :param mesh_name: File name of the mesh, the .obj extension may be left out.
+    :return: A new BMesh with the vertices and faces of the file.
+    """
+    import bmesh
+
+    verts, loops, loop_totals = load_arrays(mesh_name)
     bm = bmesh.new()
-    bm.from_mesh(obj_object.data)
+    bm_verts = [bm.verts.new(co) for co in verts.tolist()]
+    for face in np.split(loops, np.cumsum(loop_totals)[:-1]):
+        bm.faces.new([bm_verts[i] for i in face.tolist()])
+    bm.verts.index_update()
+    bm.faces.index_update()
     return bm
 
 
-BAGEL_CUT_TORUS = load('bagel-cut-torus.obj')
-DOUBLE_TORUS = load('double-torus.obj')
-HALF_BAGEL_CUT_TORUS = load('half-bagel-cut-torus.obj')
-HALF_TORUS = load('half-torus.obj')
-TWO_TORI = load('two-tori.obj')
+def __getattr__(name: str) -> 'bmesh.types.BMesh':
+    # Mesh constants (e.g. DOUBLE_TORUS) are loaded on first access, and then stored as regular module attributes
+    if name not in MESH_FILES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    mesh = globals()[name] = load(MESH_FILES[name])
+    return mesh
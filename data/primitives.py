@@ -1,3 +1,5 @@
+import sys
+
 import bpy
 import bmesh
 
@@ -30,14 +32,22 @@ def tetrahedron(**kwargs):
     return bm
 
 
-CUBE = cube()
-TORUS = torus()
-UV_SPHERE = uv_sphere()
-TETRAHEDRON = tetrahedron()
-
-ALL_PRIMITIVES = [
-    CUBE,
-    TORUS,
-    UV_SPHERE,
-    TETRAHEDRON
-]
+# Primitives which are available as module constants, they are only created when first used
+PRIMITIVES = {
+    'CUBE': cube,
+    'TORUS': torus,
+    'UV_SPHERE': uv_sphere,
+    'TETRAHEDRON': tetrahedron,
+}
+
+
+def __getattr__(name: str):
+    # Constants are created on first access, and then stored as regular module attributes
+    if name == 'ALL_PRIMITIVES':
+        value = [getattr(sys.modules[__name__], primitive) for primitive in PRIMITIVES]
+    elif name in PRIMITIVES:
+        value = PRIMITIVES[name]()
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
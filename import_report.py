@@ -0,0 +1,42 @@
+# This should be invoked with the following command line (or equivalent)
+# blender --background --python import_report.py
+# (it also runs in plain python, but then only the import itself can be measured)
+import os
+import sys
+import time
+
+# Blender will actually run this in another directory, so we need to make sure everything is available to import
+sys.path.append(os.path.dirname(__file__))
+
+# Modules which are slow to import, or have side effects, and should only be loaded when they are needed
+DEFERRED_MODULES = ['scipy.sparse', 'scipy.sparse.linalg', 'data.primitives', 'data.meshes']
+
+
+def report(stage: str, start: float):
+    loaded = [name for name in DEFERRED_MODULES if name in sys.modules]
+    print(f"{stage:<32}{1000 * (time.perf_counter() - start):>10.1f} ms    loaded: {', '.join(loaded) or '-'}")
+
+
+start = time.perf_counter()
+import assignment3
+report("import assignment3", start)
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+if bpy is not None:
+    start = time.perf_counter()
+    assignment3.register()
+    report("assignment3.register()", start)
+
+    start = time.perf_counter()
+    assignment3.unregister()
+    report("assignment3.unregister()", start)
+
+# What the first use of an operator costs instead
+start = time.perf_counter()
+import assignment3.deformation.deform
+import assignment3.extension.smooth_brush
+report("first operator use", start)
@@ -0,0 +1,21 @@
+# Computes the topological properties (as in data/mesh_properties.csv) of many OBJ files.
+# This should be invoked with the following command line (or equivalent)
+# blender --background --python mesh_properties.py -- <directories, files or globs> [options]
+# or, since it only uses the array code, with plain python
+# python mesh_properties.py <directories, files or globs> [options]
+# Run with --help for the list of options, e.g.
+# python mesh_properties.py scans --output scans/mesh_properties.csv
+import os
+import sys
+
+# Blender will actually run this in another directory, so we need to make sure everything is available to import
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Dealing with contested command line parameters
+# see: https://blender.stackexchange.com/questions/267812/blender-doesnt-recognize-python-as-a-command-line-argument
+argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+
+from assignment3.mesh_properties import main
+
+if __name__ == '__main__':
+    main(argv)
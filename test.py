@@ -16,6 +16,10 @@ argv = [__file__]
 if "--" in sys.argv:
     argv += sys.argv[sys.argv.index("--") + 1:]
 
-# Import your package & run its unit tests
-from assignment3 import *
+# Import your package's unit tests & run them (the test meshes are only created by the tests that use them)
+import unittest
+from assignment3.test import *
+from assignment3.deformation.test import *
+from assignment3.extension.test import *
+from assignment3.matrices.test import *
 unittest.main(argv=argv)